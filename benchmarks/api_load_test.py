@@ -0,0 +1,166 @@
+"""
+Measure API throughput under concurrent requests, blocking versus async handlers.
+
+Usage:
+    python -m benchmarks.api_load_test [--requests N] [--concurrency C] [--llm-ms MS] [--embed-ms MS]
+
+Runs the API in-process under uvicorn (one worker) with the LLM and
+embedding calls replaced by fakes that take a fixed time, so no API key
+or network access is needed. /search/batch and /query are compared with
+copies of their previous handlers, which called the blocking client
+inside `async def` and so held the event loop for the whole request.
+/query runs once with every query sent to the agent and once routed,
+where simple questions are answered from one search and one LLM call.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+import time
+import warnings
+from typing import Dict, List
+import numpy as np
+
+def install_fakes(llm_seconds: float, embed_seconds: float, dimension: int = 1024) -> None:
+    """Replace litellm calls with fixed-latency fakes returning canned responses."""
+    import litellm
+    import src.generation.llm as llm_module
+    import src.ingestion.embedding_generator as embedding_module
+
+    completion, acompletion = litellm.completion, litellm.acompletion
+    rng = np.random.default_rng(0)
+
+    def response(messages: List[Dict]) -> str:
+        """Make the agent search once before answering, as it does for a simple question."""
+        prompt = str(messages[-1]["content"])
+        if "search_documents" not in prompt:
+            return "The documents describe vector search."
+        if "Action Input: vector search" not in prompt:
+            return "Thought: I should search the documents\nAction: search_documents\nAction Input: vector search"
+        return "Thought: I now know the final answer\nFinal Answer: The documents describe vector search."
+
+    def fake_completion(*args, **kwargs):
+        time.sleep(llm_seconds)
+        return completion(*args, **{**kwargs, "mock_response": response(kwargs["messages"])})
+
+    async def fake_acompletion(*args, **kwargs):
+        await asyncio.sleep(llm_seconds)
+        return await acompletion(*args, **{**kwargs, "mock_response": response(kwargs["messages"])})
+
+    def embeddings(texts: List[str]) -> Dict:
+        return {"data": [{"embedding": rng.standard_normal(dimension).tolist()} for _ in texts]}
+
+    def fake_embedding(model: str, input: List[str], **kwargs):
+        time.sleep(embed_seconds)
+        return embeddings(input)
+
+    async def fake_aembedding(model: str, input: List[str], **kwargs):
+        await asyncio.sleep(embed_seconds)
+        return embeddings(input)
+
+    # Mock responses carry no usage or provider details, which litellm reports noisily
+    litellm.suppress_debug_info = True
+    warnings.filterwarnings("ignore")
+    litellm.completion, litellm.acompletion = fake_completion, fake_acompletion
+    llm_module.completion, llm_module.acompletion = fake_completion, fake_acompletion
+    embedding_module.embedding, embedding_module.aembedding = fake_embedding, fake_aembedding
+
+def add_legacy_routes(main) -> None:
+    """Register the previous, blocking versions of /search/batch and /query."""
+
+    @main.app.post("/legacy/search/batch")
+    async def legacy_search_batch(request: main.BatchSearchRequest):
+        results = main.agent.search_tool.search_batch(request.queries, k=request.k, mode=request.mode)
+        return {"results": [[{**doc, "score": score} for doc, score in hits] for hits in results]}
+
+    @main.app.post("/legacy/query")
+    async def legacy_query(query: str):
+        return main.agent.process_query(query)
+
+async def load(url: str, requests: int, concurrency: int, body) -> Dict[str, float]:
+    """Send requests with at most `concurrency` in flight and report throughput and latency."""
+    import httpx
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(timeout=300, limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def one(i: int) -> None:
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(url, **body(i))
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[one(i) for i in range(requests)])
+        elapsed = time.perf_counter() - start
+    return {
+        "throughput": requests / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight")
+    parser.add_argument("--llm-ms", type=float, default=300, help="Latency of each fake LLM call")
+    parser.add_argument("--embed-ms", type=float, default=50, help="Latency of each fake embedding call")
+    parser.add_argument("--port", type=int, default=8765, help="Port the API listens on")
+    args = parser.parse_args()
+
+    # Keep the run's data out of the working tree and disable on-disk caches
+    os.environ.setdefault("MISTRAL_API_KEY", "load-test")
+    os.environ["EMBED_CACHE_PATH"] = ""
+    os.environ["WEB_CACHE_PATH"] = ""
+    os.environ["RESULT_CACHE_SIZE"] = "0"
+    os.chdir(tempfile.mkdtemp())
+    logging.disable(logging.WARNING)
+
+    import uvicorn
+    from src.api import main as api
+    install_fakes(args.llm_ms / 1000, args.embed_ms / 1000)
+    add_legacy_routes(api)
+    # Don't print every agent step
+    api.agent.agent.verbose = False
+    rng = np.random.default_rng(1)
+    api.vector_store.add_documents([{"text": f"chunk {i}", "source": "load-test", "embedding": vector}
+                                    for i, vector in enumerate(rng.standard_normal((5000, 1024)).astype(np.float32))])
+
+    server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=args.port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    base = f"http://127.0.0.1:{args.port}"
+    # (name, path, request body, query router mode)
+    scenarios = [
+        ("search (blocking)", "/legacy/search/batch", lambda i: {"json": {"queries": [f"question {i}"], "mode": "dense"}}, "agent"),
+        ("search (async)", "/search/batch", lambda i: {"json": {"queries": [f"question {i}"], "mode": "dense"}}, "agent"),
+        ("query (blocking)", "/legacy/query", lambda i: {"params": {"query": f"what is question {i}?"}}, "agent"),
+        ("query (async)", "/query", lambda i: {"params": {"query": f"what is question {i}?"}}, "agent"),
+        ("query (async, routed)", "/query", lambda i: {"params": {"query": f"what is question {i}?"}}, "rules"),
+    ]
+    print(f"{args.requests} requests per scenario, {args.concurrency} in flight, "
+          f"LLM {args.llm_ms:.0f} ms, embedding {args.embed_ms:.0f} ms, one uvicorn worker")
+    print(f"{'scenario':<24} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9}")
+    for name, path, body, router in scenarios:
+        api.agent.router.mode = router
+        result = asyncio.run(load(base + path, args.requests, args.concurrency, body))
+        print(f"{name:<24} {result['throughput']:>8.1f} {result['p50_ms']:>9.0f} {result['p95_ms']:>9.0f}")
+    routes = api.agent.router.stats()
+    print("server-side latency per route:", {route: {key: routes[route][key] for key in ("requests", "p50_ms", "p95_ms")}
+                                             for route in ("direct", "agent")})
+
+    # The async path must answer like the blocking one did
+    import httpx
+    for router, route in (("agent", "agent"), ("rules", "direct")):
+        api.agent.router.mode = router
+        answer = httpx.post(base + "/query", params={"query": "what is this about?"}, timeout=60).json()
+        assert answer == {"type": "answer", "content": "The documents describe vector search.", "route": route}, answer
+    server.should_exit = True
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Compare chunking throughput of TextChunker with LangChain's RecursiveCharacterTextSplitter.
+
+Usage:
+    python -m benchmarks.chunker_throughput [--pdf FILE ...] [--pages N] [--repeat N]
+
+Run it as a module from the repository root, so the `src` package can be
+imported; `python benchmarks/chunker_throughput.py` fails. Without --pdf a synthetic corpus of prose-like pages is generated.
+"""
+import argparse
+import random
+import time
+from typing import List, Dict
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from src.ingestion.document_parser import DocumentParser
+from src.ingestion.text_chunker import TextChunker
+
+WORDS = ("retrieval augmented generation index vector embedding query document page section "
+         "chunk token model answer context score latency throughput memory cache batch").split()
+
+def synthetic_pages(count: int, seed: int = 0) -> List[Dict]:
+    """Generate pages of a few paragraphs of random sentences."""
+    rng = random.Random(seed)
+    pages = []
+    for page in range(count):
+        paragraphs = []
+        for _ in range(rng.randint(3, 8)):
+            sentences = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 20))).capitalize() + "."
+                         for _ in range(rng.randint(2, 8))]
+            paragraphs.append(" ".join(sentences))
+        pages.append({"text": "\n\n".join(paragraphs), "source": "synthetic.pdf", "page": page + 1, "type": "pdf"})
+    return pages
+
+def run(name: str, chunk, pages: List[Dict], repeat: int, counter: TextChunker) -> None:
+    total_chars = sum(len(page["text"]) for page in pages)
+    best, chunks = float("inf"), []
+    for _ in range(repeat):
+        batch = [dict(page) for page in pages]
+        start = time.perf_counter()
+        chunks = chunk(batch)
+        best = min(best, time.perf_counter() - start)
+    tokens = counter.count_tokens([c["text"] for c in chunks])
+    print(f"{name:<34} {len(pages) / best:>10.0f} pages/s {total_chars / best / 1e6:>7.2f} MB/s "
+          f"{len(chunks):>8} chunks  tokens/chunk mean {sum(tokens) / len(tokens):6.1f} max {max(tokens):4d}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", nargs="*", default=[], help="PDF files to use as the corpus")
+    parser.add_argument("--pages", type=int, default=2000, help="Synthetic pages when no PDF is given")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per chunker (best is reported)")
+    args = parser.parse_args()
+
+    pages = [page for path in args.pdf for page in DocumentParser.parse_pdf(path)] or synthetic_pages(args.pages)
+    token_chunker = TextChunker(unit="tokens")
+    char_chunker = TextChunker(unit="chars", chunk_size=500, chunk_overlap=50)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50, length_function=len,
+                                              separators=["\n\n", "\n", " ", ""])
+
+    # The same splitter sized by tokens, the closest LangChain equivalent
+    token_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=token_chunker.chunk_size, chunk_overlap=token_chunker.chunk_overlap,
+        length_function=lambda text: len(token_chunker.encoding.encode_ordinary(text)),
+        separators=["\n\n", "\n", " ", ""])
+
+    def langchain_chunker(splitter: RecursiveCharacterTextSplitter):
+        return lambda batch: langchain_chunk(splitter, batch)
+
+    def langchain_chunk(splitter: RecursiveCharacterTextSplitter, batch: List[Dict]) -> List[Dict]:
+        # The previous TextChunker implementation
+        chunks = []
+        for doc in batch:
+            for i, text in enumerate(splitter.split_text(doc["text"])):
+                chunk = doc.copy()
+                chunk["text"] = text
+                chunk["chunk_id"] = i + 1
+                chunks.append(chunk)
+        return chunks
+
+    print(f"{len(pages)} pages, {sum(len(p['text']) for p in pages) / 1e6:.1f} MB, "
+          f"{token_chunker.chunk_size} tokens per chunk")
+    run("RecursiveCharacterTextSplitter 500c", langchain_chunker(splitter), pages, args.repeat, token_chunker)
+    if token_chunker.encoding is not None:
+        run(f"RecursiveCharacterTextSplitter {token_chunker.chunk_size}t", langchain_chunker(token_splitter),
+            pages, args.repeat, token_chunker)
+    run("TextChunker chars 500c", char_chunker.chunk_documents, pages, args.repeat, token_chunker)
+    run(f"TextChunker tokens {token_chunker.chunk_size}t", token_chunker.chunk_documents, pages, args.repeat, token_chunker)
+
+if __name__ == "__main__":
+    main()
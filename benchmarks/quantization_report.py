@@ -0,0 +1,75 @@
+"""
+Compare recall, latency and memory of the vector index types on a held-out query set.
+
+Usage:
+    python -m benchmarks.quantization_report [--vectors FILE.npy] [--count N] [--queries N] [--k K]
+
+Without --vectors a synthetic clustered corpus of 1024-dimensional unit
+vectors is generated. The queries are held out of the indexed vectors and
+recall@k is measured against an exact inner-product search.
+"""
+import argparse
+import logging
+import os
+import time
+from typing import List, Tuple
+import numpy as np
+from src.retrieval.vector_store import VectorStore
+
+CONFIGS: List[Tuple[str, str, int]] = [
+    ("flat (float32)", "flat", 0),
+    ("sq_fp16", "sq_fp16", 0),
+    ("sq8", "sq8", 0),
+    ("sq8 + re-rank x4", "sq8", 4),
+    ("ivf_pq", "ivf_pq", 0),
+    ("ivf_pq + re-rank x4", "ivf_pq", 4),
+]
+
+def synthetic_vectors(count: int, dimension: int, seed: int = 0) -> np.ndarray:
+    """Generate unit vectors scattered around a few hundred topic centers."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((256, dimension)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), count)] + 0.8 * rng.standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", help="(n, dimension) float .npy file of document embeddings")
+    parser.add_argument("--count", type=int, default=50000, help="Synthetic vectors when no file is given")
+    parser.add_argument("--queries", type=int, default=200, help="Vectors held out as queries")
+    parser.add_argument("--k", type=int, default=10, help="Results per query")
+    parser.add_argument("--nlist", type=int, default=256, help="Inverted lists for ivf_pq")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    os.environ["RESULT_CACHE_SIZE"] = "0"
+
+    vectors = np.load(args.vectors).astype(np.float32) if args.vectors else synthetic_vectors(args.count, 1024)
+    rng = np.random.default_rng(1)
+    held_out = rng.choice(len(vectors), args.queries, replace=False)
+    queries = vectors[held_out]
+    corpus = np.delete(vectors, held_out, axis=0)
+    truth = np.argsort(-(queries @ corpus.T), axis=1)[:, :args.k]
+    print(f"{len(corpus)} vectors of dimension {corpus.shape[1]}, {len(queries)} held-out queries, k={args.k}")
+    print(f"{'index':<22} {'recall@k':>9} {'ms/query':>9} {'index MB':>9} {'re-rank MB':>11} {'build s':>8}")
+
+    for name, index_type, rerank in CONFIGS:
+        store = VectorStore(dimension=corpus.shape[1], index_type=index_type, nlist=args.nlist, rerank=rerank)
+        start = time.perf_counter()
+        for first in range(0, len(corpus), 10000):
+            batch = corpus[first:first + 10000]
+            store.add_documents([{"text": str(first + i), "embedding": vector} for i, vector in enumerate(batch)])
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = [store.search(query, k=args.k) for query in queries]
+        latency = (time.perf_counter() - start) / len(queries) * 1000
+        recall = np.mean([len({int(doc["text"]) for doc, _ in hits} & set(expected.tolist())) / args.k
+                          for hits, expected in zip(results, truth)])
+        usage = store.memory_usage()
+        # The re-rank vectors are memory mapped from disk once the store is saved
+        rerank_bytes = usage.get("rerank_memory_bytes", 0) + usage.get("rerank_mapped_bytes", 0)
+        print(f"{name:<22} {recall:>9.3f} {latency:>9.2f} {usage['index_bytes'] / 1e6:>9.1f} "
+              f"{rerank_bytes / 1e6:>11.1f} {build:>8.1f}")
+
+if __name__ == "__main__":
+    main()
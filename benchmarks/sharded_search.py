@@ -0,0 +1,127 @@
+"""
+Run a sharded vector store as local processes and compare it with a single store.
+
+Usage:
+    python -m benchmarks.sharded_search [--shards N] [--count N] [--queries N] [--k K] [--deadline-ms MS]
+
+Starts N shard_server processes on local ports, loads synthetic vectors
+through a ShardCoordinator (routed by source), and checks that the merged
+top-k matches an unsharded store searched in-process. A final run adds a
+shard that accepts connections but never answers, to show searches return
+the remaining shards' results at the deadline.
+"""
+import argparse
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import httpx
+import numpy as np
+from src.retrieval.vector_store import VectorStore
+from src.retrieval.shard_coordinator import ShardCoordinator
+from src.retrieval.shard_server import encode_vectors
+from benchmarks.quantization_report import synthetic_vectors
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def stalled_shard() -> str:
+    """Listen on a port that accepts connections and never replies."""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    connections = []
+
+    def accept() -> None:
+        while True:
+            connections.append(server.accept())
+
+    threading.Thread(target=accept, daemon=True).start()
+    return f"http://127.0.0.1:{server.getsockname()[1]}"
+
+def wait_ready(url: str, timeout: float = 60) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url + "/health", timeout=1).raise_for_status()
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Shard {url} did not start")
+
+def timed_search(searcher, queries: np.ndarray, k: int):
+    start = time.perf_counter()
+    results = [searcher.search(query, k=k) for query in queries]
+    return results, (time.perf_counter() - start) / len(queries) * 1000
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, default=4, help="Shard processes to start")
+    parser.add_argument("--count", type=int, default=100000, help="Synthetic vectors")
+    parser.add_argument("--dimension", type=int, default=1024, help="Vector dimension")
+    parser.add_argument("--queries", type=int, default=200, help="Queries to run")
+    parser.add_argument("--k", type=int, default=10, help="Results per query")
+    parser.add_argument("--deadline-ms", type=int, default=1000, help="Coordinator deadline")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    os.environ["RESULT_CACHE_SIZE"] = "0"
+
+    vectors = synthetic_vectors(args.count + args.queries, args.dimension)
+    corpus, queries = vectors[:args.count], vectors[args.count:]
+    documents = [{"text": str(i), "source": f"doc-{i // 50}", "embedding": vector} for i, vector in enumerate(corpus)]
+
+    single = VectorStore(dimension=args.dimension)
+    single.add_documents(documents)
+    expected, single_ms = timed_search(single, queries, args.k)
+
+    with tempfile.TemporaryDirectory() as root:
+        env = {**os.environ, "VECTOR_INDEX_TYPE": os.getenv("VECTOR_INDEX_TYPE", "flat")}
+        urls, processes = [], []
+        for shard in range(args.shards):
+            port = free_port()
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "src.retrieval.shard_server", os.path.join(root, f"shard-{shard}"),
+                 "--port", str(port), "--dimension", str(args.dimension)],
+                env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+            urls.append(f"http://127.0.0.1:{port}")
+        try:
+            for url in urls:
+                wait_ready(url)
+            coordinator = ShardCoordinator(urls, deadline=args.deadline_ms / 1000)
+            for first in range(0, len(documents), 5000):
+                coordinator.add_documents(documents[first:first + 5000])
+            coordinator.save()
+            print(f"{args.count} vectors of dimension {args.dimension}, {args.queries} queries, k={args.k}")
+            print("documents per shard:", [health["documents"] for health in coordinator.health()])
+
+            results, sharded_ms = timed_search(coordinator, queries, args.k)
+            agreement = np.mean([
+                len({doc["text"] for doc, _ in got} & {doc["text"] for doc, _ in want}) / args.k
+                for got, want in zip(results, expected)
+            ])
+            print(f"{'single store':<28} {single_ms:>8.2f} ms/query")
+            print(f"{f'{args.shards} shards':<28} {sharded_ms:>8.2f} ms/query   top-{args.k} agreement {agreement:.3f}")
+            coordinator.close()
+
+            stalled = ShardCoordinator(urls + [stalled_shard()], deadline=args.deadline_ms / 1000)
+            start = time.perf_counter()
+            payload = {"vectors": encode_vectors(queries[:1]), "k": args.k, "mode": "dense"}
+            partial, missing = stalled.scatter(payload, 1, args.k)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"{'with a stalled shard':<28} {elapsed:>8.2f} ms          {len(partial[0])} results, "
+                  f"missing shards {missing}")
+            stalled.close()
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,38 @@
-from typing import List, Dict, Union, Tuple
+from typing import Any, List, Dict, Iterator, Union, Tuple, Optional
 import logging
+import queue
+import threading
+import time
 from langchain.agents import initialize_agent, AgentType
 from langchain.llms import OpenAI
 from .tools import DocumentSearchTool, SummarizationTool, QuizGenerationTool
+from .router import QueryRouter
 from ..generation.llm import LLMGenerator
 from ..retrieval.vector_store import VectorStore
+from ..retrieval.collection_manager import CollectionManager
 from ..ingestion.embedding_generator import EmbeddingGenerator
 from langchain.tools import Tool
+from langchain_core.callbacks import BaseCallbackHandler
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Characters of each tool observation included in streamed agent steps
+STEP_PREVIEW_CHARS = 1000
+# Search results given as context to questions answered without the agent
+DIRECT_CONTEXT_K = 5
+
 class ReActAgent:
-    """ReAct agent for handling complex queries using tools."""
+    """
+    ReAct agent for handling complex queries using tools.
+    
+    Simple questions skip the agent loop: the router sends them to a
+    single search followed by one answer_question call, and the agent's
+    several LLM round-trips are reserved for multi-step requests.
+    """
     
-    def __init__(self, vector_store: VectorStore, embedder: EmbeddingGenerator, llm_generator: LLMGenerator):
+    def __init__(self, vector_store: VectorStore, embedder: EmbeddingGenerator, llm_generator: LLMGenerator,
+                 router: Optional[QueryRouter] = None, collections: Optional[CollectionManager] = None):
         """
         Initialize the ReAct agent.
         
@@ -22,10 +40,15 @@ class ReActAgent:
             vector_store: Vector store instance
             embedder: Embedding generator instance
             llm_generator: LLM generator instance
+            router: Query router (default: a QueryRouter configured from the environment)
+            collections: Collections whose stores may be searched; the tools and agent
+                built for each are cached with the loaded store
         """
         self.vector_store = vector_store
         self.embedder = embedder
         self.llm_generator = llm_generator
+        self.router = router or QueryRouter()
+        self.collections = collections
         
         # Initialize tools
         self.search_tool = DocumentSearchTool(vector_store, embedder)
@@ -33,69 +56,260 @@ class ReActAgent:
         self.quiz_tool = QuizGenerationTool(llm_generator)
         
         # Initialize LangChain agent
+        self.agent = self._build_agent(self.search_tool)
+    
+    def _build_agent(self, search_tool: DocumentSearchTool, llm=None):
+        """Create the LangChain agent around a search tool, on the generator's LLM by default."""
         # wrap each tool in langchain.tools.Tool so it has .is_single_input, etc.
         tools = [
             Tool(
                 name="search_documents",
-                func=self.search_tool.search,
+                func=search_tool.search,
+                coroutine=search_tool.asearch,
                 description="Search for relevant documents in the knowledge base"
             ),
             Tool(
                 name="summarize",
                 func=self.summarize_tool.summarize,
+                coroutine=self.summarize_tool.asummarize,
                 description="Summarize a given text"
             ),
             Tool(
                 name="generate_quiz",
                 func=self.quiz_tool.generate_quiz,
+                coroutine=self.quiz_tool.agenerate_quiz,
                 description="Generate quiz questions from text"
             ),
         ]
-        self.agent = initialize_agent(
+        return initialize_agent(
             tools=tools,
-            llm=self.llm_generator.llm,
+            llm=llm or self.llm_generator.llm,
             agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
             verbose=True
         )
     
-    def process_query(self, query: str) -> Dict[str, Union[str, List[Dict[str, str]]]]:
+    def _search_tool_for(self, vector_store: Optional[VectorStore]) -> DocumentSearchTool:
+        """Return the search tool for a store, the agent's own by default."""
+        if vector_store is None or vector_store is self.vector_store:
+            return self.search_tool
+        if self.collections is None:
+            return DocumentSearchTool(vector_store, self.embedder, self.search_tool.mode)
+        return self.collections.cached(
+            vector_store, "search_tool", lambda: DocumentSearchTool(vector_store, self.embedder, self.search_tool.mode))
+    
+    def _agent_for(self, vector_store: Optional[VectorStore]):
+        """Return the LangChain agent searching a store, the agent's own by default."""
+        search_tool = self._search_tool_for(vector_store)
+        if search_tool is self.search_tool:
+            return self.agent
+        if self.collections is None:
+            return self._build_agent(search_tool)
+        return self.collections.cached(vector_store, "react_agent", lambda: self._build_agent(search_tool))
+    
+    def process_query(self, query: str,
+                      vector_store: Optional[VectorStore] = None) -> Dict[str, Union[str, List[Dict[str, str]]]]:
         """
-        Process a user query using the ReAct agent.
+        Process a user query, directly or with the ReAct agent as routed.
         
         Args:
             query: User query
+            vector_store: Store to search instead of the agent's own, e.g. a collection
             
         Returns:
-            Dictionary containing the response and any additional data
+            Dictionary containing the response, the route that produced it and any additional data
         """
+        started = time.perf_counter()
+        route, fallback, error = self.router.route(query), False, False
         try:
+            if route == "direct":
+                hits = self._search_tool_for(vector_store).search(query, k=DIRECT_CONTEXT_K)
+                if hits:
+                    return {
+                        "type": "answer",
+                        "content": self.llm_generator.answer_question(_context(hits), query),
+                        "route": route
+                    }
+                # Nothing retrieved: let the agent rephrase the search
+                route, fallback = "agent", True
+            
             # Run the agent
-            response = self.agent.run(query)
+            response = self._agent_for(vector_store).run(query)
             
             # Parse the response based on the type of query
-            if "quiz" in query.lower():
+            if self.response_type(query) == "quiz":
                 # Extract quiz questions from the response
-                quiz_questions = self.quiz_tool.generate_quiz(response)
                 return {
                     "type": "quiz",
-                    "questions": quiz_questions
+                    "questions": self.quiz_tool.generate_quiz(response),
+                    "route": route
                 }
-            elif "summarize" in query.lower():
-                return {
-                    "type": "summary",
-                    "content": response
-                }
-            else:
+            return {
+                "type": self.response_type(query),
+                "content": response,
+                "route": route
+            }
+        except Exception as e:
+            error = True
+            logger.error(f"Error processing query: {str(e)}")
+            return {
+                "type": "error",
+                "content": "I apologize, but I encountered an error while processing your query."
+            }
+        finally:
+            self.router.record(route, time.perf_counter() - started, error=error, fallback=fallback)
+    
+    async def aprocess_query(self, query: str,
+                             vector_store: Optional[VectorStore] = None) -> Dict[str, Union[str, List[Dict[str, str]]]]:
+        """
+        Process a user query, as process_query, without blocking the event loop.
+        
+        LLM calls and tools run as coroutines, so one event loop can serve
+        many queries at once.
+        
+        Args:
+            query: User query
+            vector_store: Store to search instead of the agent's own, e.g. a collection
+            
+        Returns:
+            Dictionary containing the response, the route that produced it and any additional data
+        """
+        started = time.perf_counter()
+        route, fallback, error = self.router.route(query), False, False
+        try:
+            if route == "direct":
+                hits = await self._search_tool_for(vector_store).asearch(query, k=DIRECT_CONTEXT_K)
+                if hits:
+                    return {
+                        "type": "answer",
+                        "content": await self.llm_generator.aanswer_question(_context(hits), query),
+                        "route": route
+                    }
+                route, fallback = "agent", True
+            
+            response = await self._agent_for(vector_store).arun(query)
+            if self.response_type(query) == "quiz":
                 return {
-                    "type": "answer",
-                    "content": response
+                    "type": "quiz",
+                    "questions": await self.quiz_tool.agenerate_quiz(response),
+                    "route": route
                 }
+            return {
+                "type": self.response_type(query),
+                "content": response,
+                "route": route
+            }
         except Exception as e:
+            error = True
             logger.error(f"Error processing query: {str(e)}")
             return {
                 "type": "error",
                 "content": "I apologize, but I encountered an error while processing your query."
             }
+        finally:
+            self.router.record(route, time.perf_counter() - started, error=error, fallback=fallback)
+    
+    @staticmethod
+    def response_type(query: str) -> str:
+        """Classify the response a query asks for: "quiz", "summary" or "answer"."""
+        if "quiz" in query.lower():
+            return "quiz"
+        if "summarize" in query.lower():
+            return "summary"
+        return "answer"
+    
+    def stream_query(self, query: str, vector_store: Optional[VectorStore] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Process a user query as routed, yielding events as it runs.
+        
+        Events are dictionaries with an "event" name and its "data":
+        "step" for each tool the agent calls (tool, input and reasoning),
+        "observation" for each tool result, "token" for the text of the
+        final answer as the model writes it, "question" for each quiz
+        question, then "done" with the same response as process_query,
+        or "error". A directly answered question reports its search as
+        one step.
+        
+        Args:
+            query: User query
+            vector_store: Store to search instead of the agent's own, e.g. a collection
+            
+        Yields:
+            Event dictionaries
+        """
+        started = time.perf_counter()
+        route, fallback, error = self.router.route(query), False, False
+        try:
+            events = None
+            if route == "direct":
+                events = self._stream_direct(query, self._search_tool_for(vector_store))
+                if events is None:
+                    route, fallback = "agent", True
+            for event in events or self._stream_agent(query, vector_store):
+                error = event["event"] == "error"
+                yield event
+        finally:
+            self.router.record(route, time.perf_counter() - started, error=error, fallback=fallback)
+    
+    def _stream_direct(self, query: str, search_tool: DocumentSearchTool) -> Optional[Iterator[Dict[str, Any]]]:
+        """Search for a query and return the events of answering it from the results, or None if none were found."""
+        hits = search_tool.search(query, k=DIRECT_CONTEXT_K)
+        if not hits:
+            return None
+        
+        def events() -> Iterator[Dict[str, Any]]:
+            yield {"event": "step", "data": {
+                "tool": "search_documents",
+                "input": query,
+                "log": "Answering from the top search results",
+            }}
+            yield {"event": "observation", "data": {"output": str(hits)[:STEP_PREVIEW_CHARS]}}
+            answer = ""
+            for token in self.llm_generator.stream_answer(_context(hits), query):
+                answer += token
+                yield {"event": "token", "data": {"text": token}}
+            yield {"event": "done", "data": {"type": "answer", "content": answer.strip(), "route": "direct"}}
+        
+        return events()
+    
+    def _stream_agent(self, query: str, vector_store: Optional[VectorStore]) -> Iterator[Dict[str, Any]]:
+        """Run the ReAct agent on a query, yielding the events described in stream_query."""
+        agent = self._build_agent(self._search_tool_for(vector_store), llm=self.llm_generator.streaming_llm)
+        events: "queue.Queue" = queue.Queue()
+        outcome: Dict[str, Any] = {}
+        
+        def run() -> None:
+            try:
+                outcome["response"] = agent.run(query, callbacks=[_StreamingHandler(events)])
+            except Exception as e:
+                outcome["error"] = e
+            finally:
+                events.put(None)
+        
+        # The agent runs in its own thread and reports through the queue
+        threading.Thread(target=run, name="agent-stream", daemon=True).start()
+        while True:
+            event = events.get()
+            if event is None:
+                break
+            yield event
+        
+        if "error" in outcome:
+            logger.error(f"Error processing query: {str(outcome['error'])}")
+            yield {"event": "error", "data": {
+                "type": "error",
+                "content": "I apologize, but I encountered an error while processing your query."
+            }}
+            return
+        response = outcome["response"]
+        response_type = self.response_type(query)
+        if response_type == "quiz":
+            questions = []
+            for question in self.llm_generator.stream_quiz(response):
+                questions.append(question)
+                yield {"event": "question", "data": question}
+            yield {"event": "done", "data": {"type": "quiz", "questions": questions, "route": "agent"}}
+        else:
+            yield {"event": "done", "data": {"type": response_type, "content": response, "route": "agent"}}
     
     def check_answer(self, question: str, user_answer: str, correct_answer: str) -> Dict[str, str]:
         """
@@ -111,13 +325,7 @@ class ReActAgent:
         """
         try:
             # Generate feedback using the LLM
-            prompt = f"""Question: {question}
-User's Answer: {user_answer}
-Correct Answer: {correct_answer}
-
-Provide feedback on the user's answer. If it's incorrect, explain why and provide the correct answer. Be encouraging and helpful."""
-
-            feedback = self.llm_generator.llm(prompt)
+            feedback = self.llm_generator.llm(_feedback_prompt(question, user_answer, correct_answer))
             
             return {
                 "feedback": feedback.strip(),
@@ -128,4 +336,91 @@ Provide feedback on the user's answer. If it's incorrect, explain why and provid
             return {
                 "feedback": "I apologize, but I encountered an error while checking your answer.",
                 "is_correct": False
-            } 
\ No newline at end of file
+            } 
+    
+    async def acheck_answer(self, question: str, user_answer: str, correct_answer: str) -> Dict[str, str]:
+        """
+        Check a user's answer to a quiz question without blocking the event loop.
+        
+        Args:
+            question: The quiz question
+            user_answer: User's answer
+            correct_answer: Correct answer
+            
+        Returns:
+            Dictionary containing feedback and explanation, as check_answer
+        """
+        try:
+            feedback = await self.llm_generator.llm.ainvoke(_feedback_prompt(question, user_answer, correct_answer))
+            return {
+                "feedback": feedback.content.strip(),
+                "is_correct": user_answer.lower().strip() == correct_answer.lower().strip()
+            }
+        except Exception as e:
+            logger.error(f"Error checking answer: {str(e)}")
+            return {
+                "feedback": "I apologize, but I encountered an error while checking your answer.",
+                "is_correct": False
+            }
+
+def _context(hits: List[Tuple[Dict, float]]) -> str:
+    """Format search results as numbered passages with their sources, for the question answering prompt."""
+    passages = []
+    for i, (doc, _) in enumerate(hits, 1):
+        source = str(doc.get("source", "unknown"))
+        if doc.get("page") is not None:
+            source += f", page {doc['page']}"
+        passages.append(f"[{i}] Source: {source}\n{doc.get('text', '')}")
+    return "\n\n".join(passages)
+
+def _feedback_prompt(question: str, user_answer: str, correct_answer: str) -> str:
+    """Prompt asking the LLM for feedback on a quiz answer."""
+    return f"""Question: {question}
+User's Answer: {user_answer}
+Correct Answer: {correct_answer}
+
+Provide feedback on the user's answer. If it's incorrect, explain why and provide the correct answer. Be encouraging and helpful."""
+
+class _StreamingHandler(BaseCallbackHandler):
+    """
+    Turns LangChain callbacks of an agent run into stream events.
+    
+    Every LLM call of a ReAct agent writes its reasoning before acting, so
+    tokens are only forwarded once a call has written "Final Answer:".
+    """
+    
+    ANSWER_PREFIX = "Final Answer:"
+    
+    def __init__(self, events: "queue.Queue"):
+        self.events = events
+        self._text = ""
+        self._sent = 0
+    
+    def on_llm_start(self, serialized, prompts, **kwargs) -> None:
+        self._text, self._sent = "", 0
+    
+    def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        self._text, self._sent = "", 0
+    
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        self._text += token
+        start = self._text.find(self.ANSWER_PREFIX)
+        if start < 0:
+            return
+        start += len(self.ANSWER_PREFIX)
+        text = self._text[max(start, self._sent):]
+        if self._sent <= start:
+            text = text.lstrip()
+        if text:
+            self.events.put({"event": "token", "data": {"text": text}})
+        self._sent = len(self._text)
+    
+    def on_agent_action(self, action, **kwargs) -> None:
+        self.events.put({"event": "step", "data": {
+            "tool": action.tool,
+            "input": str(action.tool_input),
+            "log": action.log.strip(),
+        }})
+    
+    def on_tool_end(self, output, **kwargs) -> None:
+        self.events.put({"event": "observation", "data": {"output": str(output)[:STEP_PREVIEW_CHARS]}})
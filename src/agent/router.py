@@ -0,0 +1,96 @@
+from typing import Deque, Dict, Optional
+from collections import deque
+import os
+import re
+import threading
+import numpy as np
+
+# "direct" answers from one retrieval and one LLM call, "agent" runs the ReAct loop
+ROUTES = ("direct", "agent")
+ROUTER_MODES = ("rules", "agent")
+
+# Phrasings that ask for several steps, comparisons or tool use beyond one lookup
+MULTI_STEP = re.compile(
+    r"\b(quiz|summari[sz]e|summary|compare|comparison|contrast|versus|vs\.?|differences?\s+between"
+    r"|step[\s-]+by[\s-]+step|and\s+then|after\s+that|then\s+(?:explain|summari[sz]e|list|compare|find)"
+    r"|for\s+each|each\s+of|all\s+of\s+the|pros\s+and\s+cons)\b",
+    re.IGNORECASE,
+)
+
+class QueryRouter:
+    """
+    Decide whether a query needs the ReAct agent or a single retrieval.
+
+    Classification is rule-based and costs no model call: summaries,
+    quizzes, comparisons, multi-part and long queries go to the agent,
+    everything else is answered directly from the top search results.
+    Latency of each route is recorded over a sliding window.
+    """
+
+    def __init__(self, mode: Optional[str] = None, max_words: Optional[int] = None, window: int = 1000):
+        """
+        Initialize the router.
+
+        Args:
+            mode: "rules" to route by the rules above, "agent" to send every query
+                to the agent (default: QUERY_ROUTER or "rules")
+            max_words: Longest query answered directly (default: ROUTER_MAX_WORDS or 40)
+            window: Latest requests per route kept for latency percentiles
+        """
+        self.mode = mode or os.getenv("QUERY_ROUTER", "rules")
+        if self.mode not in ROUTER_MODES:
+            raise ValueError(f"Unknown query router '{self.mode}', expected one of {ROUTER_MODES}")
+        self.max_words = max_words or int(os.getenv("ROUTER_MAX_WORDS", 40))
+        self._latencies: Dict[str, Deque[float]] = {route: deque(maxlen=window) for route in ROUTES}
+        self._counts = {route: {"requests": 0, "errors": 0, "fallbacks": 0, "seconds": 0.0} for route in ROUTES}
+        self._lock = threading.Lock()
+
+    def route(self, query: str) -> str:
+        """
+        Classify a query.
+
+        Args:
+            query: User query
+
+        Returns:
+            "direct" or "agent"
+        """
+        if self.mode == "agent":
+            return "agent"
+        if MULTI_STEP.search(query) or query.count("?") > 1 or len(query.split()) > self.max_words:
+            return "agent"
+        return "direct"
+
+    def record(self, route: str, seconds: float, error: bool = False, fallback: bool = False) -> None:
+        """
+        Record the latency of one query.
+
+        Args:
+            route: Route that answered the query
+            seconds: Time from routing to the response
+            error: Whether the query failed
+            fallback: Whether the query was routed directly but handed to the agent
+        """
+        with self._lock:
+            self._latencies[route].append(seconds)
+            counts = self._counts[route]
+            counts["requests"] += 1
+            counts["errors"] += error
+            counts["fallbacks"] += fallback
+            counts["seconds"] += seconds
+
+    def stats(self) -> Dict:
+        """Report requests, errors, fallbacks and latency percentiles per route."""
+        with self._lock:
+            report = {"mode": self.mode}
+            for route in ROUTES:
+                counts = self._counts[route]
+                latencies = np.array(self._latencies[route]) * 1000
+                report[route] = {
+                    **counts,
+                    "seconds": round(counts["seconds"], 3),
+                    "mean_ms": round(counts["seconds"] / counts["requests"] * 1000, 2) if counts["requests"] else None,
+                    "p50_ms": round(float(np.percentile(latencies, 50)), 2) if len(latencies) else None,
+                    "p95_ms": round(float(np.percentile(latencies, 95)), 2) if len(latencies) else None,
+                }
+            return report
@@ -1,5 +1,8 @@
-from typing import List, Dict, Union, Tuple
+from typing import List, Dict, Union, Tuple, Optional
+import asyncio
 import logging
+import os
+import numpy as np
 from ..retrieval.vector_store import VectorStore
 from ..generation.llm import LLMGenerator
 from ..ingestion.embedding_generator import EmbeddingGenerator
@@ -7,43 +10,160 @@ from ..ingestion.embedding_generator import EmbeddingGenerator
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SEARCH_MODES = ("dense", "lexical", "hybrid")
+
 class DocumentSearchTool:
     """Tool for searching documents in the vector store."""
     
-    def __init__(self, vector_store: VectorStore, embedder: EmbeddingGenerator):
+    def __init__(self, vector_store: VectorStore, embedder: EmbeddingGenerator, mode: Optional[str] = None):
         """
         Initialize the document search tool.
         
         Args:
             vector_store: Vector store instance
             embedder: Embedding generator instance
+            mode: Default search mode, one of SEARCH_MODES (default: SEARCH_MODE or "dense")
         """
         self.vector_store = vector_store
         self.embedder = embedder
+        self.mode = mode or os.getenv("SEARCH_MODE", "dense")
+        if self.mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{self.mode}', expected one of {SEARCH_MODES}")
     
-    def search(self, query: str, k: int = 5) -> List[Tuple[Dict, float]]:
+    def search(self, query: str, k: int = 5, mode: Optional[str] = None,
+               filters: Optional[Dict] = None) -> List[Tuple[Dict, float]]:
         """
         Search for relevant documents.
         
         Args:
             query: Search query
             k: Number of results to return
+            mode: "dense" (embeddings), "lexical" (BM25) or "hybrid" (both, fused
+                with reciprocal rank fusion); defaults to the tool's mode
+            filters: Metadata restrictions ("source", "type", "page"), see VectorStore.filter_ids
             
         Returns:
             List of (document, score) tuples
         """
         try:
+            mode = mode or self.mode
+            if mode == "lexical":
+                return self.vector_store.lexical_search(query, k=k, filters=filters)
+            
             # Generate query embedding
             query_embedding = self.embedder.generate_embedding(query)
             
             # Search vector store
-            results = self.vector_store.search(query_embedding, k=k)
+            if mode == "hybrid":
+                return self.vector_store.hybrid_search_batch(query_embedding.reshape(1, -1), [query], k=k,
+                                                             filters=filters)[0]
+            results = self.vector_store.search(query_embedding, k=k, filters=filters)
             
             return results
         except Exception as e:
             logger.error(f"Error searching documents: {str(e)}")
             return []
 
+    def search_batch(self, queries: List[str], k: int = 5, mode: Optional[str] = None,
+                     filters: Optional[Dict] = None) -> List[List[Tuple[Dict, float]]]:
+        """
+        Search for relevant documents for several queries at once.
+        
+        All queries are embedded in one request and searched with a single
+        vector store call.
+        
+        Args:
+            queries: Search queries
+            k: Number of results to return per query
+            mode: Search mode, as in search()
+            filters: Metadata restrictions applied to every query, as in search()
+            
+        Returns:
+            One list of (document, score) tuples per query
+        """
+        try:
+            if not queries:
+                return []
+            mode = mode or self.mode
+            if mode == "lexical":
+                return [self.vector_store.lexical_search(query, k=k, filters=filters) for query in queries]
+            
+            # Generate all query embeddings in one batch
+            query_embeddings = np.vstack(self.embedder.generate_embeddings_batch(queries))
+            
+            # Search vector store
+            if mode == "hybrid":
+                return self.vector_store.hybrid_search_batch(query_embeddings, queries, k=k, filters=filters)
+            return self.vector_store.search_batch(query_embeddings, k=k, filters=filters)
+        except Exception as e:
+            logger.error(f"Error searching documents: {str(e)}")
+            return [[] for _ in queries]
+
+    async def asearch(self, query: str, k: int = 5, mode: Optional[str] = None,
+                      filters: Optional[Dict] = None) -> List[Tuple[Dict, float]]:
+        """
+        Search for relevant documents without blocking the event loop.
+        
+        The query is embedded with an async request and the index search,
+        which is CPU-bound, runs in a worker thread.
+        
+        Args:
+            query: Search query
+            k: Number of results to return
+            mode: Search mode, as in search()
+            filters: Metadata restrictions, as in search()
+            
+        Returns:
+            List of (document, score) tuples
+        """
+        try:
+            mode = mode or self.mode
+            if mode == "lexical":
+                return await asyncio.to_thread(self.vector_store.lexical_search, query, k=k, filters=filters)
+            
+            query_embedding = await self.embedder.agenerate_embedding(query)
+            
+            if mode == "hybrid":
+                results = await asyncio.to_thread(self.vector_store.hybrid_search_batch, query_embedding.reshape(1, -1),
+                                                  [query], k=k, filters=filters)
+                return results[0]
+            return await asyncio.to_thread(self.vector_store.search, query_embedding, k=k, filters=filters)
+        except Exception as e:
+            logger.error(f"Error searching documents: {str(e)}")
+            return []
+
+    async def asearch_batch(self, queries: List[str], k: int = 5, mode: Optional[str] = None,
+                            filters: Optional[Dict] = None) -> List[List[Tuple[Dict, float]]]:
+        """
+        Search for relevant documents for several queries without blocking the event loop.
+        
+        Args:
+            queries: Search queries
+            k: Number of results to return per query
+            mode: Search mode, as in search()
+            filters: Metadata restrictions applied to every query, as in search()
+            
+        Returns:
+            One list of (document, score) tuples per query
+        """
+        try:
+            if not queries:
+                return []
+            mode = mode or self.mode
+            if mode == "lexical":
+                return await asyncio.to_thread(
+                    lambda: [self.vector_store.lexical_search(query, k=k, filters=filters) for query in queries])
+            
+            query_embeddings = np.vstack(await self.embedder.agenerate_embeddings_batch(queries))
+            
+            if mode == "hybrid":
+                return await asyncio.to_thread(self.vector_store.hybrid_search_batch, query_embeddings, queries,
+                                               k=k, filters=filters)
+            return await asyncio.to_thread(self.vector_store.search_batch, query_embeddings, k=k, filters=filters)
+        except Exception as e:
+            logger.error(f"Error searching documents: {str(e)}")
+            return [[] for _ in queries]
+
 class SummarizationTool:
     """Tool for summarizing documents."""
     
@@ -71,6 +191,14 @@ class SummarizationTool:
         except Exception as e:
             logger.error(f"Error summarizing text: {str(e)}")
             return "Error generating summary."
+    
+    async def asummarize(self, text: str) -> str:
+        """Generate a summary of the text without blocking the event loop."""
+        try:
+            return await self.llm_generator.asummarize_text(text)
+        except Exception as e:
+            logger.error(f"Error summarizing text: {str(e)}")
+            return "Error generating summary."
 
 class QuizGenerationTool:
     """Tool for generating quiz questions."""
@@ -98,4 +226,12 @@ class QuizGenerationTool:
             return self.llm_generator.generate_quiz(text)
         except Exception as e:
             logger.error(f"Error generating quiz: {str(e)}")
-            return [] 
\ No newline at end of file
+            return [] 
+    
+    async def agenerate_quiz(self, text: str) -> List[Dict[str, str]]:
+        """Generate quiz questions from the text without blocking the event loop."""
+        try:
+            return await self.llm_generator.agenerate_quiz(text)
+        except Exception as e:
+            logger.error(f"Error generating quiz: {str(e)}")
+            return []
@@ -1,18 +1,32 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Dict, Union
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Union
+from contextlib import asynccontextmanager
 import os
+import json
 import logging
-from ..ingestion import IngestionPipeline
+import tempfile
+from ..ingestion import IngestionPipeline, JobManager
 from src.agent.react_agent import ReActAgent
 from src.generation.llm import LLMGenerator
 from src.retrieval.vector_store import VectorStore
+from src.retrieval.collection_manager import CollectionManager, DEFAULT_COLLECTION
+from src.agent.tools import DocumentSearchTool, SEARCH_MODES
 from src.ingestion.embedding_generator import EmbeddingGenerator
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="RAG Pipeline API")
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    yield
+    # Stop taking ingestion jobs and stop the PDF parsing processes
+    job_manager.shutdown(wait=False)
+    ingestion_pipeline.close()
+
+app = FastAPI(title="RAG Pipeline API", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -26,68 +40,283 @@ app.add_middleware(
 # Initialize components
 ingestion_pipeline = IngestionPipeline()
 vector_store = ingestion_pipeline.vector_store  # Use the vector store from the pipeline
+# Named collections; the pipeline's store is the default one
+collections = CollectionManager(default_store=vector_store, default_directory=ingestion_pipeline.vector_store_dir)
+job_manager = JobManager(ingestion_pipeline, collections=collections)
 embedder = EmbeddingGenerator()
 llm_generator = LLMGenerator()
-agent = ReActAgent(vector_store, embedder, llm_generator)
+agent = ReActAgent(vector_store, embedder, llm_generator, collections=collections)
+
+class SearchFilters(BaseModel):
+    source: Optional[List[str]] = None
+    type: Optional[List[str]] = None
+    page_min: Optional[int] = None
+    page_max: Optional[int] = None
+
+    def to_dict(self) -> Dict:
+        filters = {"source": self.source, "type": self.type}
+        if self.page_min is not None or self.page_max is not None:
+            filters["page"] = (self.page_min, self.page_max)
+        return {field: value for field, value in filters.items() if value is not None}
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    k: int = 5
+    mode: Optional[str] = None
+    filters: Optional[SearchFilters] = None
+    collection: str = DEFAULT_COLLECTION
+
+class UrlBatchRequest(BaseModel):
+    urls: List[str]
+    collection: str = DEFAULT_COLLECTION
+
+class CollectionRequest(BaseModel):
+    name: str
+
+class TextRequest(BaseModel):
+    text: str
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def event_stream(events: Iterator[str]) -> StreamingResponse:
+    """
+    Stream server-sent events. The generator is iterated in the thread
+    pool, so blocking LLM calls do not hold up the event loop.
+    """
+    return StreamingResponse(events, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def require_collection(name: str) -> None:
+    """Reject requests for invalid or unknown collections."""
+    try:
+        exists = collections.exists(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not exists:
+        raise HTTPException(status_code=404, detail=f"Unknown collection: {name}")
+
+@app.post("/collections", status_code=201)
+def create_collection(request: CollectionRequest):
+    """
+    Create an empty collection with its own index.
+    """
+    try:
+        created = collections.create(request.name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not created:
+        raise HTTPException(status_code=409, detail=f"Collection already exists: {request.name}")
+    return {"message": f"Created collection {request.name}", "name": request.name}
+
+@app.get("/collections")
+def list_collections():
+    """
+    List collections and whether each is loaded in memory.
+    """
+    return {"collections": collections.list()}
 
-@app.post("/upload/pdf")
-async def upload_pdf(file: UploadFile = File(...)):
+@app.post("/upload/pdf", status_code=202)
+async def upload_pdf(file: UploadFile = File(...), collection: str = DEFAULT_COLLECTION):
     """
-    Upload and process a PDF file.
+    Upload a PDF file and queue it for processing.
     """
+    require_collection(collection)
+    # The client's file name only names the source; it never becomes a path
+    name = os.path.basename((file.filename or "").replace("\\", "/"))
+    if name in ("", ".", ".."):
+        raise HTTPException(status_code=400, detail="Upload has no file name")
     try:
-        # Save the uploaded file
-        file_path = f"data/uploads/{file.filename}"
+        # Save the upload under a unique name, so a second upload of the same
+        # name cannot replace it before its job has run
         os.makedirs("data/uploads", exist_ok=True)
-        
-        with open(file_path, "wb") as f:
+        fd, file_path = tempfile.mkstemp(suffix=".pdf", dir="data/uploads")
+        with os.fdopen(fd, "wb") as f:
             content = await file.read()
             f.write(content)
         
-        # Process the PDF
-        ingestion_pipeline.process_pdf(file_path)
+        # Queue the PDF for processing, indexed under the upload's name
+        job = job_manager.submit_upload(file_path, name, collection)
         
-        return {"message": f"Successfully processed {file.filename}"}
+        return {"message": f"Queued {file.filename} for processing", "job_id": job.id, "status": job.status}
     except Exception as e:
         logger.error(f"Error processing PDF: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/process/url")
-async def process_url(url: str):
+@app.post("/process/url", status_code=202)
+async def process_url(url: str, collection: str = DEFAULT_COLLECTION):
     """
-    Process a webpage URL.
+    Queue a webpage URL for processing.
     """
+    require_collection(collection)
     try:
-        ingestion_pipeline.process_webpage(url)
-        return {"message": f"Successfully processed {url}"}
+        job = job_manager.submit_urls(url, collection)
+        return {"message": f"Queued {url} for processing", "job_id": job.id, "status": job.status}
     except Exception as e:
         logger.error(f"Error processing URL: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/process/urls", status_code=202)
+async def process_urls(request: UrlBatchRequest):
+    """
+    Queue several webpage URLs for processing in one job.
+    """
+    require_collection(request.collection)
+    try:
+        job = job_manager.submit_urls(request.urls, request.collection)
+        return {"message": f"Queued {len(request.urls)} URLs for processing", "job_id": job.id, "status": job.status}
+    except Exception as e:
+        logger.error(f"Error processing URLs: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/jobs")
+async def list_jobs():
+    """
+    List ingestion jobs, oldest first.
+    """
+    return {"jobs": [job.to_dict() for job in job_manager.list()]}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Report the status, progress and timings of an ingestion job.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job.to_dict()
+
+@app.delete("/sources")
+def delete_source(source: str, collection: str = DEFAULT_COLLECTION):
+    """
+    Delete every chunk of an ingested file or URL.
+    """
+    require_collection(collection)
+    try:
+        with collections.use(collection) as store:
+            pipeline = ingestion_pipeline.for_store(store, collections.directory(collection))
+            deleted = pipeline.delete_source(source)
+        return {"message": f"Deleted {deleted} chunks from {source}", "deleted": deleted}
+    except Exception as e:
+        logger.error(f"Error deleting source: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/query")
-async def process_query(query: str):
+async def process_query(query: str, collection: str = DEFAULT_COLLECTION):
     """
-    Process a user query using the ReAct agent.
+    Answer a user query, directly from search results or with the ReAct agent
+    for multi-step requests. The response names the route taken.
     """
+    require_collection(collection)
     try:
-        response = agent.process_query(query)
+        async with collections.ause(collection) as store:
+            response = await agent.aprocess_query(query, vector_store=store)
         return response
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/query/stream")
+async def stream_query(query: str, collection: str = DEFAULT_COLLECTION):
+    """
+    Answer a user query as /query does, streaming server-sent events:
+    "step" and "observation" for each tool call, "token" for the answer text,
+    "question" for quiz questions and finally "done" or "error".
+    """
+    require_collection(collection)
+    
+    def events() -> Iterator[str]:
+        with collections.use(collection) as store:
+            for event in agent.stream_query(query, vector_store=store):
+                yield sse_event(event["event"], event["data"])
+    
+    return event_stream(events())
+
+@app.post("/summarize/stream")
+async def stream_summary(request: TextRequest):
+    """
+    Summarize a text, streaming "token" events and then "done" with the summary.
+    """
+    def events() -> Iterator[str]:
+        summary = ""
+        for token in llm_generator.stream_summary(request.text):
+            summary += token
+            yield sse_event("token", {"text": token})
+        yield sse_event("done", {"type": "summary", "content": summary.strip()})
+    
+    return event_stream(events())
+
+@app.post("/quiz/stream")
+async def stream_quiz(request: TextRequest):
+    """
+    Generate quiz questions from a text, streaming a "question" event per
+    question and then "done" with all of them.
+    """
+    def events() -> Iterator[str]:
+        questions = []
+        for question in llm_generator.stream_quiz(request.text):
+            questions.append(question)
+            yield sse_event("question", question)
+        yield sse_event("done", {"type": "quiz", "questions": questions})
+    
+    return event_stream(events())
+
+@app.post("/search/batch")
+async def search_batch(request: BatchSearchRequest):
+    """
+    Search the knowledge base for several queries at once.
+    """
+    if request.mode is not None and request.mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown search mode '{request.mode}', expected one of {SEARCH_MODES}")
+    require_collection(request.collection)
+    try:
+        filters = request.filters.to_dict() if request.filters else None
+        async with collections.ause(request.collection) as store:
+            search_tool = agent.search_tool if store is vector_store else DocumentSearchTool(store, embedder)
+            results = await search_tool.asearch_batch(request.queries, k=request.k, mode=request.mode, filters=filters)
+        return {
+            "results": [
+                [{**doc, "score": score} for doc, score in query_results]
+                for query_results in results
+            ]
+        }
+    except Exception as e:
+        logger.error(f"Error searching documents: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/quiz/check")
 async def check_answer(question: str, user_answer: str, correct_answer: str):
     """
     Check a user's answer to a quiz question.
     """
     try:
-        feedback = agent.check_answer(question, user_answer, correct_answer)
+        feedback = await agent.acheck_answer(question, user_answer, correct_answer)
         return feedback
     except Exception as e:
         logger.error(f"Error checking answer: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/stats")
+def stats():
+    """
+    Report the vector store memory footprint, loaded collections, cache counters
+    and query latency per route.
+    """
+    try:
+        cache = ingestion_pipeline.embedder.cache
+        return {
+            "vector_store": vector_store.memory_usage(),
+            "collections": collections.stats(),
+            "embedding_cache": cache.stats() if cache is not None else None,
+            "query_embedding_cache": embedder.query_cache.stats(),
+            "result_cache": vector_store.result_cache.stats(),
+            "query_routes": agent.router.stats()
+        }
+    except Exception as e:
+        logger.error(f"Error collecting stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
@@ -1,9 +1,9 @@
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator
 import os
 from dotenv import load_dotenv
 import logging
 import litellm
-from litellm import completion
+from litellm import completion, acompletion
 from langchain.prompts import PromptTemplate
 from langchain_community.chat_models.litellm import ChatLiteLLM  # requires langchain-community & langchain-litellm
 
@@ -26,6 +26,12 @@ class LLMGenerator:
             model=self.model_name,
             custom_llm_provider="mistral"
         )
+        # Same model emitting tokens to callbacks as they arrive, for streamed agent runs
+        self.streaming_llm = ChatLiteLLM(
+            model=self.model_name,
+            custom_llm_provider="mistral",
+            streaming=True
+        )
 
         # Prompt templates for manual calls
         self.qa_template = PromptTemplate(
@@ -60,13 +66,27 @@ Content:
 Questions and Answers:"""
         )
 
+    def _stream_completion(self, prompt: str, max_tokens: int = 256) -> Iterator[str]:
+        """Yield the tokens of a chat completion as they arrive."""
+        stream = completion(
+            model=self.model_name,
+            custom_llm_provider="mistral",
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            stream=True,
+        )
+        for chunk in stream:
+            token = chunk.choices[0].delta.content
+            if token:
+                yield token
+
     def answer_question(self, context: str, question: str) -> str:
         """Generate an answer to a question based on context using chat completion."""
         prompt = self.qa_template.format(context=context, question=question)
         try:
             resp = completion(
                 model=self.model_name,
-                provider="mistral",
+                custom_llm_provider="mistral",
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=256,
             )
@@ -75,6 +95,30 @@ Questions and Answers:"""
             logger.error(f"Error generating answer: {e}")
             return "I apologize, but I encountered an error while generating the answer."
 
+    async def aanswer_question(self, context: str, question: str) -> str:
+        """Generate an answer to a question based on context without blocking the event loop."""
+        prompt = self.qa_template.format(context=context, question=question)
+        try:
+            resp = await acompletion(
+                model=self.model_name,
+                custom_llm_provider="mistral",
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=256,
+            )
+            return resp['choices'][0]['message']['content'].strip()
+        except Exception as e:
+            logger.error(f"Error generating answer: {e}")
+            return "I apologize, but I encountered an error while generating the answer."
+
+    def stream_answer(self, context: str, question: str) -> Iterator[str]:
+        """Stream the tokens of an answer to a question based on context."""
+        prompt = self.qa_template.format(context=context, question=question)
+        try:
+            yield from self._stream_completion(prompt)
+        except Exception as e:
+            logger.error(f"Error generating answer: {e}")
+            yield "I apologize, but I encountered an error while generating the answer."
+
     # def summarize_text(self, text: str) -> str:
     #     """Generate a summary of the given text using chat completion."""
     #     prompt = self.summary_template.format(text=text)
@@ -104,34 +148,94 @@ Questions and Answers:"""
             logger.error(f"Error generating summary: {e}")
             return "I apologize, but I encountered an error while generating the summary."
 
+    async def asummarize_text(self, text: str) -> str:
+        """Generate a summary of the given text without blocking the event loop."""
+        prompt = self.summary_template.format(text=text)
+        try:
+            response = await self.llm.ainvoke([{"role": "user", "content": prompt}])
+            return response.content.strip()
+        except Exception as e:
+            logger.error(f"Error generating summary: {e}")
+            return "I apologize, but I encountered an error while generating the summary."
+
+    def stream_summary(self, text: str) -> Iterator[str]:
+        """Stream the tokens of a summary of the given text."""
+        prompt = self.summary_template.format(text=text)
+        try:
+            for chunk in self.llm.stream([{"role": "user", "content": prompt}]):
+                if chunk.content:
+                    yield chunk.content
+        except Exception as e:
+            logger.error(f"Error generating summary: {e}")
+            yield "I apologize, but I encountered an error while generating the summary."
+
     def generate_quiz(self, text: str) -> List[Dict[str, str]]:
         """Generate quiz questions and answers from the text using chat completion."""
         prompt = self.quiz_template.format(text=text)
         try:
             resp = completion(
                 model=self.model_name,
-                provider="mistral",
+                custom_llm_provider="mistral",
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=256,
             )
             content = resp['choices'][0]['message']['content']
-            qa_pairs = []
-            current_q, current_a = None, None
-            for line in content.splitlines():
-                line = line.strip()
-                if not line:
-                    continue
-                lower = line.lower()
-                if lower.startswith(('q', 'question')):
-                    if current_q and current_a:
-                        qa_pairs.append({'question': current_q, 'answer': current_a})
-                    current_q = line.split(':', 1)[1].strip()
-                    current_a = None
-                elif lower.startswith(('a', 'answer')):
-                    current_a = line.split(':', 1)[1].strip()
-            if current_q and current_a:
-                qa_pairs.append({'question': current_q, 'answer': current_a})
-            return qa_pairs
+            return list(parse_quiz(content.splitlines()))
+        except Exception as e:
+            logger.error(f"Error generating quiz: {e}")
+            return []
+
+    async def agenerate_quiz(self, text: str) -> List[Dict[str, str]]:
+        """Generate quiz questions and answers from the text without blocking the event loop."""
+        prompt = self.quiz_template.format(text=text)
+        try:
+            resp = await acompletion(
+                model=self.model_name,
+                custom_llm_provider="mistral",
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=256,
+            )
+            content = resp['choices'][0]['message']['content']
+            return list(parse_quiz(content.splitlines()))
         except Exception as e:
             logger.error(f"Error generating quiz: {e}")
             return []
+
+    def stream_quiz(self, text: str) -> Iterator[Dict[str, str]]:
+        """
+        Generate quiz questions from the text, yielding each question and
+        answer as soon as the model moves on to the next one.
+        """
+        prompt = self.quiz_template.format(text=text)
+        try:
+            yield from parse_quiz(_lines(self._stream_completion(prompt)))
+        except Exception as e:
+            logger.error(f"Error generating quiz: {e}")
+
+def parse_quiz(lines: Iterable[str]) -> Iterator[Dict[str, str]]:
+    """Parse "Question: ..." / "Answer: ..." lines into question and answer pairs."""
+    current_q, current_a = None, None
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        lower = line.lower()
+        if lower.startswith(('q', 'question')):
+            if current_q and current_a:
+                yield {'question': current_q, 'answer': current_a}
+            current_q = line.split(':', 1)[1].strip()
+            current_a = None
+        elif lower.startswith(('a', 'answer')):
+            current_a = line.split(':', 1)[1].strip()
+    if current_q and current_a:
+        yield {'question': current_q, 'answer': current_a}
+
+def _lines(tokens: Iterable[str]) -> Iterator[str]:
+    """Join streamed tokens into complete lines."""
+    pending = ""
+    for token in tokens:
+        pending += token
+        *lines, pending = pending.split("\n")
+        yield from lines
+    if pending:
+        yield pending
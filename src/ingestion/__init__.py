@@ -1,11 +1,15 @@
 from .document_parser import DocumentParser
 from .text_chunker import TextChunker
 from .embedding_generator import EmbeddingGenerator
-from .pipeline import IngestionPipeline
+from .pipeline import IngestionPipeline, IngestionProgress
+from .jobs import IngestionJob, JobManager
 
 __all__ = [
     'DocumentParser',
     'TextChunker',
     'EmbeddingGenerator',
-    'IngestionPipeline'
+    'IngestionPipeline',
+    'IngestionProgress',
+    'IngestionJob',
+    'JobManager'
 ] 
\ No newline at end of file
@@ -1,14 +1,100 @@
 import fitz  # PyMuPDF
 import requests
 from bs4 import BeautifulSoup
-from typing import List, Dict, Union
+from typing import List, Dict, Union, Iterator, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import multiprocessing
+import threading
 import logging
+import time
+import re
+import os
+
+try:
+    import lxml.html
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Elements that never hold page content
+BOILERPLATE_TAGS = ["script", "style", "noscript", "template", "svg", "iframe", "form", "button",
+                    "nav", "footer", "aside"]
+# <header> elements are site banners unless they head an article or the main content
+CONTENT_TAGS = ["article", "main"]
+# class/id values of navigation, cookie banners, share widgets and the like
+BOILERPLATE_PATTERN = re.compile(
+    r"\b(nav|navbar|menu|footer|sidebar|cookie|consent|banner|advert|ads?|breadcrumbs?|"
+    r"comments?|share|social|popup|modal|newsletter|subscribe|related)\b", re.IGNORECASE
+)
+HEADING_TAGS = ["h1", "h2", "h3", "h4", "h5", "h6"]
+# Elements whose boundaries end a paragraph
+BLOCK_TAGS = HEADING_TAGS + ["p", "div", "section", "article", "main", "li", "ul", "ol", "dl", "dt", "dd",
+                             "pre", "blockquote", "table", "tr", "td", "th", "figcaption", "br", "hr"]
+HEADING_MARK = "\ue000"  # private-use character marking the start of a heading
+
+# Connection pool reused across webpage requests
+_session = requests.Session()
+
+def _parse_page_range(file_path: str, start: int, end: int) -> List[Dict[str, Union[str, int]]]:
+    """Extract the pages [start, end) of a PDF; runs in a worker process."""
+    chunks = []
+    with fitz.open(file_path) as doc:
+        for page_num in range(start, min(end, doc.page_count)):
+            text = doc[page_num].get_text()
+            if text.strip():
+                chunks.append({
+                    "text": text,
+                    "source": file_path,
+                    "page": page_num + 1,
+                    "type": "pdf"
+                })
+    return chunks
+
 class DocumentParser:
-    """Parser for PDF and web documents."""
+    """
+    Parser for PDF and web documents.
+    
+    Parallel PDF parsing uses a process pool owned by the parser, started
+    on first use and stopped by close(). Workers are started with
+    forkserver (spawn where it is unavailable), never forked from the
+    multi-threaded API server, which can deadlock on locks held by other
+    threads at fork time.
+    """
+    
+    def __init__(self, workers: Optional[int] = None):
+        """
+        Initialize the parser.
+        
+        Args:
+            workers: Processes parsing PDF pages in parallel (default: PDF_PARSE_WORKERS or CPU count)
+        """
+        self.workers = workers or int(os.getenv("PDF_PARSE_WORKERS", os.cpu_count() or 1))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+    
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Return the parser's process pool, starting it on first use."""
+        with self._pool_lock:
+            if self._pool is None:
+                if "forkserver" in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context("forkserver")
+                    # Workers are forked from a server that has already imported the parser
+                    context.set_forkserver_preload([__name__])
+                else:
+                    context = multiprocessing.get_context("spawn")
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._pool
+    
+    def close(self) -> None:
+        """Stop the worker processes; the pool is restarted if parallel parsing is used again."""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
     
     @staticmethod
     def parse_pdf(file_path: str) -> List[Dict[str, Union[str, int]]]:
@@ -40,6 +126,78 @@ class DocumentParser:
             logger.error(f"Error parsing PDF {file_path}: {str(e)}")
             return []
     
+    def parse_pdf_parallel(self, file_path: str,
+                           pages_per_task: Optional[int] = None) -> Iterator[Dict[str, Union[str, int]]]:
+        """
+        Parse a PDF by sharding page ranges across the process pool.
+        
+        Args:
+            file_path: Path to the PDF file
+            pages_per_task: Pages per task (default: PDF_PAGES_PER_TASK or 16)
+            
+        Yields:
+            Dictionaries containing page text and metadata, in page order
+        """
+        return self.parse_pdfs_parallel([file_path], pages_per_task)
+    
+    def parse_pdfs_parallel(self, file_paths: List[str],
+                            pages_per_task: Optional[int] = None) -> Iterator[Dict[str, Union[str, int]]]:
+        """
+        Parse several PDFs by sharding their page ranges across a process pool.
+        
+        Pages are yielded file by file in page order as soon as their range is
+        parsed, with at most two ranges per worker in flight, so ranges of the
+        next file are already being parsed while the current one finishes.
+        A single small PDF, or any PDF when the parser has one worker, is
+        parsed serially in the calling process.
+        
+        Args:
+            file_paths: Paths to the PDF files
+            pages_per_task: Pages per task (default: PDF_PAGES_PER_TASK or 16)
+            
+        Yields:
+            Dictionaries containing page text and metadata
+        """
+        workers = self.workers
+        pages_per_task = pages_per_task or int(os.getenv("PDF_PAGES_PER_TASK", 16))
+        start_time = time.perf_counter()
+        
+        # One task per page range of every file
+        tasks = deque()
+        total_pages = 0
+        for file_path in file_paths:
+            try:
+                with fitz.open(file_path) as doc:
+                    page_count = doc.page_count
+            except Exception as e:
+                logger.error(f"Error parsing PDF {file_path}: {str(e)}")
+                continue
+            total_pages += page_count
+            tasks.extend((file_path, start, start + pages_per_task) for start in range(0, page_count, pages_per_task))
+        
+        if workers <= 1 or len(tasks) <= 1:
+            for task in tasks:
+                try:
+                    yield from _parse_page_range(*task)
+                except Exception as e:
+                    logger.error(f"Error parsing PDF {task[0]}: {str(e)}")
+        else:
+            pool = self._get_pool()
+            in_flight = deque()
+            while tasks or in_flight:
+                while tasks and len(in_flight) < 2 * workers:
+                    task = tasks.popleft()
+                    in_flight.append((task, pool.submit(_parse_page_range, *task)))
+                task, future = in_flight.popleft()
+                try:
+                    yield from future.result()
+                except Exception as e:
+                    logger.error(f"Error parsing pages {task[1] + 1}-{task[2]} of PDF {task[0]}: {str(e)}")
+        
+        elapsed = time.perf_counter() - start_time
+        logger.info(f"Parsed {total_pages} pages from {len(file_paths)} PDF(s) in {elapsed:.2f}s "
+                    f"({total_pages / max(elapsed, 1e-9):.1f} pages/sec)")
+    
     @staticmethod
     def parse_webpage(url: str) -> List[Dict[str, Union[str, int]]]:
         """
@@ -52,32 +210,44 @@ class DocumentParser:
             List of dictionaries containing text chunks and metadata
         """
         try:
-            response = requests.get(url)
+            response = _session.get(url, timeout=float(os.getenv("WEB_FETCH_TIMEOUT", 30)))
             response.raise_for_status()
+            return DocumentParser.parse_html(response.text, url)
+        except Exception as e:
+            logger.error(f"Error parsing webpage {url}: {str(e)}")
+            return []
+    
+    @staticmethod
+    def parse_html(html: str, url: str, max_chars: int = 500) -> List[Dict[str, Union[str, int]]]:
+        """
+        Extract text with metadata from an already fetched webpage.
+        
+        Navigation, footers, scripts and similar boilerplate are removed and
+        the remaining paragraphs are merged into sections of up to max_chars
+        characters, starting a new section at each heading, so a page yields
+        a few chunk-sized documents rather than one per line. Uses lxml when
+        it is installed and BeautifulSoup's html.parser otherwise.
+        
+        Args:
+            html: HTML of the page
+            url: URL of the page, recorded as the source
+            max_chars: Target section size, normally the chunker's chunk size
             
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-            
-            # Get text content
-            text = soup.get_text(separator='\n', strip=True)
-            
-            # Split into paragraphs
-            paragraphs = [p.strip() for p in text.split('\n') if p.strip()]
-            
-            chunks = []
-            for i, para in enumerate(paragraphs):
-                if para:
-                    chunks.append({
-                        "text": para,
-                        "source": url,
-                        "section": i + 1,
-                        "type": "web"
-                    })
-            
-            return chunks
+        Returns:
+            List of dictionaries containing text sections and metadata
+        """
+        try:
+            text = _extract_text_lxml(html) if HAS_LXML else _extract_text_bs4(html)
+            sections = _merge_paragraphs(_split_paragraphs(text), max_chars)
+            return [
+                {
+                    "text": section,
+                    "source": url,
+                    "section": i + 1,
+                    "type": "web"
+                }
+                for i, section in enumerate(sections)
+            ]
         except Exception as e:
             logger.error(f"Error parsing webpage {url}: {str(e)}")
             return []
@@ -95,4 +265,78 @@ class DocumentParser:
         """
         # Remove extra whitespace
         text = ' '.join(text.split())
-        return text.strip() 
\ No newline at end of file
+        return text.strip() 
+
+def _is_boilerplate(tag: str, attributes: str) -> bool:
+    return tag not in ("html", "body", "main", "article") and bool(BOILERPLATE_PATTERN.search(attributes))
+
+def _extract_text_lxml(html: str) -> str:
+    """Strip boilerplate with lxml and return the text with one paragraph per line."""
+    root = lxml.html.document_fromstring(html)
+    for element in root.xpath("|".join(f"//{tag}" for tag in BOILERPLATE_TAGS)):
+        element.drop_tree()
+    in_content = " or ".join(f"ancestor::{tag}" for tag in CONTENT_TAGS)
+    for element in root.xpath(f"//header[not({in_content} or ancestor::*[@role='main'])]"):
+        element.drop_tree()
+    for element in [element for element in root.iter() if isinstance(element.tag, str)
+                    and _is_boilerplate(element.tag, f"{element.get('class', '')} {element.get('id', '')}")]:
+        element.drop_tree()
+    
+    # Keep only the main content when the page marks it
+    content = root.xpath("//main | //*[@role='main']") or sorted(
+        root.xpath("//article"), key=lambda element: len(element.text_content()), reverse=True)
+    root = content[0] if content else root
+    
+    for element in root.iter(*BLOCK_TAGS):
+        mark = HEADING_MARK if element.tag in HEADING_TAGS else ""
+        element.text = "\n" + mark + (element.text or "")
+        element.tail = "\n" + (element.tail or "")
+    return root.text_content()
+
+def _extract_text_bs4(html: str) -> str:
+    """Strip boilerplate with BeautifulSoup and return the text with one paragraph per line."""
+    soup = BeautifulSoup(html, "html.parser")
+    for element in soup(BOILERPLATE_TAGS):
+        element.decompose()
+    for element in soup.find_all("header"):
+        if not element.decomposed and element.find_parent(CONTENT_TAGS) is None \
+                and element.find_parent(attrs={"role": "main"}) is None:
+            element.decompose()
+    for element in soup.find_all(lambda element: _is_boilerplate(
+            element.name, f"{' '.join(element.get('class') or [])} {element.get('id') or ''}")):
+        if not element.decomposed:
+            element.decompose()
+    
+    # Keep only the main content when the page marks it
+    root = soup.find("main") or soup.find(attrs={"role": "main"}) or max(
+        soup.find_all("article"), key=lambda element: len(element.get_text()), default=soup)
+    
+    for element in root.find_all(BLOCK_TAGS):
+        element.insert(0, "\n" + (HEADING_MARK if element.name in HEADING_TAGS else ""))
+        element.insert_after("\n")
+    return root.get_text()
+
+def _split_paragraphs(text: str) -> List[Tuple[str, bool]]:
+    """Split extracted text into (paragraph, is_heading) pairs, dropping repeats."""
+    paragraphs = []
+    for line in text.split("\n"):
+        heading = line.startswith(HEADING_MARK)
+        line = " ".join(line.replace(HEADING_MARK, " ").split())
+        if line and (not paragraphs or paragraphs[-1][0] != line):
+            paragraphs.append((line, heading))
+    return paragraphs
+
+def _merge_paragraphs(paragraphs: List[Tuple[str, bool]], max_chars: int) -> List[str]:
+    """Merge consecutive paragraphs into sections of up to max_chars, breaking at headings."""
+    sections, current, size, has_body = [], [], 0, False
+    for text, heading in paragraphs:
+        # Headings stay attached to the paragraph that follows them
+        if has_body and (heading or size + len(text) > max_chars):
+            sections.append("\n\n".join(current))
+            current, size, has_body = [], 0, False
+        current.append(text)
+        size += len(text) + 2
+        has_body = has_body or not heading
+    if current:
+        sections.append("\n\n".join(current))
+    return sections
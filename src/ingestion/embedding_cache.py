@@ -0,0 +1,171 @@
+from typing import List, Dict, Optional
+import numpy as np
+import logging
+import hashlib
+import sqlite3
+import threading
+import time
+import os
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class EmbeddingCache:
+    """
+    Disk-backed, content-addressed cache of embedding vectors.
+
+    Entries are keyed on a hash of the model name and the whitespace
+    normalized text, stored in SQLite (WAL mode) so several processes can
+    share one cache file, and evicted least-recently-used once the cache
+    holds more than max_entries vectors. Recency is only recorded to within
+    touch_interval seconds, so repeated hits do not each write to the file.
+    """
+
+    def __init__(self, path: str, max_entries: int = 500000, touch_interval: float = 3600.0):
+        """
+        Initialize the embedding cache.
+
+        Args:
+            path: SQLite database file
+            max_entries: Maximum number of cached vectors
+            touch_interval: Minimum age in seconds of an entry's last use before
+                a hit records it again
+        """
+        self.path = os.path.abspath(path)
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        # Upper bound on the entries, counted exactly only once it passes max_entries;
+        # other processes' inserts are seen at that recount
+        self._approx_entries = self._count()
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        """
+        Compute the cache key of a text.
+
+        Args:
+            model: Embedding model name
+            text: Text to embed
+
+        Returns:
+            Hex digest of the model name and normalized text
+        """
+        normalized = " ".join(text.split())
+        return hashlib.sha256(f"{model}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[int, np.ndarray]:
+        """
+        Look up cached embeddings.
+
+        Args:
+            model: Embedding model name
+            texts: Texts to look up
+
+        Returns:
+            Mapping from position in texts to cached vector, for hits only
+        """
+        keys = [self.key(model, text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+        stale: List[str] = []
+        unique_keys = list(set(keys))
+        now = time.time()
+        with self._lock:
+            # Stay below SQLite's bound-parameter limit
+            for i in range(0, len(unique_keys), 500):
+                chunk = unique_keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector, last_used FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for k, v, last_used in rows:
+                    found[k] = np.frombuffer(v, dtype=np.float32)
+                    if now - last_used >= self.touch_interval:
+                        stale.append(k)
+            if stale:
+                self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                       [(now, k) for k in stale])
+                self._conn.commit()
+
+            result = {i: found[k] for i, k in enumerate(keys) if k in found}
+            self.hits += len(result)
+            self.misses += len(texts) - len(result)
+        return result
+
+    def put_many(self, model: str, texts: List[str], vectors: List[np.ndarray]) -> None:
+        """
+        Store embeddings, skipping zero or NaN vectors returned for failed requests.
+
+        Args:
+            model: Embedding model name
+            texts: Embedded texts
+            vectors: Embedding of each text
+        """
+        now = time.time()
+        rows = [
+            (self.key(model, text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+            if np.any(vector) and np.isfinite(vector).all()
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            # Replaced rows are counted too, which only brings the recount forward
+            self._approx_entries += len(rows)
+            if self._approx_entries > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _count(self) -> int:
+        """Count the cached vectors."""
+        return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _evict(self) -> None:
+        """
+        Delete the least recently used entries above max_entries. Must hold the lock.
+
+        A further 1% of max_entries is evicted, so a full cache is not
+        counted again on every put.
+        """
+        count = self._count()
+        excess = count - self.max_entries
+        if excess > 0:
+            excess += self.max_entries // 100
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+            )
+            count -= excess
+            logger.info(f"Evicted {excess} entries from embedding cache")
+        self._approx_entries = count
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """
+        Report cache counters.
+
+        Returns:
+            Dictionary with hits, misses, hit rate and number of entries
+        """
+        with self._lock:
+            entries = self._count()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else None,
+            "entries": entries,
+            "max_entries": self.max_entries,
+        }
@@ -1,15 +1,33 @@
-from typing import List, Dict, Union
+from typing import List, Dict, Union, Iterator, Tuple, Optional
 import litellm
-from litellm import embedding
+from litellm import embedding, aembedding
 import os
 from dotenv import load_dotenv
 import logging
+import asyncio
+import random
 import numpy as np
+from .rate_limiter import AsyncRateLimiter
+from .embedding_cache import EmbeddingCache
+from ..retrieval.result_cache import LRUCache
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Errors worth retrying: throttling, transient server and network failures
+RETRYABLE_ERRORS = (
+    litellm.RateLimitError,
+    litellm.ServiceUnavailableError,
+    litellm.InternalServerError,
+    litellm.APIConnectionError,
+    litellm.Timeout,
+)
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used to size batches."""
+    return len(text) // 4 + 1
+
 class EmbeddingGenerator:
     """Generates embeddings for text using Mistral's embedding model with automatic batch splitting."""
 
@@ -19,34 +37,131 @@ class EmbeddingGenerator:
         if not self.api_key:
             raise ValueError("MISTRAL_API_KEY environment variable not set")
         litellm.api_key = self.api_key
+        self.model_name = "mistral/mistral-embed"
         # maximum number of texts per initial batch
         self.batch_size = int(os.getenv("EMBED_BATCH_SIZE", 50))
+        # maximum estimated tokens per batch, kept below the model's request limit
+        self.max_batch_tokens = int(os.getenv("EMBED_MAX_BATCH_TOKENS", 12000))
+        # async path: batches in flight, retry budget and rate limits (0 = unlimited)
+        self.concurrency = int(os.getenv("EMBED_CONCURRENCY", 4))
+        self.max_retries = int(os.getenv("EMBED_MAX_RETRIES", 5))
+        self.rate_limiter = AsyncRateLimiter(
+            requests_per_minute=int(os.getenv("EMBED_RPM", 0)),
+            tokens_per_minute=int(os.getenv("EMBED_TPM", 0)),
+        )
+        # persistent cache of document embeddings (empty EMBED_CACHE_PATH disables it)
+        cache_path = os.getenv("EMBED_CACHE_PATH", "data/embedding_cache.sqlite")
+        self.cache = EmbeddingCache(
+            cache_path, max_entries=int(os.getenv("EMBED_CACHE_MAX_ENTRIES", 500000)),
+            touch_interval=float(os.getenv("EMBED_CACHE_TOUCH_SECONDS", 3600))
+        ) if cache_path else None
+        # in-memory cache for query embeddings, which are often repeated
+        self.query_cache = LRUCache(max_size=int(os.getenv("QUERY_EMBED_CACHE_SIZE", 1024)))
+
+    def _lookup_cache(self, texts: List[str]) -> Tuple[List[Optional[np.ndarray]], Dict[str, List[int]]]:
+        """
+        Resolve texts from the embedding cache.
+
+        Returns:
+            (embeddings with None for misses, mapping of each distinct missing text to its positions)
+        """
+        embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+        if self.cache is not None:
+            for i, emb in self.cache.get_many(self.model_name, texts).items():
+                embeddings[i] = emb
+        missing: Dict[str, List[int]] = {}
+        for i, (text, emb) in enumerate(zip(texts, embeddings)):
+            if emb is None:
+                missing.setdefault(text, []).append(i)
+        return embeddings, missing
+
+    def _fill_cache(self, embeddings: List[Optional[np.ndarray]], missing: Dict[str, List[int]],
+                    computed: List[np.ndarray]) -> List[np.ndarray]:
+        """Place freshly computed embeddings and store them in the cache."""
+        for positions, emb in zip(missing.values(), computed):
+            for i in positions:
+                embeddings[i] = emb
+        if self.cache is not None:
+            self.cache.put_many(self.model_name, list(missing), computed)
+        return embeddings
+
+    def _token_batches(self, texts: List[str]) -> Iterator[Tuple[int, int, int]]:
+        """
+        Split texts into consecutive batches bounded by item count and estimated tokens.
+
+        Yields:
+            (start, end, estimated_tokens) for each batch
+        """
+        start, tokens = 0, 0
+        for i, text in enumerate(texts):
+            text_tokens = estimate_tokens(text)
+            if i > start and (i - start >= self.batch_size or tokens + text_tokens > self.max_batch_tokens):
+                yield start, i, tokens
+                start, tokens = i, 0
+            tokens += text_tokens
+        if start < len(texts):
+            yield start, len(texts), tokens
 
     def generate_embedding(self, text: str) -> np.ndarray:
         """
-        Generate embedding for a single text.
+        Generate embedding for a single text, served from the query LRU cache when repeated.
         """
+        key = " ".join(text.split())
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return cached
         try:
             resp = embedding(
-                model="mistral/mistral-embed",
+                model=self.model_name,
                 input=[text],
             )
-            return np.array(resp["data"][0]["embedding"])
+            result = np.array(resp["data"][0]["embedding"], dtype=np.float32)
+            self.query_cache.put(key, result)
+            return result
         except Exception as e:
             logger.error(f"Error generating embedding: {e}")
-            return np.zeros(1024)
+            return np.zeros(1024, dtype=np.float32)
+
+    async def agenerate_embedding(self, text: str) -> np.ndarray:
+        """
+        Generate embedding for a single text without blocking the event loop,
+        served from the query LRU cache when repeated.
+        """
+        key = " ".join(text.split())
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return cached
+        try:
+            resp = await aembedding(
+                model=self.model_name,
+                input=[text],
+            )
+            result = np.array(resp["data"][0]["embedding"], dtype=np.float32)
+            self.query_cache.put(key, result)
+            return result
+        except Exception as e:
+            logger.error(f"Error generating embedding: {e}")
+            return np.zeros(1024, dtype=np.float32)
 
     def generate_embeddings_batch(self, texts: List[str]) -> List[np.ndarray]:
         """
         Generate embeddings for multiple texts in batch, recursively splitting on token errors.
+        Texts found in the embedding cache are not sent to the API.
         """
+        embeddings, missing = self._lookup_cache(texts)
+        if not missing:
+            return embeddings
+        return self._fill_cache(embeddings, missing, self._generate_uncached(list(missing)))
+
+    def _generate_uncached(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed texts through the API in token-sized batches."""
         def process_batch(batch_texts: List[str]) -> List[np.ndarray]:
             try:
                 resp = embedding(
-                    model="mistral/mistral-embed",
+                    model=self.model_name,
                     input=batch_texts,
                 )
-                return [np.array(item["embedding"]) for item in resp["data"]]
+                return [np.array(item["embedding"], dtype=np.float32) for item in resp["data"]]
             except litellm.BadRequestError as e:
                 # split into smaller batches if too many tokens
                 if len(batch_texts) > 1:
@@ -54,28 +169,112 @@ class EmbeddingGenerator:
                     return process_batch(batch_texts[:mid]) + process_batch(batch_texts[mid:])
                 else:
                     logger.error(f"Single text too large to embed, returning zeros: {batch_texts[0][:50]}...")
-                    return [np.zeros(1024)]
+                    return [np.zeros(1024, dtype=np.float32)]
             except Exception as e:
                 logger.error(f"Unexpected error in batch embedding: {e}")
-                return [np.zeros(1024) for _ in batch_texts]
+                return [np.zeros(1024, dtype=np.float32) for _ in batch_texts]
 
         embeddings: List[np.ndarray] = []
-        # initial slicing into manageable chunks
-        for i in range(0, len(texts), self.batch_size):
-            batch = texts[i : i + self.batch_size]
-            embeddings.extend(process_batch(batch))
+        # initial slicing into batches that fit the token limit
+        for start, end, _ in self._token_batches(texts):
+            embeddings.extend(process_batch(texts[start:end]))
         return embeddings
 
+    async def agenerate_embeddings_batch(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Generate embeddings for multiple texts with several batches in flight.
+
+        Batches are sized by estimated tokens, at most `concurrency` requests
+        run at once, the requests/tokens-per-minute budget is respected and
+        throttling or transient errors are retried with exponential backoff.
+        Texts found in the embedding cache are not sent to the API.
+        """
+        embeddings, missing = self._lookup_cache(texts)
+        if not missing:
+            return embeddings
+        computed = await self._agenerate_uncached(list(missing))
+        return self._fill_cache(embeddings, missing, computed)
+
+    async def _agenerate_uncached(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed texts through the API with several token-sized batches in flight."""
+        semaphore = asyncio.Semaphore(max(self.concurrency, 1))
+
+        async def request(batch_texts: List[str], tokens: int) -> List[np.ndarray]:
+            for attempt in range(self.max_retries + 1):
+                await self.rate_limiter.acquire(tokens)
+                try:
+                    resp = await aembedding(
+                        model=self.model_name,
+                        input=batch_texts,
+                    )
+                    return [np.array(item["embedding"], dtype=np.float32) for item in resp["data"]]
+                except RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = min(2 ** attempt, 30) + random.uniform(0, 1)
+                    logger.warning(f"Embedding request failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+
+        async def process_batch(batch_texts: List[str], tokens: int) -> List[np.ndarray]:
+            try:
+                async with semaphore:
+                    return await request(batch_texts, tokens)
+            except litellm.BadRequestError as e:
+                # the token estimate was too low: split and retry the halves concurrently
+                if len(batch_texts) > 1:
+                    mid = len(batch_texts) // 2
+                    left, right = batch_texts[:mid], batch_texts[mid:]
+                    halves = await asyncio.gather(
+                        process_batch(left, sum(estimate_tokens(t) for t in left)),
+                        process_batch(right, sum(estimate_tokens(t) for t in right)),
+                    )
+                    return halves[0] + halves[1]
+                logger.error(f"Single text too large to embed, returning zeros: {batch_texts[0][:50]}...")
+                return [np.zeros(1024, dtype=np.float32)]
+            except Exception as e:
+                logger.error(f"Unexpected error in batch embedding: {e}")
+                return [np.zeros(1024, dtype=np.float32) for _ in batch_texts]
+
+        results = await asyncio.gather(*[
+            process_batch(texts[start:end], tokens) for start, end, tokens in self._token_batches(texts)
+        ])
+        return [emb for batch in results for emb in batch]
+
     def embed_documents(self, documents: List[Dict[str, Union[str, int]]]) -> List[Dict[str, Union[str, int, np.ndarray]]]:
         """
         Embed a list of documents and attach embedding vectors.
         """
         try:
             texts = [doc["text"] for doc in documents]
-            embeddings = self.generate_embeddings_batch(texts)
+            if self.concurrency > 1 and not _in_event_loop():
+                embeddings = asyncio.run(self.agenerate_embeddings_batch(texts))
+            else:
+                embeddings = self.generate_embeddings_batch(texts)
             for doc, emb in zip(documents, embeddings):
                 doc["embedding"] = emb
             return documents
         except Exception as e:
             logger.error(f"Error embedding documents: {e}")
             return documents
+
+    async def aembed_documents(self, documents: List[Dict[str, Union[str, int]]]) -> List[Dict[str, Union[str, int, np.ndarray]]]:
+        """
+        Embed a list of documents concurrently and attach embedding vectors.
+        """
+        try:
+            texts = [doc["text"] for doc in documents]
+            embeddings = await self.agenerate_embeddings_batch(texts)
+            for doc, emb in zip(documents, embeddings):
+                doc["embedding"] = emb
+            return documents
+        except Exception as e:
+            logger.error(f"Error embedding documents: {e}")
+            return documents
+
+def _in_event_loop() -> bool:
+    """Check whether the current thread is running an asyncio event loop."""
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
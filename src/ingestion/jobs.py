@@ -0,0 +1,171 @@
+from typing import Dict, List, Optional, Union
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import logging
+import time
+import uuid
+import os
+from .pipeline import IngestionPipeline, IngestionProgress
+from ..retrieval.collection_manager import CollectionManager, DEFAULT_COLLECTION
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class IngestionJob(IngestionProgress):
+    """Progress and status of one queued ingestion."""
+
+    def __init__(self, kind: str, sources: Union[str, List[str]], collection: str = DEFAULT_COLLECTION,
+                 files: Optional[List[str]] = None):
+        """
+        Initialize the job.
+
+        Args:
+            kind: "pdf" or "url"
+            sources: File path or URL(s) to ingest
+            collection: Collection the sources are indexed into
+            files: Temporary files holding the PDF sources, removed once the job
+                has run; by default each source is a file path and is kept
+        """
+        super().__init__()
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.sources = [sources] if isinstance(sources, str) else list(sources)
+        self.collection = collection
+        self.files = files
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self) -> Dict:
+        now = time.time()
+        started = self.started_at or now
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "sources": self.sources,
+            "collection": self.collection,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "queued_seconds": round(started - self.created_at, 3),
+            "elapsed_seconds": round((self.finished_at or now) - started, 3) if self.started_at else None,
+            **super().to_dict(),
+        }
+
+class JobManager:
+    """
+    Runs ingestions in a background worker pool.
+
+    Submitting returns immediately with a job whose counters are updated by
+    the pipeline as it runs. Ingestion defaults to a single worker, since
+    concurrent runs only contend for the same embedding budget and vector
+    store lock; finished jobs are kept for status queries up to max_history.
+    """
+
+    def __init__(self, pipeline: IngestionPipeline, workers: Optional[int] = None,
+                 max_history: Optional[int] = None, collections: Optional[CollectionManager] = None):
+        """
+        Initialize the job manager.
+
+        Args:
+            pipeline: Pipeline running the ingestions
+            collections: Routes each job to the store of its collection; without it
+                every job indexes into the pipeline's own store
+            workers: Concurrent ingestions (default: INGEST_JOB_WORKERS or 1)
+            max_history: Finished jobs kept (default: INGEST_JOB_HISTORY or 1000)
+        """
+        self.pipeline = pipeline
+        self.collections = collections
+        self.workers = workers or int(os.getenv("INGEST_JOB_WORKERS", 1))
+        self.max_history = max_history or int(os.getenv("INGEST_JOB_HISTORY", 1000))
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest-job")
+
+    def submit_pdf(self, file_path: str, collection: str = DEFAULT_COLLECTION) -> IngestionJob:
+        """Queue the ingestion of a PDF file."""
+        return self._submit(IngestionJob("pdf", file_path, collection))
+
+    def submit_upload(self, file_path: str, source: str, collection: str = DEFAULT_COLLECTION) -> IngestionJob:
+        """
+        Queue the ingestion of an uploaded PDF saved to a temporary file.
+
+        Args:
+            file_path: Temporary file holding the upload, removed once the job has run
+            source: Source the chunks are indexed under, such as the upload's name
+            collection: Collection the upload is indexed into
+
+        Returns:
+            Queued job
+        """
+        return self._submit(IngestionJob("pdf", source, collection, files=[file_path]))
+
+    def submit_urls(self, urls: Union[str, List[str]], collection: str = DEFAULT_COLLECTION) -> IngestionJob:
+        """Queue the ingestion of one or more webpages."""
+        return self._submit(IngestionJob("url", urls, collection))
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        """Return a job by id, or None if it is unknown or was evicted."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[IngestionJob]:
+        """Return all known jobs, oldest first."""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting jobs and optionally wait for running ones."""
+        self._executor.shutdown(wait=wait)
+
+    def _submit(self, job: IngestionJob) -> IngestionJob:
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+        self._executor.submit(self._run, job)
+        logger.info(f"Queued {job.kind} ingestion job {job.id} for {len(job.sources)} source(s)")
+        return job
+
+    def _run(self, job: IngestionJob) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            if self.collections is None:
+                succeeded = self._ingest(self.pipeline, job)
+            else:
+                # The collection stays loaded until the job has saved it
+                with self.collections.use(job.collection) as store:
+                    pipeline = self.pipeline.for_store(store, self.collections.directory(job.collection))
+                    succeeded = self._ingest(pipeline, job)
+        except Exception as e:
+            logger.error(f"Error running ingestion job {job.id}: {str(e)}")
+            job.fail(str(e))
+            succeeded = False
+        for path in job.files or []:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Could not remove {path}: {str(e)}")
+        job.finished_at = time.time()
+        job.status = "succeeded" if succeeded else "failed"
+        logger.info(f"Ingestion job {job.id} {job.status} in {job.finished_at - job.started_at:.2f}s")
+
+    @staticmethod
+    def _ingest(pipeline: IngestionPipeline, job: IngestionJob) -> bool:
+        if job.kind == "pdf":
+            return all([pipeline.process_pdf(path, progress=job, source=source)
+                        for path, source in zip(job.files or job.sources, job.sources)])
+        return all(pipeline.process_webpages(job.sources, progress=job).values())
+
+    def _evict(self) -> None:
+        """Drop the oldest finished jobs above max_history. Must hold the lock."""
+        excess = len(self._jobs) - self.max_history
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done][:max(excess, 0)]:
+            del self._jobs[job_id]
@@ -1,33 +1,86 @@
-from typing import List, Dict, Union
+from typing import List, Dict, Union, Iterable, Optional
 import os
+import copy
+import queue
+import hashlib
 import logging
+import threading
+import time
 from .document_parser import DocumentParser
 from .text_chunker import TextChunker
 from .embedding_generator import EmbeddingGenerator
+from .web_fetcher import WebFetcher, HTTPCache
 from ..retrieval.vector_store import VectorStore
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Parsed pages tokenized together by the chunker
+PAGES_PER_CHUNK_BATCH = 32
+
+class IngestionProgress:
+    """Thread-safe counters and per-stage timings of one ingestion run."""
+    
+    COUNTERS = ("pages_parsed", "chunks", "chunks_embedded", "vectors_indexed", "vectors_rejected",
+                "vectors_deleted", "sources_unchanged")
+    STAGES = ("fetch", "parse", "embed", "index", "save")
+    
+    def __init__(self):
+        self.counters = {name: 0 for name in self.COUNTERS}
+        self.stage_seconds = {stage: 0.0 for stage in self.STAGES}
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+    
+    def advance(self, counter: str, amount: int = 1) -> None:
+        """Increase a counter."""
+        with self._lock:
+            self.counters[counter] += amount
+    
+    def record_time(self, stage: str, seconds: float) -> None:
+        """Add time spent working in a stage."""
+        with self._lock:
+            self.stage_seconds[stage] += seconds
+    
+    def fail(self, message: str) -> None:
+        """Record the error that stopped the run."""
+        self.error = message
+    
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                **self.counters,
+                "stage_seconds": {stage: round(seconds, 3) for stage, seconds in self.stage_seconds.items()},
+                "error": self.error,
+            }
+
 class IngestionPipeline:
     """Main pipeline for document ingestion and indexing."""
     
-    def __init__(self, vector_store_dir: str = "data/vector_store"):
+    def __init__(self, vector_store_dir: str = "data/vector_store", vector_store: Optional[VectorStore] = None):
         """
         Initialize the ingestion pipeline.
         
         Args:
             vector_store_dir: Directory to store the vector store
+            vector_store: Already loaded store to index into; by default one is loaded from vector_store_dir
         """
         self.parser = DocumentParser()
         self.chunker = TextChunker()
         self.embedder = EmbeddingGenerator()
-        self.vector_store = VectorStore()
+        self.vector_store = vector_store or VectorStore()
+        # Pages and validators kept for conditional requests
+        http_cache_path = os.getenv("WEB_CACHE_PATH", "data/http_cache.sqlite")
+        self.fetcher = WebFetcher(HTTPCache(http_cache_path) if http_cache_path else None)
         self.vector_store_dir = os.path.abspath(vector_store_dir)
+        # Chunks per embedding/indexing micro-batch and the ceiling on data in flight
+        self.batch_size = int(os.getenv("INGEST_BATCH_SIZE", 256))
+        self.max_buffer_bytes = int(float(os.getenv("INGEST_MAX_BUFFER_MB", 256)) * 1024 * 1024)
         
         # Create vector store directory if it doesn't exist
         os.makedirs(self.vector_store_dir, exist_ok=True)
         
+        if vector_store is not None:
+            return
         # Try to load existing vector store
         try:
             self.vector_store.load(self.vector_store_dir)
@@ -35,87 +88,320 @@ class IngestionPipeline:
         except Exception as e:
             logger.warning(f"Could not load existing vector store: {str(e)}")
     
-    def process_pdf(self, file_path: str) -> None:
+    def for_store(self, vector_store: VectorStore, vector_store_dir: str) -> "IngestionPipeline":
+        """
+        Return a pipeline indexing into another vector store, such as one
+        collection, that shares this pipeline's parser, chunker, embedder
+        and fetcher.
+        
+        Args:
+            vector_store: Store to index into
+            vector_store_dir: Directory the store is saved to
+            
+        Returns:
+            Pipeline bound to the store
+        """
+        if vector_store is self.vector_store:
+            return self
+        pipeline = copy.copy(self)
+        pipeline.vector_store = vector_store
+        pipeline.vector_store_dir = os.path.abspath(vector_store_dir)
+        return pipeline
+    
+    def close(self) -> None:
+        """Stop the PDF parsing processes. Pipelines returned by for_store share them."""
+        self.parser.close()
+    
+    def process_pdf(self, file_path: str, progress: Optional[IngestionProgress] = None,
+                    source: Optional[str] = None) -> bool:
         """
         Process a PDF file through the pipeline.
         
+        A file whose bytes hash to the value recorded for its source is
+        skipped without parsing.
+        
         Args:
             file_path: Path to the PDF file
+            progress: Receives counters, timings and the error of the run
+            source: Source the chunks are indexed under (default: file_path), e.g.
+                the name of an upload saved to a temporary path
+            
+        Returns:
+            True if the PDF was processed successfully
         """
+        progress = progress or IngestionProgress()
+        source = source or file_path
         try:
+            file_hash = _hash_file(file_path)
+            if self.vector_store.source_hashes.get(source) == file_hash:
+                logger.info(f"PDF unchanged, skipping: {source}")
+                progress.advance("sources_unchanged")
+                return True
+            
             # Parse PDF
             logger.info(f"Parsing PDF: {file_path}")
-            documents = self.parser.parse_pdf(file_path)
-            if not documents:
+            pages = self._ingest(source, (dict(page, source=source)
+                                          for page in self.parser.parse_pdf_parallel(file_path)),
+                                 file_hash, progress)
+            if not pages:
                 logger.error(f"No documents extracted from PDF: {file_path}")
-                return
-            logger.info(f"Extracted {len(documents)} documents from PDF")
-            
-            # Clean text
-            for doc in documents:
-                doc["text"] = self.parser.clean_text(doc["text"])
-            
-            # Chunk documents
-            logger.info("Chunking documents")
-            chunked_docs = self.chunker.chunk_documents(documents)
-            if not chunked_docs:
-                logger.error("No chunks generated from documents")
-                return
-            logger.info(f"Generated {len(chunked_docs)} chunks")
-            
-            # Generate embeddings
-            logger.info("Generating embeddings")
-            embedded_docs = self.embedder.embed_documents(chunked_docs)
-            if not embedded_docs:
-                logger.error("No embeddings generated")
-                return
-            logger.info(f"Generated embeddings for {len(embedded_docs)} chunks")
-            
-            # Add to vector store
-            logger.info("Adding to vector store")
-            self.vector_store.add_documents(embedded_docs)
-            
-            # Save vector store
-            self.vector_store.save(self.vector_store_dir)
+                progress.fail(f"No documents extracted from PDF: {file_path}")
+                return False
+            logger.info(f"Extracted {pages} documents from PDF")
             
             logger.info(f"Successfully processed PDF: {file_path}")
+            return True
         except Exception as e:
             logger.error(f"Error processing PDF {file_path}: {str(e)}")
+            progress.fail(str(e))
+            return False
     
-    def process_webpage(self, url: str) -> None:
+    def process_webpage(self, url: str, progress: Optional[IngestionProgress] = None) -> bool:
         """
         Process a webpage through the pipeline.
         
         Args:
             url: URL of the webpage
-        """
-        try:
-            # Parse webpage
-            logger.info(f"Parsing webpage: {url}")
-            documents = self.parser.parse_webpage(url)
+            progress: Receives counters, timings and the error of the run
             
-            # Clean text
-            for doc in documents:
-                doc["text"] = self.parser.clean_text(doc["text"])
+        Returns:
+            True if the webpage was processed successfully
+        """
+        return self.process_webpages([url], progress)[url]
+    
+    def process_webpages(self, urls: List[str], progress: Optional[IngestionProgress] = None) -> Dict[str, bool]:
+        """
+        Fetch webpages concurrently and process each as soon as it arrives.
+        
+        Pages are fetched with conditional requests; a page the server
+        reports as not modified, or whose HTML hashes to the value recorded
+        for it, is skipped without parsing or embedding.
+        
+        Args:
+            urls: URLs of the webpages
+            progress: Receives counters, timings and the errors of the run
             
-            # Chunk documents
-            logger.info("Chunking documents")
-            chunked_docs = self.chunker.chunk_documents(documents)
+        Returns:
+            Mapping from URL to whether it was processed successfully
+        """
+        progress = progress or IngestionProgress()
+        results = {url: False for url in urls}
+        errors = []
+        logger.info(f"Fetching {len(results)} webpages")
+        start = time.perf_counter()
+        for fetched in self.fetcher.fetch_iter(urls):
+            url = fetched.url
+            progress.record_time("fetch", time.perf_counter() - start)
+            try:
+                if fetched.error is not None:
+                    raise RuntimeError(fetched.error)
+                page_hash = _hash_text(fetched.text)
+                if url in self.vector_store.source_hashes and \
+                        (fetched.not_modified or self.vector_store.source_hashes[url] == page_hash):
+                    logger.info(f"Webpage not modified, skipping: {url}")
+                    progress.advance("sources_unchanged")
+                    results[url] = True
+                    continue
+                
+                # Parse webpage
+                logger.info(f"Parsing webpage: {url}")
+                parse_start = time.perf_counter()
+                documents = self.parser.parse_html(fetched.text, url, max_chars=self.chunker.chunk_chars)
+                progress.record_time("parse", time.perf_counter() - parse_start)
+                
+                self._ingest(url, documents, page_hash, progress)
+                
+                logger.info(f"Successfully processed webpage: {url}")
+                results[url] = True
+            except Exception as e:
+                logger.error(f"Error processing webpage {url}: {str(e)}")
+                errors.append(f"{url}: {str(e)}")
+            start = time.perf_counter()
+        if errors:
+            progress.fail("; ".join(errors))
+        return results
+    
+    def _ingest(self, source: str, documents: Iterable[Dict[str, Union[str, int]]], source_hash: str,
+                progress: Optional[IngestionProgress] = None) -> int:
+        """
+        Chunk, embed and index the parsed documents of a source.
+        
+        The stages overlap: a producer thread cleans and chunks documents as
+        the parser yields them, an embedding thread embeds micro-batches of
+        batch_size chunks, and the calling thread adds each embedded batch to
+        the vector store. Batches in flight are bounded by max_buffer_bytes,
+        so a slow stage applies backpressure upstream and peak memory does
+        not grow with the size of the source.
+        
+        Re-ingesting a source is idempotent: chunks whose text is already
+        indexed are not embedded again, and chunks that disappeared from a
+        changed source are deleted once the new ones are searchable.
+        
+        Args:
+            source: Source identifier (file path or URL)
+            documents: Parsed documents of the source, possibly a generator
+            source_hash: Hash of the raw source (file bytes or HTML), recorded
+                so that unchanged sources are skipped before parsing
+            progress: Receives counters and per-stage timings
             
-            # Generate embeddings
-            logger.info("Generating embeddings")
-            embedded_docs = self.embedder.embed_documents(chunked_docs)
+        Returns:
+            Number of parsed documents
+        """
+        progress = progress or IngestionProgress()
+        
+        # Chunks already indexed for this source, by content hash
+        existing: Dict[str, List[int]] = {}
+        for doc_id in self.vector_store.source_ids(source):
+            existing.setdefault(_hash_text(self.vector_store.documents[doc_id]["text"]), []).append(doc_id)
+        
+        budget = _MemoryBudget(self.max_buffer_bytes)
+        to_embed: "queue.Queue" = queue.Queue()
+        to_index: "queue.Queue" = queue.Queue()
+        stop = threading.Event()
+        errors: List[BaseException] = []
+        state = {"documents": 0, "chunks": 0, "new": 0, "rejected": 0, "seen": set()}
+        
+        def produce() -> None:
+            batch: List[Dict] = []
+            pages: List[Dict] = []
+            started, waited = time.perf_counter(), 0.0
             
-            # Add to vector store
-            logger.info("Adding to vector store")
-            self.vector_store.add_documents(embedded_docs)
+            def chunk_pages() -> float:
+                # Chunk a group of pages in one tokenizer call and queue new chunks
+                nonlocal batch
+                waited = 0.0
+                for chunk in self.chunker.chunk_documents(pages):
+                    state["chunks"] += 1
+                    progress.advance("chunks")
+                    chunk_hash = _hash_text(chunk["text"])
+                    if chunk_hash not in existing and chunk_hash not in state["seen"]:
+                        batch.append(chunk)
+                    state["seen"].add(chunk_hash)
+                    if len(batch) >= self.batch_size:
+                        waited += self._put_batch(to_embed, batch, budget, stop)
+                        batch = []
+                pages.clear()
+                return waited
             
-            # Save vector store
-            self.vector_store.save(self.vector_store_dir)
+            try:
+                for doc in documents:
+                    if stop.is_set():
+                        return
+                    doc["text"] = self.parser.clean_text(doc["text"])
+                    state["documents"] += 1
+                    progress.advance("pages_parsed")
+                    pages.append(doc)
+                    if len(pages) >= PAGES_PER_CHUNK_BATCH:
+                        waited += chunk_pages()
+                waited += chunk_pages()
+                if batch:
+                    waited += self._put_batch(to_embed, batch, budget, stop)
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                progress.record_time("parse", time.perf_counter() - started - waited)
+                to_embed.put(None)
+        
+        def embed() -> None:
+            try:
+                while True:
+                    item = to_embed.get()
+                    if item is None or stop.is_set():
+                        return
+                    batch, nbytes = item
+                    started = time.perf_counter()
+                    batch = self.embedder.embed_documents(batch)
+                    progress.record_time("embed", time.perf_counter() - started)
+                    progress.advance("chunks_embedded", len(batch))
+                    to_index.put((batch, nbytes))
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                to_index.put(None)
+        
+        workers = [threading.Thread(target=produce, name="ingest-chunk", daemon=True),
+                   threading.Thread(target=embed, name="ingest-embed", daemon=True)]
+        for worker in workers:
+            worker.start()
+        try:
+            while True:
+                item = to_index.get()
+                if item is None:
+                    break
+                batch, nbytes = item
+                if not stop.is_set():
+                    started = time.perf_counter()
+                    added = self.vector_store.add_documents(batch)
+                    progress.record_time("index", time.perf_counter() - started)
+                    progress.advance("vectors_indexed", added)
+                    progress.advance("vectors_rejected", len(batch) - added)
+                    state["new"] += added
+                    state["rejected"] += len(batch) - added
+                budget.release(nbytes)
+        finally:
+            stop.set()
+            budget.close()
+            for worker in workers:
+                worker.join()
+        if errors:
+            raise errors[0]
+        
+        seen = state["seen"]
+        # Chunks no longer present, and duplicate copies of kept chunks
+        stale_ids = [doc_id for chunk_hash, ids in existing.items()
+                     for doc_id in (ids if chunk_hash not in seen else ids[1:])]
+        if self.vector_store.source_hashes.get(source) == source_hash and not state["new"] and not stale_ids:
+            logger.info(f"Source unchanged: {source}")
+            return state["documents"]
+        logger.info(f"Indexed {state['new']} new chunks of {state['chunks']} from {state['documents']} documents")
+        
+        # Remove replaced chunks after the new ones are searchable
+        if stale_ids:
+            logger.info(f"Deleting {len(stale_ids)} stale chunks")
+            progress.advance("vectors_deleted", self.vector_store.delete_ids(stale_ids))
+        if state["rejected"]:
+            # Leave the source unrecorded so the next ingestion retries the rejected chunks
+            logger.warning(f"{state['rejected']} chunks of {source} were not indexed")
+            self.vector_store.source_hashes.pop(source, None)
+        elif state["documents"]:
+            self.vector_store.source_hashes[source] = source_hash
+        
+        # Save vector store
+        started = time.perf_counter()
+        self.vector_store.save(self.vector_store_dir)
+        progress.record_time("save", time.perf_counter() - started)
+        return state["documents"]
+    
+    def _put_batch(self, target: "queue.Queue", batch: List[Dict], budget: "_MemoryBudget",
+                   stop: threading.Event) -> float:
+        """
+        Reserve memory for a micro-batch, waiting while the pipeline is full, then enqueue it.
+        
+        Returns:
+            Seconds spent waiting for downstream stages
+        """
+        # Text plus the float32 embedding each chunk will carry
+        nbytes = sum(len(doc["text"]) + 4 * self.vector_store.dimension for doc in batch)
+        started = time.perf_counter()
+        if budget.acquire(nbytes, stop):
+            target.put((batch, nbytes))
+        return time.perf_counter() - started
+    
+    def delete_source(self, source: str) -> int:
+        """
+        Delete all chunks of a source from the vector store.
+        
+        Args:
+            source: Source identifier (file path or URL)
             
-            logger.info(f"Successfully processed webpage: {url}")
-        except Exception as e:
-            logger.error(f"Error processing webpage {url}: {str(e)}")
+        Returns:
+            Number of chunks deleted
+        """
+        deleted = self.vector_store.delete_source(source)
+        self.vector_store.save(self.vector_store_dir)
+        return deleted
     
     def load_existing_vector_store(self) -> None:
         """Load the existing vector store from disk."""
@@ -123,4 +409,48 @@ class IngestionPipeline:
             self.vector_store.load(self.vector_store_dir)
             logger.info("Loaded existing vector store")
         except Exception as e:
-            logger.error(f"Error loading vector store: {str(e)}") 
\ No newline at end of file
+            logger.error(f"Error loading vector store: {str(e)}")
+
+def _hash_text(text: str) -> str:
+    """Content hash used to recognise unchanged sources and chunks."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _hash_file(path: str) -> str:
+    """Content hash of a file's bytes, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class _MemoryBudget:
+    """Byte budget shared by the pipeline stages, blocking producers while it is exhausted."""
+    
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self._closed = False
+        self._condition = threading.Condition()
+    
+    def acquire(self, nbytes: int, stop: Optional[threading.Event] = None) -> bool:
+        """Wait until nbytes fit in the budget; returns False if the pipeline stopped first."""
+        with self._condition:
+            # A batch larger than the whole budget is admitted once the pipeline is empty
+            while self.used and self.used + nbytes > self.limit:
+                if self._closed or (stop is not None and stop.is_set()):
+                    return False
+                self._condition.wait(0.1)
+            if self._closed:
+                return False
+            self.used += nbytes
+            return True
+    
+    def release(self, nbytes: int) -> None:
+        with self._condition:
+            self.used -= nbytes
+            self._condition.notify_all()
+    
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
@@ -0,0 +1,68 @@
+from typing import Deque, Tuple
+from collections import deque
+import asyncio
+import logging
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class AsyncRateLimiter:
+    """
+    Sliding-window limiter for requests and tokens per minute.
+
+    The budget is shared by every event loop using the limiter (e.g.
+    successive asyncio.run calls or loops in worker threads), so its state
+    is guarded by a thread lock, held only while the window is checked.
+    """
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0, window: float = 60.0):
+        """
+        Initialize the rate limiter.
+
+        Args:
+            requests_per_minute: Maximum requests per window (0 for unlimited)
+            tokens_per_minute: Maximum tokens per window (0 for unlimited)
+            window: Window length in seconds
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.window = window
+        self._events: Deque[Tuple[float, int]] = deque()
+        self._tokens_in_window = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        while self._events and now - self._events[0][0] >= self.window:
+            _, tokens = self._events.popleft()
+            self._tokens_in_window -= tokens
+
+    def _has_capacity(self, tokens: int) -> bool:
+        if self.requests_per_minute and len(self._events) >= self.requests_per_minute:
+            return False
+        # A single request larger than the whole budget is let through on an empty window
+        if self.tokens_per_minute and self._events and self._tokens_in_window + tokens > self.tokens_per_minute:
+            return False
+        return True
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """
+        Wait until a request of the given size fits in the budget and record it.
+
+        Args:
+            tokens: Estimated number of tokens in the request
+        """
+        if not self.requests_per_minute and not self.tokens_per_minute:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._expire(now)
+                if self._has_capacity(tokens):
+                    self._events.append((now, tokens))
+                    self._tokens_in_window += tokens
+                    return
+                delay = self.window - (now - self._events[0][0])
+            logger.debug(f"Rate limit reached, waiting {delay:.2f}s")
+            await asyncio.sleep(max(delay, 0.01))
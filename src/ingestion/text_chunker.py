@@ -1,67 +1,238 @@
-from typing import List, Dict, Union
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from typing import List, Dict, Union, Optional, Tuple
+import numpy as np
+import threading
 import logging
+import os
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Rough characters per token, used when sizing by characters stands in for tokens
+CHARS_PER_TOKEN = 4
+_WHITESPACE = np.array([ord(c) for c in " \t\n\r\f\v"], dtype=np.uint32)
+
+_encoding = None
+_token_tables: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+_encoding_lock = threading.Lock()
+
+def _load_encoding():
+    """Return the cl100k tokenizer bundled with litellm (no download needed), or None."""
+    global _encoding, _token_tables
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                from litellm.litellm_core_utils.default_encoding import encoding
+            except Exception as e:
+                logger.warning(f"Tokenizer unavailable, sizing chunks by characters: {str(e)}")
+                return None
+            # Per-token byte length and leading-whitespace flags, so chunk
+            # boundaries can be computed on whole token arrays at once
+            lengths = np.zeros(encoding.n_vocab, dtype=np.int64)
+            space = np.zeros(encoding.n_vocab, dtype=bool)
+            newline = np.zeros(encoding.n_vocab, dtype=bool)
+            for token in range(encoding.n_vocab):
+                try:
+                    token_bytes = encoding.decode_single_token_bytes(token)
+                except KeyError:
+                    continue
+                lengths[token] = len(token_bytes)
+                space[token] = token_bytes[:1].isspace()
+                newline[token] = token_bytes[:1] == b"\n"
+            _encoding, _token_tables = encoding, (lengths, space, newline)
+        return _encoding
+
+def _windows(count: int, newline: np.ndarray, space: np.ndarray, size: int, overlap: int) -> List[Tuple[int, int]]:
+    """
+    Split units [0, count) into windows of at most size units.
+
+    Windows end before a line break if there is one in their last quarter,
+    otherwise before a word break, and the next window starts overlap
+    units earlier, moved forward to a word break.
+    """
+    windows = []
+    start = 0
+    while start < count:
+        end = min(start + size, count)
+        if end < count:
+            low = start + max(size * 3 // 4, 1)
+            for marks in (newline, space):
+                breaks = np.flatnonzero(marks[low:end + 1])
+                if breaks.size:
+                    end = low + int(breaks[-1])
+                    break
+        windows.append((start, end))
+        if end >= count:
+            break
+        next_start = max(end - overlap, start + 1)
+        breaks = np.flatnonzero(space[next_start:end])
+        if overlap and breaks.size:
+            next_start += int(breaks[0])
+        start = next_start
+    return windows
+
 class TextChunker:
-    """Handles splitting text into chunks for embedding."""
-    
-    def __init__(self, chunk_size: int = 500, chunk_overlap: int = 50):
+    """
+    Splits documents into chunks sized in tokens.
+
+    Documents are tokenized in one multi-threaded batch call to the native
+    tokenizer, chunk boundaries are computed with numpy over the token
+    arrays, and a document that already fits in one chunk is passed through
+    without being copied. Falls back to sizing by characters (about
+    CHARS_PER_TOKEN per token) when the tokenizer cannot be loaded.
+    """
+
+    def __init__(self, chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None,
+                 unit: Optional[str] = None):
         """
         Initialize the text chunker.
-        
+
+        Args:
+            chunk_size: Maximum size of each chunk (default: CHUNK_SIZE, or 128 tokens / 500 characters)
+            chunk_overlap: Overlap between chunks (default: CHUNK_OVERLAP, or 16 tokens / 50 characters)
+            unit: "tokens" or "chars" (default: CHUNK_UNIT or "tokens")
+        """
+        self.unit = unit or os.getenv("CHUNK_UNIT", "tokens")
+        if self.unit not in ("tokens", "chars"):
+            raise ValueError(f"Unknown chunk unit: {self.unit}")
+        default_size, default_overlap = (128, 16) if self.unit == "tokens" else (500, 50)
+        self.chunk_size = chunk_size or int(os.getenv("CHUNK_SIZE", default_size))
+        self.chunk_overlap = chunk_overlap if chunk_overlap is not None else int(os.getenv("CHUNK_OVERLAP", default_overlap))
+        self.threads = int(os.getenv("CHUNK_THREADS", min(8, os.cpu_count() or 1)))
+        self.encoding = _load_encoding() if self.unit == "tokens" else None
+
+    @property
+    def chunk_chars(self) -> int:
+        """Approximate chunk size in characters."""
+        return self.chunk_size * CHARS_PER_TOKEN if self.unit == "tokens" else self.chunk_size
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """
+        Count the tokens of several texts.
+
         Args:
-            chunk_size: Maximum size of each chunk in characters
-            chunk_overlap: Number of characters to overlap between chunks
+            texts: Texts to measure
+
+        Returns:
+            Token count of each text (estimated from characters without a tokenizer)
         """
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
-    
+        if self.encoding is None:
+            return [len(text) // CHARS_PER_TOKEN + 1 for text in texts]
+        return [len(tokens) for tokens in self.encoding.encode_ordinary_batch(texts, num_threads=self.threads)]
+
     def chunk_document(self, document: Dict[str, Union[str, int]]) -> List[Dict[str, Union[str, int]]]:
         """
         Split a document into chunks while preserving metadata.
-        
+
         Args:
             document: Dictionary containing text and metadata
-            
+
         Returns:
             List of chunked documents with preserved metadata
         """
-        try:
-            # Split the text into chunks
-            chunks = self.text_splitter.split_text(document["text"])
-            
-            # Create new documents with the same metadata but chunked text
-            chunked_docs = []
-            for i, chunk in enumerate(chunks):
-                chunked_doc = document.copy()
-                chunked_doc["text"] = chunk
-                chunked_doc["chunk_id"] = i + 1
-                chunked_docs.append(chunked_doc)
-            
-            return chunked_docs
-        except Exception as e:
-            logger.error(f"Error chunking document: {str(e)}")
-            return []
-    
+        return self.chunk_documents([document])
+
     def chunk_documents(self, documents: List[Dict[str, Union[str, int]]]) -> List[Dict[str, Union[str, int]]]:
         """
         Split multiple documents into chunks.
-        
+
+        A document that fits in one chunk is returned as is, with chunk_id
+        set in place; longer documents yield new dicts sharing its metadata.
+
         Args:
             documents: List of document dictionaries
-            
+
         Returns:
             List of all chunked documents
         """
-        all_chunks = []
-        for doc in documents:
-            chunks = self.chunk_document(doc)
-            all_chunks.extend(chunks)
-        return all_chunks 
\ No newline at end of file
+        try:
+            texts = [str(doc.get("text", "")) for doc in documents]
+            if self.encoding is not None:
+                spans = self._token_spans(texts)
+            else:
+                spans = self._char_spans(texts)
+
+            all_chunks = []
+            for doc, text, doc_spans in zip(documents, texts, spans):
+                if len(doc_spans) == 1 and doc_spans[0] is None:
+                    doc["chunk_id"] = 1
+                    all_chunks.append(doc)
+                    continue
+                for i, chunk in enumerate(doc_spans):
+                    all_chunks.append({**doc, "text": chunk, "chunk_id": i + 1})
+            return all_chunks
+        except Exception as e:
+            logger.error(f"Error chunking documents: {str(e)}")
+            return []
+
+    def _token_spans(self, texts: List[str]) -> List[List[Optional[str]]]:
+        """Chunk texts by tokens; [None] marks a text that fits in one chunk unchanged."""
+        lengths, space, newline = _token_tables
+        size, overlap = self.chunk_size, min(self.chunk_overlap, self.chunk_size - 1)
+        results = []
+        for text, tokens in zip(texts, self.encoding.encode_ordinary_batch(texts, num_threads=self.threads)):
+            if not text.strip():
+                results.append([])
+                continue
+            if len(tokens) <= size:
+                results.append([None])
+                continue
+            tokens = np.asarray(tokens, dtype=np.int64)
+            ends = np.cumsum(lengths[tokens])
+            starts = ends - lengths[tokens]
+            raw = text.encode("utf-8")
+            chunks = []
+            for first, last in _windows(len(tokens), newline[tokens], space[tokens], size, overlap):
+                begin, end = int(starts[first]), int(ends[last - 1])
+                # Tokens can split a multi-byte character; widen to whole characters
+                while begin > 0 and raw[begin] & 0xC0 == 0x80:
+                    begin -= 1
+                while end < len(raw) and raw[end] & 0xC0 == 0x80:
+                    end += 1
+                chunk = raw[begin:end].decode("utf-8", errors="ignore").strip()
+                if chunk:
+                    chunks.append(chunk)
+            results.append(chunks)
+        return self._fit(results)
+
+    def _fit(self, results: List[List[Optional[str]]]) -> List[List[Optional[str]]]:
+        """
+        Trim chunks that exceed chunk_size tokens once tokenized on their own.
+
+        A chunk spans at most chunk_size tokens of its document, but BPE can
+        merge differently at its edges, and widening to whole characters adds
+        bytes, so it may encode to a token or two more. Those chunks lose their
+        last tokens, which the next chunk's overlap repeats.
+        """
+        chunks = [chunk for spans in results for chunk in spans if chunk is not None]
+        lengths = _token_tables[0]
+        fitted = []
+        for chunk, tokens in zip(chunks, self.encoding.encode_ordinary_batch(chunks, num_threads=self.threads)):
+            while len(tokens) > self.chunk_size:
+                raw = chunk.encode("utf-8")
+                end = int(lengths[np.asarray(tokens[:self.chunk_size], dtype=np.int64)].sum())
+                while 0 < end < len(raw) and raw[end] & 0xC0 == 0x80:
+                    end -= 1
+                chunk = raw[:end].decode("utf-8", errors="ignore").strip()
+                tokens = self.encoding.encode_ordinary(chunk)
+            fitted.append(chunk)
+        fitted.reverse()
+        return [[fitted.pop() if chunk is not None else None for chunk in spans] for spans in results]
+
+    def _char_spans(self, texts: List[str]) -> List[List[Optional[str]]]:
+        """Chunk texts by characters; [None] marks a text that fits in one chunk unchanged."""
+        size = self.chunk_chars
+        overlap = self.chunk_overlap * CHARS_PER_TOKEN if self.unit == "tokens" else self.chunk_overlap
+        overlap = min(overlap, size - 1)
+        results = []
+        for text in texts:
+            if not text.strip():
+                results.append([])
+                continue
+            if len(text) <= size:
+                results.append([None])
+                continue
+            codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+            space = np.isin(codes, _WHITESPACE)
+            chunks = [text[first:last].strip() for first, last in _windows(len(text), codes == 10, space, size, overlap)]
+            results.append([chunk for chunk in chunks if chunk])
+        return results
@@ -0,0 +1,211 @@
+from typing import List, Dict, Iterator, Optional
+from urllib.parse import urlsplit
+import asyncio
+import logging
+import sqlite3
+import threading
+import queue
+import time
+import os
+import httpx
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (compatible; RAGPipeline/1.0)"
+
+class FetchResult:
+    """Outcome of fetching one URL."""
+
+    def __init__(self, url: str, text: Optional[str] = None, status: Optional[int] = None,
+                 not_modified: bool = False, error: Optional[str] = None):
+        """
+        Initialize the result.
+
+        Args:
+            url: Requested URL
+            text: Page body (from the cache when not_modified)
+            status: HTTP status code
+            not_modified: The server answered 304 to a conditional request
+            error: Error message if the fetch failed
+        """
+        self.url = url
+        self.text = text
+        self.status = status
+        self.not_modified = not_modified
+        self.error = error
+
+class HTTPCache:
+    """
+    Local cache of fetched pages and their validators.
+
+    Stores the body, ETag and Last-Modified of each URL in SQLite so later
+    fetches can be conditional and a 304 answer can be served from disk.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        """
+        Initialize the HTTP cache.
+
+        Args:
+            path: SQLite database file
+            max_entries: Maximum number of cached pages
+        """
+        self.path = os.path.abspath(path)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, url: str) -> Optional[Dict[str, Optional[str]]]:
+        """Return the cached entry of a URL (etag, last_modified, body), or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, body FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "body": row[2]}
+
+    def put(self, url: str, etag: Optional[str], last_modified: Optional[str], body: str) -> None:
+        """Store a page; pages without validators are not cached."""
+        if not etag and not last_modified:
+            return
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                               (url, etag, last_modified, body, time.time()))
+            count = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM pages WHERE url IN (SELECT url FROM pages ORDER BY fetched_at LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def touch(self, url: str) -> None:
+        """Mark a cached page as revalidated."""
+        with self._lock:
+            self._conn.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+
+class WebFetcher:
+    """
+    Concurrent HTTP fetcher with a shared connection pool.
+
+    Requests go through one httpx.AsyncClient, with a global connection
+    limit and a per-host concurrency limit so bulk URL lists do not hammer
+    a single site. When an HTTPCache is configured, requests carry
+    If-None-Match/If-Modified-Since and 304 answers are served from it.
+    """
+
+    def __init__(self, cache: Optional[HTTPCache] = None, max_connections: Optional[int] = None,
+                 per_host: Optional[int] = None, timeout: Optional[float] = None):
+        """
+        Initialize the fetcher.
+
+        Args:
+            cache: Cache of pages and validators for conditional requests
+            max_connections: Connections in the pool (default: WEB_MAX_CONNECTIONS or 32)
+            per_host: Requests in flight per host (default: WEB_PER_HOST or 4)
+            timeout: Request timeout in seconds (default: WEB_FETCH_TIMEOUT or 30)
+        """
+        self.cache = cache
+        self.max_connections = max_connections or int(os.getenv("WEB_MAX_CONNECTIONS", 32))
+        self.per_host = per_host or int(os.getenv("WEB_PER_HOST", 4))
+        self.timeout = timeout or float(os.getenv("WEB_FETCH_TIMEOUT", 30))
+
+    async def afetch_many(self, urls: List[str]) -> List[FetchResult]:
+        """
+        Fetch several URLs concurrently.
+
+        Args:
+            urls: URLs to fetch
+
+        Returns:
+            One result per URL, in input order
+        """
+        results: Dict[str, FetchResult] = {}
+        async for result in self._afetch_iter(urls):
+            results[result.url] = result
+        return [results[url] for url in urls]
+
+    def fetch_iter(self, urls: List[str]) -> Iterator[FetchResult]:
+        """
+        Fetch several URLs concurrently, yielding results as they complete.
+
+        The requests run on an event loop in a background thread, so the
+        caller can process early pages while later ones are still downloading.
+
+        Args:
+            urls: URLs to fetch
+
+        Yields:
+            One result per URL, in completion order
+        """
+        results: "queue.Queue" = queue.Queue()
+
+        async def produce() -> None:
+            async for result in self._afetch_iter(urls):
+                results.put(result)
+
+        def run() -> None:
+            try:
+                asyncio.run(produce())
+            except Exception as e:
+                logger.error(f"Error fetching URLs: {str(e)}")
+            finally:
+                results.put(None)
+
+        thread = threading.Thread(target=run, name="web-fetch", daemon=True)
+        thread.start()
+        while True:
+            result = results.get()
+            if result is None:
+                break
+            yield result
+        thread.join()
+
+    async def _afetch_iter(self, urls: List[str]):
+        limits = httpx.Limits(max_connections=self.max_connections,
+                              max_keepalive_connections=self.max_connections)
+        host_limits: Dict[str, asyncio.Semaphore] = {}
+        async with httpx.AsyncClient(limits=limits, timeout=self.timeout, follow_redirects=True,
+                                     headers={"User-Agent": USER_AGENT}) as client:
+            tasks = []
+            for url in dict.fromkeys(urls):
+                host = urlsplit(url).netloc
+                semaphore = host_limits.setdefault(host, asyncio.Semaphore(self.per_host))
+                tasks.append(asyncio.ensure_future(self._fetch(client, semaphore, url)))
+            for task in asyncio.as_completed(tasks):
+                yield await task
+
+    async def _fetch(self, client: httpx.AsyncClient, semaphore: asyncio.Semaphore, url: str) -> FetchResult:
+        cached = await asyncio.to_thread(self.cache.get, url) if self.cache is not None else None
+        headers = {}
+        if cached is not None:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+        try:
+            async with semaphore:
+                response = await client.get(url, headers=headers)
+            if response.status_code == 304 and cached is not None:
+                await asyncio.to_thread(self.cache.touch, url)
+                return FetchResult(url, cached["body"], 304, not_modified=True)
+            response.raise_for_status()
+            text = response.text
+            if self.cache is not None:
+                await asyncio.to_thread(self.cache.put, url, response.headers.get("ETag"),
+                                        response.headers.get("Last-Modified"), text)
+            return FetchResult(url, text, response.status_code)
+        except Exception as e:
+            message = str(e).splitlines()[0] if str(e) else type(e).__name__
+            logger.error(f"Error fetching {url}: {message}")
+            return FetchResult(url, error=message)
@@ -1,3 +1,4 @@
 from .vector_store import VectorStore
+from .collection_manager import CollectionManager, DEFAULT_COLLECTION
 
-__all__ = ['VectorStore'] 
\ No newline at end of file
+__all__ = ['VectorStore', 'CollectionManager', 'DEFAULT_COLLECTION'] 
\ No newline at end of file
@@ -0,0 +1,45 @@
+"""
+Check a saved vector store for zero, NaN and non-normalized vectors.
+
+Usage:
+    python -m src.retrieval.check_vectors [DIRECTORY] [--repair] [--dimension N]
+
+With --repair, zero and NaN vectors are deleted, the index is rebuilt from
+normalized vectors if needed and the store is rewritten as a new base snapshot.
+Exits with status 1 if problems were found and not repaired.
+"""
+import argparse
+import json
+import sys
+from .vector_store import VectorStore
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", nargs="?", default="data/vector_store", help="Vector store directory")
+    parser.add_argument("--repair", action="store_true", help="Delete invalid vectors and renormalize the index")
+    parser.add_argument("--dimension", type=int, default=1024, help="Embedding dimension of the store")
+    args = parser.parse_args()
+
+    store = VectorStore(dimension=args.dimension)
+    try:
+        store.load(args.directory)
+    except Exception as e:
+        sys.exit(f"Could not load the vector store in {args.directory}: {str(e)}")
+    if store.index.ntotal == 0:
+        print(f"No vectors found in {args.directory}")
+        return
+    try:
+        report = store.check_vectors(repair=args.repair)
+    except Exception as e:
+        sys.exit(f"Could not {'repair' if args.repair else 'check'} the vectors in {args.directory}: {str(e)}")
+    # Id lists can be long; show counts and the first few ids
+    for field in ("zero", "nan"):
+        ids = report[field]
+        report[field] = {"count": len(ids), "ids": ids[:20]}
+    print(json.dumps(report, indent=2))
+    problems = report["zero"]["count"] or report["nan"]["count"] or report["not_normalized"]
+    if problems and not args.repair:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
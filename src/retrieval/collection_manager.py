@@ -0,0 +1,261 @@
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+import asyncio
+import logging
+import os
+import re
+import threading
+from .vector_store import VectorStore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Collection served from the pre-collections vector store directory
+DEFAULT_COLLECTION = "default"
+# Names double as directory names
+COLLECTION_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+class CollectionManager:
+    """
+    Named vector stores, one directory each, loaded on first use.
+
+    Each collection has its own index, segments and caches, so a query
+    only scans the documents of its collection. Loaded stores are kept in
+    least-recently-used order and evicted (saved, then dropped) once more
+    than max_loaded are open or their combined heap footprint exceeds
+    memory_budget. A collection is pinned while a search or ingestion uses
+    it and is never evicted from under it; the default collection is
+    always resident. Objects built on a loaded store, such as the agent
+    searching it, can be cached with the store and are dropped with it.
+    """
+
+    def __init__(self, root: Optional[str] = None, default_store: Optional[VectorStore] = None,
+                 default_directory: Optional[str] = None, max_loaded: Optional[int] = None,
+                 memory_budget_mb: Optional[float] = None):
+        """
+        Initialize the collection manager.
+
+        Args:
+            root: Directory holding one subdirectory per collection (default: COLLECTIONS_DIR or "data/collections")
+            default_store: Already loaded store of the default collection
+            default_directory: Directory of the default collection (default: "data/vector_store")
+            max_loaded: Collections kept in memory besides the default one (default: COLLECTIONS_MAX_LOADED or 8)
+            memory_budget_mb: Heap budget of the loaded collections (default: COLLECTIONS_MEMORY_MB or 4096)
+        """
+        self.root = os.path.abspath(root or os.getenv("COLLECTIONS_DIR", "data/collections"))
+        self.default_directory = os.path.abspath(default_directory or "data/vector_store")
+        self.max_loaded = max_loaded or int(os.getenv("COLLECTIONS_MAX_LOADED", 8))
+        self.memory_budget = int(float(memory_budget_mb or os.getenv("COLLECTIONS_MEMORY_MB", 4096)) * 1024 * 1024)
+        self.loads = 0
+        self.evictions = 0
+        self._stores: "OrderedDict[str, VectorStore]" = OrderedDict()
+        self._pins: Dict[str, int] = {}
+        self._sizes: Dict[str, int] = {}  # heap bytes of each loaded store, measured when it was last released
+        self._cached: Dict[str, Dict[str, Any]] = {}  # objects built on each loaded store, see cached()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        if default_store is not None:
+            self._stores[DEFAULT_COLLECTION] = default_store
+
+    def directory(self, name: str) -> str:
+        """
+        Return the directory of a collection.
+
+        Raises:
+            ValueError: If the name is not a valid collection name
+        """
+        if name == DEFAULT_COLLECTION:
+            return self.default_directory
+        if not COLLECTION_NAME.match(name):
+            raise ValueError(f"Invalid collection name '{name}': use up to 64 letters, digits, '-' or '_'")
+        return os.path.join(self.root, name)
+
+    def exists(self, name: str) -> bool:
+        """Return whether a collection has been created."""
+        return name == DEFAULT_COLLECTION or os.path.isdir(self.directory(name))
+
+    def create(self, name: str) -> bool:
+        """
+        Create an empty collection.
+
+        Args:
+            name: Collection name
+
+        Returns:
+            False if the collection already existed
+        """
+        if self.exists(name):
+            return False
+        os.makedirs(self.directory(name))
+        logger.info(f"Created collection {name}")
+        return True
+
+    def list(self) -> List[Dict]:
+        """Describe every collection, marking the ones currently in memory."""
+        names = [DEFAULT_COLLECTION] + sorted(
+            entry for entry in os.listdir(self.root)
+            if entry != DEFAULT_COLLECTION and COLLECTION_NAME.match(entry) and os.path.isdir(os.path.join(self.root, entry))
+        )
+        with self._lock:
+            stores = dict(self._stores)
+        collections = []
+        for name in names:
+            store = stores.get(name)
+            collections.append({
+                "name": name,
+                "loaded": store is not None,
+                "documents": len(store.documents) - len(store.deleted) if store is not None else None,
+            })
+        return collections
+
+    @contextmanager
+    def use(self, name: str) -> Iterator[VectorStore]:
+        """
+        Pin a collection for the duration of the block, loading it if needed.
+
+        Args:
+            name: Collection name
+
+        Yields:
+            Vector store of the collection
+
+        Raises:
+            KeyError: If the collection does not exist
+        """
+        if not self.exists(name):
+            raise KeyError(f"Unknown collection: {name}")
+        store = None
+        with self._lock:
+            self._pins[name] = self._pins.get(name, 0) + 1
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        try:
+            # Waits while the collection is being loaded or saved by an eviction
+            with load_lock:
+                with self._lock:
+                    store = self._stores.get(name)
+                    if store is not None:
+                        self._stores.move_to_end(name)
+                if store is None:
+                    store = self._load(name)
+            self._evict()
+            yield store
+        finally:
+            with self._lock:
+                self._pins[name] -= 1
+                released = not self._pins[name]
+                if released:
+                    del self._pins[name]
+            if released and store is not None:
+                # Measured unlocked: memory_usage waits for writers of the store
+                size = _heap_bytes(store)
+                with self._lock:
+                    if self._stores.get(name) is store:
+                        self._sizes[name] = size
+                self._evict()
+
+    @asynccontextmanager
+    async def ause(self, name: str) -> AsyncIterator[VectorStore]:
+        """
+        Pin a collection like use(), loading and evicting stores in a worker
+        thread so the event loop is not blocked on disk reads and saves.
+        """
+        pin = self.use(name)
+        store = await asyncio.to_thread(pin.__enter__)
+        try:
+            yield store
+        finally:
+            await asyncio.to_thread(pin.__exit__, None, None, None)
+
+    def cached(self, store: VectorStore, key: str, factory: Callable[[], Any]) -> Any:
+        """
+        Return an object built on a loaded collection's store, building it on
+        first use. It is kept while the store stays loaded and dropped when
+        the collection is evicted.
+
+        Args:
+            store: Store of a pinned collection
+            key: Name of the object among those cached with the store
+            factory: Builds the object
+
+        Returns:
+            The cached object, or a new one if the store is not a loaded collection
+        """
+        with self._lock:
+            name = next((name for name, loaded in self._stores.items() if loaded is store), None)
+            value = self._cached.get(name, {}).get(key)
+        if value is not None:
+            return value
+        value = factory()
+        with self._lock:
+            if name is not None and self._stores.get(name) is store:
+                # A concurrent first use may have built one already; keep the first
+                value = self._cached.setdefault(name, {}).setdefault(key, value)
+        return value
+
+    def _load(self, name: str) -> VectorStore:
+        """Open a collection from disk. Must hold its load lock."""
+        store = VectorStore()
+        directory = self.directory(name)
+        if os.path.isdir(directory) and os.listdir(directory):
+            store.load(directory)
+        size = _heap_bytes(store)
+        with self._lock:
+            self._stores[name] = store
+            self._sizes[name] = size
+            self.loads += 1
+        logger.info(f"Loaded collection {name} ({len(store.documents)} documents)")
+        return store
+
+    def _evict(self) -> None:
+        """Save and drop least recently used, unpinned collections while over budget."""
+        while True:
+            with self._lock:
+                loaded = [name for name in self._stores if name != DEFAULT_COLLECTION]
+                used = sum(self._sizes.get(name, 0) for name in self._stores)
+                if len(loaded) <= self.max_loaded and used <= self.memory_budget:
+                    return
+                # Collections in use are skipped and evicted once released. Whoever
+                # holds the load lock of an unpinned collection is evicting it already.
+                victim = next((name for name in loaded if name not in self._pins
+                               and self._load_locks[name].acquire(blocking=False)), None)
+                if victim is None:
+                    return
+                store = self._stores.pop(victim)
+                self._sizes.pop(victim, None)
+                self._cached.pop(victim, None)
+            # A use() of the victim waits on the load lock until it is saved, then reloads it
+            try:
+                store.close(self.directory(victim))
+            except Exception as e:
+                logger.error(f"Error saving evicted collection {victim}: {str(e)}")
+            finally:
+                self._load_locks[victim].release()
+            self.evictions += 1
+            logger.info(f"Evicted collection {victim}")
+
+    def close(self) -> None:
+        """Save every loaded collection and wait for their compactions."""
+        with self._lock:
+            stores = list(self._stores.items())
+        for name, store in stores:
+            store.close(self.directory(name))
+
+    def stats(self) -> Dict:
+        """Report loaded collections, their heap footprint and load/eviction counters."""
+        with self._lock:
+            return {
+                "loaded": list(self._stores),
+                "pinned": dict(self._pins),
+                "heap_bytes": sum(self._sizes.get(name, 0) for name in self._stores),
+                "memory_budget_bytes": self.memory_budget,
+                "max_loaded": self.max_loaded,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+def _heap_bytes(store: VectorStore) -> int:
+    """Heap footprint of a store from its memory_usage report; memory-mapped files are not counted."""
+    return sum(value for key, value in store.memory_usage().items()
+               if key.endswith("bytes") and "mapped" not in key and isinstance(value, int))
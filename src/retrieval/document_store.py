@@ -0,0 +1,365 @@
+from typing import List, Dict, Union, Optional, Iterable
+from array import array
+import numpy as np
+import logging
+import pickle
+import mmap
+import copy
+import json
+import sys
+import os
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Metadata fields stored as integer columns; -1 marks a missing value
+INT_FIELDS = ("page", "section", "chunk_id")
+# Metadata fields stored as ids into a shared string table
+STRING_FIELDS = ("source", "type")
+# Fields handled by the fixed schema; embeddings are stored in the index
+KNOWN_FIELDS = {"text", "embedding"} | set(INT_FIELDS) | set(STRING_FIELDS)
+COPY_CHUNK_SIZE = 16 * 1024 * 1024
+
+class ColumnarDocuments:
+    """
+    Read-only document metadata stored column by column on disk.
+
+    Text is kept in one UTF-8 blob addressed by an offsets array and every
+    other field is a fixed-width numpy column, so the files can be memory
+    mapped: opening is O(1), rows are decoded only when accessed and the
+    pages are shared between processes mapping the same files.
+    """
+
+    def __init__(self, directory: str, use_mmap: bool = True):
+        """
+        Open a columnar document directory.
+
+        Args:
+            directory: Directory written by DocumentStore.write
+            use_mmap: Map the files instead of reading them into memory
+        """
+        self.directory = directory
+        mmap_mode = "r" if use_mmap else None
+        self.offsets = np.load(os.path.join(directory, "text_offsets.npy"), mmap_mode=mmap_mode)
+        self.columns = {
+            field: np.load(os.path.join(directory, f"{field}.npy"), mmap_mode=mmap_mode)
+            for field in INT_FIELDS + STRING_FIELDS
+        }
+        with open(os.path.join(directory, "strings.json"), "r") as f:
+            self.strings: List[str] = json.load(f)
+
+        text_path = os.path.join(directory, "text.bin")
+        if use_mmap and os.path.getsize(text_path) > 0:
+            with open(text_path, "rb") as f:
+                self.text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            with open(text_path, "rb") as f:
+                self.text = f.read()
+
+        self.extra: Dict[int, Dict] = {}
+        extra_path = os.path.join(directory, "extra.pkl")
+        if os.path.exists(extra_path):
+            with open(extra_path, "rb") as f:
+                self.extra = pickle.load(f)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def nbytes(self) -> int:
+        """Return the total size of the column files."""
+        return (len(self.text) + self.offsets.nbytes
+                + sum(column.nbytes for column in self.columns.values()))
+
+    def __getitem__(self, idx: int) -> Dict[str, Union[str, int]]:
+        start, end = int(self.offsets[idx]), int(self.offsets[idx + 1])
+        document = {"text": self.text[start:end].decode("utf-8")}
+        for field in STRING_FIELDS:
+            value = int(self.columns[field][idx])
+            if value >= 0:
+                document[field] = self.strings[value]
+        for field in INT_FIELDS:
+            value = int(self.columns[field][idx])
+            if value >= 0:
+                document[field] = value
+        if idx in self.extra:
+            document.update(self.extra[idx])
+        return document
+
+class DocumentStore:
+    """
+    Compact sequence of document metadata.
+
+    Documents are an optional columnar base (possibly memory mapped)
+    followed by documents appended in memory. Appended documents are not
+    kept as dicts: text goes into one contiguous UTF-8 buffer with an
+    offsets array, integer fields into typed arrays and source/type
+    strings are interned once. Embeddings are dropped since they already
+    live in the vector index. Indexing returns a freshly built dict with
+    the same keys the document was added with.
+    """
+
+    def __init__(self, documents: Optional[Iterable[Dict]] = None, base: Optional[ColumnarDocuments] = None):
+        """
+        Initialize the document store.
+
+        Args:
+            documents: Documents to start with
+            base: Columnar documents preceding the in-memory ones
+        """
+        self._base = base
+        self._strings: List[str] = list(base.strings) if base is not None else []
+        self._string_ids: Dict[str, int] = {value: i for i, value in enumerate(self._strings)}
+        self._text = bytearray()
+        self._offsets = array("q", [0])
+        self._ints = {field: array("q") for field in INT_FIELDS}
+        self._string_columns = {field: array("i") for field in STRING_FIELDS}
+        self._extra: Dict[int, Dict] = {}  # tail row -> fields outside the fixed schema
+        # Precomputed row sets per string value: tail rows are appended as documents
+        # are added, base rows are grouped once on first use
+        self._string_rows = {field: {} for field in STRING_FIELDS}  # field -> string id -> tail rows
+        self._base_string_rows: Dict[str, Dict[int, np.ndarray]] = {}
+        self._count = 0
+        if documents:
+            self.extend(documents)
+
+    @classmethod
+    def open(cls, directory: str, use_mmap: bool = True) -> "DocumentStore":
+        """
+        Open a directory written by write().
+
+        Args:
+            directory: Columnar document directory
+            use_mmap: Map the files instead of reading them into memory
+
+        Returns:
+            DocumentStore backed by the directory
+        """
+        return cls(base=ColumnarDocuments(directory, use_mmap=use_mmap))
+
+    @property
+    def base_size(self) -> int:
+        return len(self._base) if self._base is not None else 0
+
+    def __len__(self) -> int:
+        return self.base_size + self._count
+
+    def __getitem__(self, idx: Union[int, slice]) -> Union[Dict, List[Dict]]:
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("document index out of range")
+        if idx < self.base_size:
+            return self._base[idx]
+
+        row = idx - self.base_size
+        document = {"text": self._text[self._offsets[row]:self._offsets[row + 1]].decode("utf-8")}
+        for field in STRING_FIELDS:
+            value = self._string_columns[field][row]
+            if value >= 0:
+                document[field] = self._strings[value]
+        for field in INT_FIELDS:
+            value = self._ints[field][row]
+            if value >= 0:
+                document[field] = value
+        if row in self._extra:
+            document.update(self._extra[row])
+        return document
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def _intern(self, value) -> int:
+        if value is None:
+            return -1
+        value = str(value)
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self._strings)
+            self._strings.append(value)
+        return string_id
+
+    def extend(self, documents: Iterable[Dict]) -> None:
+        """
+        Append documents.
+
+        Args:
+            documents: Document dictionaries; any "embedding" key is ignored
+        """
+        for doc in documents:
+            row = self._count
+            self._text += str(doc.get("text", "")).encode("utf-8")
+            self._offsets.append(len(self._text))
+            for field in INT_FIELDS:
+                value = doc.get(field)
+                self._ints[field].append(int(value) if value is not None else -1)
+            for field in STRING_FIELDS:
+                string_id = self._intern(doc.get(field))
+                self._string_columns[field].append(string_id)
+                if string_id >= 0:
+                    rows = self._string_rows[field].get(string_id)
+                    if rows is None:
+                        rows = self._string_rows[field][string_id] = array("q")
+                    rows.append(row)
+            others = {key: value for key, value in doc.items() if key not in KNOWN_FIELDS}
+            if others:
+                self._extra[row] = others
+            # Publish the row only once all of its columns are filled
+            self._count = row + 1
+
+    def _base_rows(self, field: str) -> Dict[int, np.ndarray]:
+        """Group the base rows of a string field by value, once."""
+        groups = self._base_string_rows.get(field)
+        if groups is None:
+            column = np.asarray(self._base.columns[field])
+            order = np.argsort(column, kind="stable")
+            values, starts = np.unique(column[order], return_index=True)
+            bounds = list(starts[1:]) + [len(order)]
+            groups = {int(value): order[start:end].astype(np.int64)
+                      for value, start, end in zip(values, starts, bounds) if value >= 0}
+            self._base_string_rows[field] = groups
+        return groups
+    
+    def rows_with(self, field: str, value: str) -> np.ndarray:
+        """
+        Find the rows whose string field equals a value.
+        
+        Args:
+            field: One of STRING_FIELDS
+            value: Value to match
+            
+        Returns:
+            Sorted array of row ids
+        """
+        string_id = self._string_ids.get(str(value))
+        if string_id is None:
+            return np.empty(0, dtype=np.int64)
+        parts = []
+        if self._base is not None:
+            parts.append(self._base_rows(field).get(string_id, np.empty(0, dtype=np.int64)))
+        rows = self._string_rows[field].get(string_id)
+        if rows is not None:
+            tail = np.frombuffer(rows[:], dtype=np.int64)
+            # Rows of documents appended after a snapshot was taken are not part of it
+            parts.append(tail[tail < self._count] + self.base_size)
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(parts).astype(np.int64)
+    
+    def rows_in_range(self, field: str, low: Optional[int] = None, high: Optional[int] = None) -> np.ndarray:
+        """
+        Find the rows whose integer field lies in a range.
+        
+        Args:
+            field: One of INT_FIELDS
+            low: Smallest value included (None for no lower bound)
+            high: Largest value included (None for no upper bound)
+            
+        Returns:
+            Sorted array of row ids; rows without the field never match
+        """
+        parts = []
+        if self._base is not None:
+            parts.append(np.asarray(self._base.columns[field]))
+        parts.append(np.frombuffer(self._ints[field][:self._count], dtype=np.int64))
+        column = np.concatenate(parts)
+        mask = column >= (low if low is not None else 0)
+        if high is not None:
+            mask &= column <= high
+        return np.flatnonzero(mask).astype(np.int64)
+    
+    def snapshot(self) -> "DocumentStore":
+        """
+        Return a view of the current documents that is unaffected by later appends.
+
+        The view shares the append-only buffers, so taking it is O(1).
+        """
+        view = copy.copy(self)
+        view._extra = dict(self._extra)
+        return view
+
+    def write(self, directory: str, start: int = 0, stop: Optional[int] = None) -> None:
+        """
+        Write documents in the columnar format read by ColumnarDocuments.
+
+        Args:
+            directory: Destination directory (created if missing)
+            start: First document to write
+            stop: End of the range to write (default: all documents)
+        """
+        os.makedirs(directory, exist_ok=True)
+        stop = len(self) if stop is None else min(stop, len(self))
+        start = min(start, stop)
+        base = self._base
+        base_start, base_stop = min(start, self.base_size), min(stop, self.base_size)
+        tail_start, tail_stop = max(start - self.base_size, 0), max(stop - self.base_size, 0)
+
+        offset_parts, column_parts = [], {field: [] for field in INT_FIELDS + STRING_FIELDS}
+        extra: Dict[int, Dict] = {}
+        with open(os.path.join(directory, "text.bin"), "wb") as f:
+            written = 0
+            if base_stop > base_start:
+                # Copy the mapped blob in bounded pieces
+                begin, end = int(base.offsets[base_start]), int(base.offsets[base_stop])
+                for chunk_start in range(begin, end, COPY_CHUNK_SIZE):
+                    f.write(base.text[chunk_start:min(chunk_start + COPY_CHUNK_SIZE, end)])
+                offset_parts.append(np.asarray(base.offsets[base_start:base_stop], dtype=np.int64) - begin)
+                for field in column_parts:
+                    column_parts[field].append(np.asarray(base.columns[field][base_start:base_stop]))
+                for row, fields in base.extra.items():
+                    if base_start <= row < base_stop:
+                        extra[row - start] = fields
+                written = end - begin
+            if tail_stop > tail_start:
+                # Slice (copy) the buffers instead of exporting them: exported
+                # buffers cannot be resized by concurrent appends
+                offsets = np.frombuffer(self._offsets[tail_start:tail_stop + 1], dtype=np.int64)
+                begin, end = int(offsets[0]), int(offsets[-1])
+                for chunk_start in range(begin, end, COPY_CHUNK_SIZE):
+                    f.write(self._text[chunk_start:min(chunk_start + COPY_CHUNK_SIZE, end)])
+                offset_parts.append(offsets[:-1] - begin + written)
+                for field in INT_FIELDS:
+                    column_parts[field].append(np.frombuffer(self._ints[field][tail_start:tail_stop], dtype=np.int64))
+                for field in STRING_FIELDS:
+                    column_parts[field].append(np.frombuffer(self._string_columns[field][tail_start:tail_stop], dtype=np.int32))
+                for row, fields in self._extra.items():
+                    if tail_start <= row < tail_stop:
+                        extra[self.base_size + row - start] = fields
+                written += end - begin
+        offset_parts.append(np.array([written], dtype=np.int64))
+
+        np.save(os.path.join(directory, "text_offsets.npy"), np.concatenate(offset_parts))
+        for field in INT_FIELDS:
+            np.save(os.path.join(directory, f"{field}.npy"),
+                    np.concatenate(column_parts[field] or [np.empty(0)]).astype(np.int64))
+        for field in STRING_FIELDS:
+            np.save(os.path.join(directory, f"{field}.npy"),
+                    np.concatenate(column_parts[field] or [np.empty(0)]).astype(np.int32))
+        with open(os.path.join(directory, "strings.json"), "w") as f:
+            json.dump(self._strings, f)
+        if extra:
+            with open(os.path.join(directory, "extra.pkl"), "wb") as f:
+                pickle.dump(extra, f)
+
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Report the memory held by the metadata, in bytes.
+
+        Returns:
+            Dictionary with heap bytes per component and the size of the
+            memory-mapped base (shared page cache, not private heap)
+        """
+        count = self._count
+        return {
+            "documents": len(self),
+            "text_bytes": len(self._text),
+            "offsets_bytes": self._offsets.itemsize * len(self._offsets),
+            "int_columns_bytes": sum(column.itemsize * len(column) for column in self._ints.values()),
+            "string_columns_bytes": sum(column.itemsize * len(column) for column in self._string_columns.values()),
+            "string_table_bytes": sum(sys.getsizeof(value) for value in self._strings),
+            "extra_fields": len(self._extra),
+            "tail_documents": count,
+            "base_mapped_bytes": self._base.nbytes() if self._base is not None else 0,
+        }
@@ -0,0 +1,236 @@
+from typing import Iterator, Optional, Tuple
+import numpy as np
+import faiss
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "sq_fp16")
+# Index types storing lossy codes, whose results can be re-ranked with the original vectors
+QUANTIZED_TYPES = ("ivf_pq", "sq8", "sq_fp16")
+# Vectors used to learn the per-dimension ranges of the 8-bit scalar quantizer
+SQ8_TRAINING_SIZE = 4096
+# Vectors with a smaller norm cannot be normalized meaningfully (failed embeddings are all zeros)
+MIN_VECTOR_NORM = 1e-6
+
+def build_index(index_type: str, dimension: int, nlist: int = 1024, pq_m: int = 64,
+                pq_nbits: int = 8, hnsw_m: int = 32) -> faiss.Index:
+    """
+    Build an empty (possibly untrained) inner-product FAISS index.
+
+    Every index accepts add_with_ids: flat, HNSW and scalar quantizer
+    indexes are wrapped in an IndexIDMap, IVF indexes store ids natively.
+    "sq8" stores each component in 8 bits (4x smaller than float32),
+    "sq_fp16" as a half-precision float (2x smaller).
+
+    Args:
+        index_type: One of INDEX_TYPES
+        dimension: Dimension of the embedding vectors
+        nlist: Number of inverted lists for IVF indexes
+        pq_m: Number of PQ sub-quantizers (must divide dimension)
+        pq_nbits: Bits per PQ sub-quantizer code
+        hnsw_m: Number of neighbours per node in the HNSW graph
+
+    Returns:
+        FAISS index using the inner product metric
+    """
+    if index_type == "flat":
+        description = "IDMap,Flat"
+    elif index_type == "ivf_flat":
+        description = f"IVF{nlist},Flat"
+    elif index_type == "ivf_pq":
+        if dimension % pq_m != 0:
+            raise ValueError(f"pq_m={pq_m} does not divide dimension {dimension}")
+        description = f"IVF{nlist},PQ{pq_m}x{pq_nbits}"
+    elif index_type == "hnsw":
+        description = f"IDMap,HNSW{hnsw_m},Flat"
+    elif index_type == "sq8":
+        description = "IDMap,SQ8"
+    elif index_type == "sq_fp16":
+        description = "IDMap,SQfp16"
+    else:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+    return faiss.index_factory(dimension, description, faiss.METRIC_INNER_PRODUCT)
+
+def training_size(index_type: str, nlist: int = 1024, pq_nbits: int = 8) -> int:
+    """
+    Number of vectors to collect before an index of this type is trained.
+
+    FAISS recommends ~39 training points per centroid; below that k-means
+    produces poor clusters, so the store keeps searching a flat index until
+    the threshold is reached. The 8-bit scalar quantizer only learns value
+    ranges, which a few thousand vectors cover.
+
+    Args:
+        index_type: One of INDEX_TYPES
+        nlist: Number of inverted lists for IVF indexes
+        pq_nbits: Bits per PQ sub-quantizer code
+
+    Returns:
+        Minimum number of vectors, 0 when no training is needed
+    """
+    if index_type == "ivf_flat":
+        return 39 * nlist
+    if index_type == "ivf_pq":
+        return 39 * max(nlist, 2 ** pq_nbits)
+    if index_type == "sq8":
+        return SQ8_TRAINING_SIZE
+    return 0
+
+def index_kind(index: faiss.Index) -> str:
+    """
+    Classify a FAISS index into one of INDEX_TYPES.
+
+    Args:
+        index: FAISS index (optionally wrapped in an IndexIDMap)
+
+    Returns:
+        Index type name
+    """
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "sq_fp16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "flat"
+
+def search_parameters(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                      selector: Optional[faiss.IDSelector] = None) -> Optional[faiss.SearchParameters]:
+    """
+    Build per-query search parameters for the given index.
+
+    Parameters are passed to each search call instead of being set on the
+    index so that concurrent searches can use different values.
+
+    Args:
+        index: FAISS index that will be searched
+        nprobe: Number of inverted lists to visit (IVF indexes)
+        ef_search: Size of the dynamic candidate list (HNSW indexes)
+        selector: Restricts the search to the ids it accepts
+
+    Returns:
+        SearchParameters instance, or None if none apply
+    """
+    kind = index_kind(index)
+    if kind in ("ivf_flat", "ivf_pq") and nprobe:
+        params = faiss.SearchParametersIVF()
+        params.nprobe = int(nprobe)
+    elif kind == "hnsw" and ef_search:
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = int(ef_search)
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+    if selector is not None:
+        params.sel = selector
+    return params
+
+def has_id_map(index: faiss.Index) -> bool:
+    """Check whether the index stores explicit ids (IndexIDMap or IVF)."""
+    index = faiss.downcast_index(index)
+    return isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2, faiss.IndexIVF))
+
+def extract_vectors(index: faiss.Index) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Read back the vectors and ids of a flat, HNSW or scalar quantizer index.
+
+    Args:
+        index: IndexFlat/IndexHNSWFlat/IndexScalarQuantizer, optionally wrapped in an IndexIDMap
+
+    Returns:
+        Tuple of (vectors, ids); ids are positions for an unwrapped index
+    """
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        inner = faiss.downcast_index(index.index)
+        return inner.reconstruct_n(0, inner.ntotal), faiss.vector_to_array(index.id_map).astype(np.int64)
+    return index.reconstruct_n(0, index.ntotal), np.arange(index.ntotal, dtype=np.int64)
+
+def iter_vectors(index: faiss.Index, batch_size: int = 16384) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Read back the ids and vectors of any index, a batch at a time.
+
+    Quantized indexes return their decoded (approximate) vectors. IVF
+    indexes need a direct map to reconstruct by id; a hash table map, which
+    allows any ids, is built for the scan and the previous map type is
+    restored afterwards, even if the scan fails.
+
+    Args:
+        index: FAISS index
+        batch_size: Vectors per batch
+
+    Yields:
+        Tuples of (ids, vectors)
+    """
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        inner = faiss.downcast_index(index.index)
+        ids = faiss.vector_to_array(index.id_map).astype(np.int64)
+        for start in range(0, inner.ntotal, batch_size):
+            count = min(batch_size, inner.ntotal - start)
+            yield ids[start:start + count], inner.reconstruct_n(start, count)
+    elif isinstance(index, faiss.IndexIVF):
+        invlists = index.invlists
+        parts = []
+        for list_no in range(index.nlist):
+            size = invlists.list_size(list_no)
+            if size:
+                parts.append(faiss.rev_swig_ptr(invlists.get_ids(list_no), size).copy())
+        ids = np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+        # An array map needs ids 0..ntotal-1, which deletes and explicit ids break
+        map_type = index.direct_map.type
+        try:
+            index.set_direct_map_type(faiss.DirectMap.Hashtable)
+            for start in range(0, len(ids), batch_size):
+                batch = ids[start:start + batch_size]
+                yield batch, index.reconstruct_batch(batch)
+        finally:
+            index.set_direct_map_type(map_type)
+    else:
+        for start in range(0, index.ntotal, batch_size):
+            count = min(batch_size, index.ntotal - start)
+            yield np.arange(start, start + count, dtype=np.int64), index.reconstruct_n(start, count)
+
+def normalize_vectors(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    L2-normalize vectors so that inner product search ranks by cosine similarity.
+
+    The rows of a float32 C-contiguous array are normalized in place (other
+    arrays are converted first), with a single vectorized pass when every
+    row is valid.
+
+    Args:
+        vectors: (n, dimension) matrix
+
+    Returns:
+        Tuple of (normalized float32 vectors, mask of valid rows); rows with a
+        zero, NaN or infinite norm are invalid and left unchanged
+    """
+    vectors = np.ascontiguousarray(np.atleast_2d(vectors), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1)
+    valid = np.isfinite(norms) & (norms > MIN_VECTOR_NORM)
+    if valid.all():
+        faiss.normalize_L2(vectors)
+    elif valid.any():
+        vectors[valid] /= norms[valid, None]
+    return vectors, valid
+
+def index_bytes(index: faiss.Index) -> int:
+    """Estimate the memory held by a FAISS index from its per-vector code size."""
+    index = faiss.downcast_index(index)
+    id_bytes = 0
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        id_bytes = 8 * int(index.ntotal)
+        index = faiss.downcast_index(index.index)
+    try:
+        return int(index.ntotal) * int(index.sa_code_size()) + id_bytes
+    except Exception:
+        return int(faiss.serialize_index(index).nbytes) + id_bytes
@@ -0,0 +1,269 @@
+from typing import List, Dict, Iterable, Optional, Set, Tuple
+from array import array
+import numpy as np
+import logging
+import math
+import json
+import re
+import os
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Words joined by -, _, ., : or / are kept whole (error codes, part numbers, paths)
+# and also indexed as their parts
+TOKEN_PATTERN = re.compile(r"\w+(?:[-_.:/]\w+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he her his how i if in into is it its me my no not of "
+    "on or our she so than that the their them then there these they this to was we were what when where "
+    "which who why will with you your".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase index terms.
+
+    Args:
+        text: Text to tokenize
+
+    Returns:
+        Terms, including both compound identifiers and their parts
+    """
+    terms = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        term = match.group()
+        if term in STOPWORDS:
+            continue
+        terms.append(term)
+        if not term.isalnum():
+            terms.extend(part for part in re.split(r"[-_.:/]", term) if part and part not in STOPWORDS)
+    return terms
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Fuse ranked id lists with reciprocal rank fusion.
+
+    Args:
+        rankings: Id lists, best first
+        k: Rank offset damping the weight of top ranks
+
+    Returns:
+        (id, fused score) pairs, best first
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+class BM25Index:
+    """
+    Incremental BM25 inverted index over document rows.
+
+    Like DocumentStore, postings are an optional on-disk base in CSR form
+    (terms, offsets, doc ids, term frequencies; memory mappable) followed by
+    postings appended in memory as documents are added. Document ids are
+    row numbers, assigned in insertion order.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        """
+        Initialize an empty index.
+
+        Args:
+            k1: Term frequency saturation
+            b: Document length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self._base_terms: Dict[str, int] = {}
+        self._base_offsets = np.zeros(1, dtype=np.int64)
+        self._base_ids = np.empty(0, dtype=np.int64)
+        self._base_tfs = np.empty(0, dtype=np.int32)
+        self._base_lengths = np.empty(0, dtype=np.int32)
+        self._postings: Dict[str, Tuple[array, array]] = {}  # term -> (ids, term frequencies)
+        self._lengths = array("i")  # lengths of appended documents
+        self._total_length = 0
+        self._count = 0
+
+    @classmethod
+    def open(cls, directory: str, use_mmap: bool = True) -> "BM25Index":
+        """
+        Open an index written by write().
+
+        Args:
+            directory: Index directory
+            use_mmap: Map the posting arrays instead of reading them into memory
+
+        Returns:
+            BM25Index backed by the directory
+        """
+        index = cls()
+        mmap_mode = "r" if use_mmap else None
+        with open(os.path.join(directory, "terms.json"), "r") as f:
+            terms = json.load(f)
+        index._base_terms = {term: i for i, term in enumerate(terms)}
+        index._base_offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode=mmap_mode)
+        index._base_ids = np.load(os.path.join(directory, "ids.npy"), mmap_mode=mmap_mode)
+        index._base_tfs = np.load(os.path.join(directory, "tfs.npy"), mmap_mode=mmap_mode)
+        index._base_lengths = np.load(os.path.join(directory, "lengths.npy"))
+        index._count = len(index._base_lengths)
+        index._total_length = int(index._base_lengths.sum())
+        return index
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, texts: Iterable[str]) -> None:
+        """
+        Index documents under the next row ids.
+
+        Args:
+            texts: Text of each document, in row order
+        """
+        for text in texts:
+            doc_id = self._count
+            frequencies: Dict[str, int] = {}
+            for term in tokenize(text):
+                frequencies[term] = frequencies.get(term, 0) + 1
+            for term, frequency in frequencies.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = (array("q"), array("i"))
+                postings[0].append(doc_id)
+                postings[1].append(frequency)
+            length = sum(frequencies.values())
+            self._lengths.append(length)
+            self._total_length += length
+            # Publish the document only once its postings are in place
+            self._count = doc_id + 1
+
+    def _term_postings(self, term: str, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the ids and term frequencies of a term among the first count documents."""
+        ids, tfs = [], []
+        base = self._base_terms.get(term)
+        if base is not None:
+            start, end = int(self._base_offsets[base]), int(self._base_offsets[base + 1])
+            ids.append(np.asarray(self._base_ids[start:end]))
+            tfs.append(np.asarray(self._base_tfs[start:end]))
+        postings = self._postings.get(term)
+        if postings is not None:
+            # Slice (copy) rather than export the arrays, which may still grow
+            tail_ids = np.frombuffer(postings[0][:len(postings[1])], dtype=np.int64)
+            tail_tfs = np.frombuffer(postings[1][:len(tail_ids)], dtype=np.int32)
+            keep = tail_ids < count
+            ids.append(tail_ids[keep])
+            tfs.append(tail_tfs[keep])
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+        return np.concatenate(ids), np.concatenate(tfs)
+
+    def search(self, query: str, k: int = 5, exclude: Optional[Set[int]] = None,
+               allowed: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Rank documents against a query with BM25.
+
+        Args:
+            query: Query text
+            k: Number of results to return
+            exclude: Ids to leave out (deleted documents)
+            allowed: Sorted ids to restrict the ranking to (metadata filters)
+
+        Returns:
+            (id, score) pairs, best first
+        """
+        count = self._count
+        terms = set(tokenize(query))
+        if not count or not terms:
+            return []
+        base_count = len(self._base_lengths)
+        tail_lengths = np.frombuffer(self._lengths[:count - base_count], dtype=np.int32)
+        average_length = max(self._total_length / count, 1.0)
+
+        all_ids, all_scores = [], []
+        for term in terms:
+            ids, tfs = self._term_postings(term, count)
+            if not len(ids):
+                continue
+            idf = math.log(1.0 + (count - len(ids) + 0.5) / (len(ids) + 0.5))
+            lengths = np.empty(len(ids), dtype=np.float32)
+            in_base = ids < base_count
+            lengths[in_base] = self._base_lengths[ids[in_base]]
+            lengths[~in_base] = tail_lengths[ids[~in_base] - base_count]
+            tfs = tfs.astype(np.float32)
+            norm = self.k1 * (1.0 - self.b + self.b * lengths / average_length)
+            all_ids.append(ids)
+            all_scores.append(idf * tfs * (self.k1 + 1.0) / (tfs + norm))
+        if not all_ids:
+            return []
+
+        ids, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+        if allowed is not None:
+            keep = np.isin(ids, allowed, assume_unique=True)
+            ids, scores = ids[keep], scores[keep]
+            if not len(ids):
+                return []
+        # At most len(exclude) of the best candidates can be excluded
+        top = min(len(ids), k + (len(exclude) if exclude else 0))
+        best = np.argpartition(-scores, top - 1)[:top] if top < len(ids) else np.arange(len(ids))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        results = []
+        for i in best.tolist():
+            doc_id = int(ids[i])
+            if exclude and doc_id in exclude:
+                continue
+            results.append((doc_id, float(scores[i])))
+            if len(results) == k:
+                break
+        return results
+
+    def write(self, directory: str, count: Optional[int] = None) -> None:
+        """
+        Write the first count documents in the format read by open().
+
+        Args:
+            directory: Destination directory (created if missing)
+            count: Number of documents to write (default: all)
+        """
+        os.makedirs(directory, exist_ok=True)
+        count = self._count if count is None else min(count, self._count)
+        base_count = len(self._base_lengths)
+        terms = list(self._base_terms)
+        terms.extend(term for term in list(self._postings) if term not in self._base_terms)
+
+        offsets, id_parts, tf_parts, kept_terms = [0], [], [], []
+        for term in terms:
+            ids, tfs = self._term_postings(term, count)
+            if not len(ids):
+                continue
+            kept_terms.append(term)
+            id_parts.append(ids)
+            tf_parts.append(tfs)
+            offsets.append(offsets[-1] + len(ids))
+        lengths = np.concatenate([
+            np.asarray(self._base_lengths[:count], dtype=np.int32),
+            np.frombuffer(self._lengths[:max(count - base_count, 0)], dtype=np.int32),
+        ])
+
+        with open(os.path.join(directory, "terms.json"), "w") as f:
+            json.dump(kept_terms, f)
+        np.save(os.path.join(directory, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+        np.save(os.path.join(directory, "ids.npy"), np.concatenate(id_parts or [np.empty(0)]).astype(np.int64))
+        np.save(os.path.join(directory, "tfs.npy"), np.concatenate(tf_parts or [np.empty(0)]).astype(np.int32))
+        np.save(os.path.join(directory, "lengths.npy"), lengths)
+
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Report the size of the index.
+
+        Returns:
+            Dictionary with document and term counts and posting bytes
+        """
+        postings = list(self._postings.values())
+        return {
+            "documents": self._count,
+            "terms": len(self._base_terms) + sum(1 for term in list(self._postings) if term not in self._base_terms),
+            "tail_posting_bytes": sum(ids.itemsize * len(ids) + tfs.itemsize * len(tfs) for ids, tfs in postings),
+            "base_posting_bytes": int(self._base_ids.nbytes + self._base_tfs.nbytes),
+        }
@@ -0,0 +1,107 @@
+from typing import Any, Dict, Hashable, Optional, Tuple
+from collections import OrderedDict
+import numpy as np
+import threading
+import hashlib
+
+class LRUCache:
+    """Thread-safe in-memory least-recently-used cache."""
+
+    def __init__(self, max_size: int = 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            max_size: Maximum number of entries (0 disables the cache)
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entry if full."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """Report hit/miss counters and size."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else None,
+            "entries": len(self._entries),
+            "max_size": self.max_size,
+        }
+
+class ResultCache(LRUCache):
+    """
+    Cache of search results keyed by a quantized query embedding.
+
+    Query vectors are normalized and rounded to a coarse grid, so repeated
+    and near-identical queries map to the same bucket. Keys include the
+    index version, and the whole cache is dropped when the version changes,
+    so results are never served from an index that has since been modified.
+    """
+
+    def __init__(self, max_size: int = 256, resolution: int = 64):
+        """
+        Initialize the result cache.
+
+        Args:
+            max_size: Maximum number of cached result lists (0 disables the cache)
+            resolution: Grid steps per unit when quantizing query vectors
+        """
+        super().__init__(max_size)
+        self.resolution = resolution
+        self._version = None
+
+    def bucket(self, query_embedding: np.ndarray) -> str:
+        """Return the bucket id of a query vector."""
+        query = np.asarray(query_embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        quantized = np.round(query * self.resolution).astype(np.int8)
+        return hashlib.blake2b(quantized.tobytes(), digest_size=16).hexdigest()
+
+    def key(self, query_embedding: np.ndarray, version: int, *params: Hashable) -> Tuple:
+        """
+        Build the cache key of a search.
+
+        Args:
+            query_embedding: Query vector
+            version: Index version the search runs against
+            params: Other search parameters (k, nprobe, ...)
+        """
+        return (self.bucket(query_embedding), version) + params
+
+    def get_for_version(self, key: Tuple, version: int) -> Optional[Any]:
+        """Look up a key, first dropping every entry if the index version changed."""
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+        return self.get(key)
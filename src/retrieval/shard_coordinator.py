@@ -0,0 +1,187 @@
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, wait
+import heapq
+import logging
+import threading
+import time
+import zlib
+import os
+import httpx
+import numpy as np
+from .shard_server import encode_vectors
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ShardCoordinator:
+    """
+    Scatter-gather search over vector store shards served by shard_server.
+
+    Every query is sent to all shards concurrently and the per-shard top-k
+    lists are merged by score. Shards that have not answered by the
+    deadline are left out of the result rather than holding it up. Offers
+    the search methods of VectorStore, so it can back a DocumentSearchTool.
+
+    Dense scores are inner products and merge exactly. BM25 and hybrid
+    (reciprocal rank fusion) scores are computed per shard, so their merge
+    is approximate: BM25 term statistics are those of each shard.
+    """
+
+    def __init__(self, urls: Optional[List[str]] = None, deadline: Optional[float] = None):
+        """
+        Initialize the coordinator.
+
+        Args:
+            urls: Base URLs of the shards (default: comma-separated SHARD_URLS)
+            deadline: Seconds to wait for shards per search (default: SHARD_DEADLINE_MS / 1000 or 1.0)
+        """
+        self.urls = [url.rstrip("/") for url in (urls or os.getenv("SHARD_URLS", "").split(",")) if url.strip()]
+        if not self.urls:
+            raise ValueError("No shard URLs configured (set SHARD_URLS)")
+        self.deadline = deadline or float(os.getenv("SHARD_DEADLINE_MS", 1000)) / 1000
+        self._client = httpx.Client(limits=httpx.Limits(max_connections=16 * len(self.urls)))
+        # Late requests keep a worker until their own timeout, so leave room for them
+        self._executor = ThreadPoolExecutor(max_workers=8 * len(self.urls), thread_name_prefix="shard-search")
+        self._stats = [{"requests": 0, "timeouts": 0, "errors": 0, "seconds": 0.0} for _ in self.urls]
+        self._lock = threading.Lock()
+
+    def shard_for(self, source: str) -> int:
+        """Return the shard holding the documents of a source."""
+        return zlib.crc32(source.encode("utf-8")) % len(self.urls)
+
+    def add_documents(self, documents: List[Dict]) -> int:
+        """
+        Add documents, keeping all chunks of a source on one shard.
+
+        Args:
+            documents: Document dictionaries with embeddings, as for VectorStore.add_documents
+
+        Returns:
+            Number of documents added
+        """
+        batches: Dict[int, List[Dict]] = {}
+        for doc in documents:
+            batches.setdefault(self.shard_for(str(doc.get("source", ""))), []).append(doc)
+        futures = []
+        for shard, batch in batches.items():
+            payload = {
+                "documents": [{key: value for key, value in doc.items() if key != "embedding"} for doc in batch],
+                "embeddings": encode_vectors(np.vstack([doc["embedding"] for doc in batch])),
+            }
+            futures.append(self._executor.submit(self._post, shard, "/documents", payload, None))
+        return sum(future.result()["added"] for future in futures)
+
+    def save(self) -> None:
+        """Ask every shard to save its store."""
+        for future in [self._executor.submit(self._post, shard, "/save", {}, None) for shard in range(len(self.urls))]:
+            future.result()
+
+    def search(self, query_embedding: np.ndarray, k: int = 5, nprobe: Optional[int] = None,
+               ef_search: Optional[int] = None, filters: Optional[Dict] = None) -> List[Tuple[Dict, float]]:
+        """Search all shards for one query, see VectorStore.search."""
+        return self.search_batch(query_embedding.reshape(1, -1), k=k, nprobe=nprobe, ef_search=ef_search,
+                                 filters=filters)[0]
+
+    def search_batch(self, query_embeddings: np.ndarray, k: int = 5, nprobe: Optional[int] = None,
+                     ef_search: Optional[int] = None, filters: Optional[Dict] = None) -> List[List[Tuple[Dict, float]]]:
+        """Search all shards for several queries, see VectorStore.search_batch."""
+        return self.scatter({"vectors": encode_vectors(query_embeddings), "k": k, "mode": "dense",
+                             "filters": filters, "nprobe": nprobe, "ef_search": ef_search},
+                            len(query_embeddings), k)[0]
+
+    def lexical_search(self, query: str, k: int = 5, filters: Optional[Dict] = None) -> List[Tuple[Dict, float]]:
+        """Search all shards by keyword, see VectorStore.lexical_search."""
+        return self.scatter({"queries": [query], "k": k, "mode": "lexical", "filters": filters}, 1, k)[0][0]
+
+    def hybrid_search_batch(self, query_embeddings: np.ndarray, queries: List[str], k: int = 5,
+                            nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                            filters: Optional[Dict] = None) -> List[List[Tuple[Dict, float]]]:
+        """Run hybrid search on all shards, see VectorStore.hybrid_search_batch."""
+        return self.scatter({"vectors": encode_vectors(query_embeddings), "queries": queries, "k": k,
+                             "mode": "hybrid", "filters": filters, "nprobe": nprobe, "ef_search": ef_search},
+                            len(queries), k)[0]
+
+    def scatter(self, payload: Dict, count: int, k: int) -> Tuple[List[List[Tuple[Dict, float]]], List[int]]:
+        """
+        Send a search to every shard and merge the answers that arrive by the deadline.
+
+        Args:
+            payload: Shard search request
+            count: Number of queries in the request
+            k: Results kept per query
+
+        Returns:
+            (merged results per query, shards missing from them)
+        """
+        futures = {self._executor.submit(self._post, shard, "/search", payload, self.deadline): shard
+                   for shard in range(len(self.urls))}
+        done, late = wait(futures, timeout=self.deadline)
+        merged: List[List[Tuple[Dict, float]]] = [[] for _ in range(count)]
+        missing = sorted(futures[future] for future in late)
+        for future in done:
+            shard = futures[future]
+            try:
+                results = future.result()["results"]
+            except Exception as e:
+                logger.warning(f"Shard {self.urls[shard]} failed: {str(e)}")
+                if isinstance(e, httpx.TimeoutException):
+                    self._record(shard, timeout=True)
+                missing.append(shard)
+                continue
+            for hits, shard_hits in zip(merged, results):
+                hits.extend((doc, score) for doc, score in shard_hits)
+        for future in late:
+            self._record(futures[future], timeout=True)
+        if missing:
+            logger.warning(f"Search results exclude {len(missing)} of {len(self.urls)} shards: "
+                           f"{[self.urls[shard] for shard in sorted(missing)]}")
+        return [heapq.nlargest(k, hits, key=lambda hit: hit[1]) for hits in merged], sorted(missing)
+
+    def _post(self, shard: int, path: str, payload: Dict, timeout: Optional[float]) -> Dict:
+        """Send one request to a shard and record its latency or failure."""
+        started = time.perf_counter()
+        try:
+            response = self._client.post(self.urls[shard] + path, json=payload, timeout=timeout)
+            response.raise_for_status()
+            return response.json()
+        except httpx.TimeoutException:
+            # Counted by scatter, which also sees shards that are merely late
+            raise
+        except Exception:
+            self._record(shard, error=True)
+            raise
+        finally:
+            with self._lock:
+                self._stats[shard]["requests"] += 1
+                self._stats[shard]["seconds"] += time.perf_counter() - started
+
+    def _record(self, shard: int, timeout: bool = False, error: bool = False) -> None:
+        with self._lock:
+            self._stats[shard]["timeouts"] += timeout
+            self._stats[shard]["errors"] += error
+
+    def health(self) -> List[Optional[Dict]]:
+        """Return each shard's document counts, or None for shards that do not answer."""
+        def get(url: str) -> Optional[Dict]:
+            try:
+                response = self._client.get(url + "/health", timeout=self.deadline)
+                response.raise_for_status()
+                return response.json()
+            except Exception:
+                return None
+        return list(self._executor.map(get, self.urls))
+
+    def stats(self) -> List[Dict]:
+        """Report requests, timeouts, errors and mean latency per shard."""
+        with self._lock:
+            return [{
+                "url": url,
+                **stats,
+                "seconds": round(stats["seconds"], 3),
+                "mean_ms": round(stats["seconds"] / stats["requests"] * 1000, 2) if stats["requests"] else None,
+            } for url, stats in zip(self.urls, self._stats)]
+
+    def close(self) -> None:
+        """Close the connections to the shards."""
+        self._executor.shutdown(wait=False)
+        self._client.close()
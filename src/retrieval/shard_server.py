@@ -0,0 +1,134 @@
+"""
+Serve one shard of a partitioned vector store over HTTP.
+
+Usage:
+    python -m src.retrieval.shard_server DIRECTORY [--port 8101] [--host 127.0.0.1] [--dimension N]
+
+The shard loads (or creates) the vector store in DIRECTORY and answers
+searches from a ShardCoordinator, which fans each query out to every shard
+and merges the results. Documents are added through the coordinator, which
+routes every chunk of a source to the same shard.
+"""
+from typing import Dict, List, Optional
+import argparse
+import base64
+import logging
+import os
+import numpy as np
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+from .vector_store import VectorStore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SHARD_MODES = ("dense", "lexical", "hybrid")
+
+class ShardSearchRequest(BaseModel):
+    # Query vectors as base64 of a float32 (n, dimension) matrix; texts for lexical and hybrid search
+    vectors: Optional[str] = None
+    queries: Optional[List[str]] = None
+    k: int = 5
+    mode: str = "dense"
+    filters: Optional[Dict] = None
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+
+class ShardDocumentsRequest(BaseModel):
+    # Chunk metadata, and their embeddings as base64 of a float32 (n, dimension) matrix
+    documents: List[Dict]
+    embeddings: str
+
+def encode_vectors(vectors: np.ndarray) -> str:
+    """Encode a float32 matrix for a shard request."""
+    return base64.b64encode(np.ascontiguousarray(vectors, dtype=np.float32).tobytes()).decode("ascii")
+
+def decode_vectors(data: str, dimension: int) -> np.ndarray:
+    """Decode a matrix encoded by encode_vectors."""
+    vectors = np.frombuffer(base64.b64decode(data), dtype=np.float32)
+    if vectors.size % dimension:
+        raise ValueError(f"Vector data is not a multiple of the dimension {dimension}")
+    return vectors.reshape(-1, dimension)
+
+def create_app(vector_store: VectorStore, directory: str) -> FastAPI:
+    """
+    Build the HTTP API of one shard.
+
+    Endpoints are plain functions, so FastAPI runs them in its thread pool
+    and searches proceed concurrently under the store's read lock.
+
+    Args:
+        vector_store: Store of the shard
+        directory: Directory the store is saved to
+
+    Returns:
+        FastAPI application
+    """
+    app = FastAPI(title="Vector store shard")
+
+    @app.post("/search")
+    def search(request: ShardSearchRequest):
+        if request.mode not in SHARD_MODES:
+            raise HTTPException(status_code=400, detail=f"Unknown search mode '{request.mode}', expected one of {SHARD_MODES}")
+        try:
+            if request.mode == "lexical":
+                results = [vector_store.lexical_search(query, k=request.k, filters=request.filters)
+                           for query in request.queries or []]
+            else:
+                vectors = decode_vectors(request.vectors or "", vector_store.dimension)
+                if request.mode == "hybrid":
+                    results = vector_store.hybrid_search_batch(vectors, request.queries or [], k=request.k,
+                                                               nprobe=request.nprobe, ef_search=request.ef_search,
+                                                               filters=request.filters)
+                else:
+                    results = vector_store.search_batch(vectors, k=request.k, nprobe=request.nprobe,
+                                                        ef_search=request.ef_search, filters=request.filters)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"results": [[[doc, score] for doc, score in hits] for hits in results]}
+
+    @app.post("/documents")
+    def add_documents(request: ShardDocumentsRequest):
+        try:
+            embeddings = decode_vectors(request.embeddings, vector_store.dimension)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if len(embeddings) != len(request.documents):
+            raise HTTPException(status_code=400, detail="Expected one embedding per document")
+        documents = [{**doc, "embedding": embedding} for doc, embedding in zip(request.documents, embeddings)]
+        return {"added": vector_store.add_documents(documents)}
+
+    @app.post("/save")
+    def save():
+        vector_store.save(directory)
+        return {"documents": len(vector_store.documents)}
+
+    @app.get("/health")
+    def health():
+        return {
+            "documents": len(vector_store.documents) - len(vector_store.deleted),
+            "vectors": int(vector_store.index.ntotal),
+            "dimension": vector_store.dimension,
+        }
+
+    return app
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="Vector store directory of this shard")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8101, help="Port to listen on")
+    parser.add_argument("--dimension", type=int, default=1024, help="Embedding dimension")
+    args = parser.parse_args()
+
+    import uvicorn
+    directory = os.path.abspath(args.directory)
+    os.makedirs(directory, exist_ok=True)
+    vector_store = VectorStore(dimension=args.dimension)
+    if os.listdir(directory):
+        vector_store.load(directory)
+    logger.info(f"Serving shard {directory} with {len(vector_store.documents)} documents on {args.host}:{args.port}")
+    uvicorn.run(create_app(vector_store, directory), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
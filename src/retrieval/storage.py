@@ -0,0 +1,293 @@
+from typing import List, Dict, Tuple, Optional
+import faiss
+import numpy as np
+import logging
+import pickle
+import shutil
+import json
+import os
+from .document_store import DocumentStore
+from .lexical_index import BM25Index
+from .vector_archive import VectorArchive
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+SEGMENTS_DIR = "segments"
+LEGACY_INDEX_FILE = "index.faiss"
+LEGACY_DOCUMENTS_FILE = "documents.pkl"
+
+class SegmentStorage:
+    """
+    Append-only on-disk layout for a vector store.
+
+    A directory holds one compacted base snapshot (FAISS index + documents)
+    and a log of segments appended since. Each segment stores only the
+    vectors and metadata added by one save, so the cost of saving is
+    proportional to the new data. manifest.json lists the live base and
+    segments and is replaced atomically after every change.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Initialize the storage.
+
+        Args:
+            directory: Directory holding the vector store files
+        """
+        self.directory = os.path.abspath(directory)
+        self.segments_dir = os.path.join(self.directory, SEGMENTS_DIR)
+        self.manifest_path = os.path.join(self.directory, MANIFEST_FILE)
+
+    def has_manifest(self) -> bool:
+        """Check whether the directory uses the segment layout."""
+        return os.path.exists(self.manifest_path)
+
+    def has_legacy(self) -> bool:
+        """Check whether the directory holds a single index.faiss/documents.pkl pair."""
+        return (os.path.exists(os.path.join(self.directory, LEGACY_INDEX_FILE))
+                and os.path.exists(os.path.join(self.directory, LEGACY_DOCUMENTS_FILE)))
+
+    def read_manifest(self) -> Dict:
+        """
+        Read the manifest, synthesizing one for a legacy directory.
+
+        Returns:
+            Manifest dictionary
+        """
+        if self.has_manifest():
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        manifest = self.empty_manifest()
+        if self.has_legacy():
+            manifest["base"] = {
+                "index": LEGACY_INDEX_FILE,
+                "documents": LEGACY_DOCUMENTS_FILE,
+                "count": None
+            }
+        return manifest
+
+    @staticmethod
+    def empty_manifest() -> Dict:
+        """Return a manifest with no base and no segments."""
+        return {"version": 1, "generation": 0, "base": None, "segments": [], "sources": {}}
+
+    def write_manifest(self, manifest: Dict) -> None:
+        """
+        Atomically replace the manifest.
+
+        Args:
+            manifest: Manifest dictionary
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def write_segment(self, manifest: Dict, vectors: np.ndarray, documents: DocumentStore,
+                      start: int) -> Dict:
+        """
+        Write a new segment and return its manifest entry.
+
+        Args:
+            manifest: Current manifest (its generation counter is advanced)
+            vectors: Vectors of the new documents
+            documents: Document store; documents from start onwards are written
+            start: Position of the first new document in the store
+
+        Returns:
+            Segment manifest entry
+        """
+        os.makedirs(self.segments_dir, exist_ok=True)
+        manifest["generation"] += 1
+        name = f"seg-{manifest['generation']:06d}"
+        np.save(os.path.join(self.segments_dir, name + ".npy"), np.asarray(vectors, dtype=np.float32))
+        documents.write(os.path.join(self.segments_dir, name), start=start, stop=start + len(vectors))
+        return {"name": name, "start": start, "count": len(vectors)}
+
+    def segment_vectors_path(self, entry: Dict) -> str:
+        """Return the path of the vectors of a segment."""
+        return os.path.join(self.segments_dir, entry["name"] + ".npy")
+
+    def read_segment(self, entry: Dict, use_mmap: bool = False) -> Tuple[np.ndarray, DocumentStore]:
+        """
+        Read a segment.
+
+        Args:
+            entry: Segment manifest entry
+            use_mmap: Map the vectors instead of reading them into memory
+
+        Returns:
+            Tuple of (vectors, documents)
+        """
+        vectors = np.load(self.segment_vectors_path(entry), mmap_mode="r" if use_mmap else None)
+        documents_path = os.path.join(self.segments_dir, entry["name"])
+        if os.path.isdir(documents_path):
+            documents = DocumentStore.open(documents_path, use_mmap=False)
+        else:
+            # Pickled list of dicts written by older versions
+            with open(documents_path + ".pkl", "rb") as f:
+                documents = DocumentStore(pickle.load(f))
+        return vectors, documents
+
+    def write_deletes(self, manifest: Dict, ids: List[int]) -> Dict:
+        """
+        Write a segment recording deleted document ids and return its manifest entry.
+
+        Args:
+            manifest: Current manifest (its generation counter is advanced)
+            ids: Deleted document ids
+
+        Returns:
+            Segment manifest entry
+        """
+        os.makedirs(self.segments_dir, exist_ok=True)
+        manifest["generation"] += 1
+        name = f"del-{manifest['generation']:06d}"
+        np.save(os.path.join(self.segments_dir, name + ".npy"), np.asarray(ids, dtype=np.int64))
+        return {"name": name, "kind": "delete", "count": len(ids)}
+
+    def read_deletes(self, entry: Dict) -> np.ndarray:
+        """Read the ids recorded by a delete segment."""
+        return np.load(os.path.join(self.segments_dir, entry["name"] + ".npy"))
+
+    def write_base(self, manifest: Dict, index_data: np.ndarray, documents: DocumentStore,
+                   deleted: Optional[np.ndarray] = None, lexical: Optional[BM25Index] = None,
+                   vectors: Optional[VectorArchive] = None) -> Dict:
+        """
+        Write a new base snapshot and return its manifest entry.
+
+        Args:
+            manifest: Current manifest (its generation counter is advanced)
+            index_data: Serialized FAISS index (faiss.serialize_index)
+            documents: Metadata of every document in the snapshot
+            deleted: Ids of deleted documents (their metadata rows are kept)
+            lexical: BM25 index, of which the first len(documents) rows are written
+            vectors: Full-precision vectors of a quantized index, of which the first len(documents) are written
+
+        Returns:
+            Base manifest entry
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        manifest["generation"] += 1
+        generation = manifest["generation"]
+        index_file = f"index-{generation:06d}.faiss"
+        documents_dir = f"documents-{generation:06d}"
+        deleted_file = f"deleted-{generation:06d}.npy"
+        index_data.tofile(os.path.join(self.directory, index_file))
+        documents.write(os.path.join(self.directory, documents_dir))
+        np.save(os.path.join(self.directory, deleted_file),
+                np.asarray(deleted if deleted is not None else [], dtype=np.int64))
+        entry = {"index": index_file, "documents": documents_dir, "deleted": deleted_file, "count": len(documents)}
+        if lexical is not None:
+            entry["lexical"] = f"lexical-{generation:06d}"
+            lexical.write(os.path.join(self.directory, entry["lexical"]), count=len(documents))
+        if vectors is not None:
+            entry["vectors"] = f"vectors-{generation:06d}.npy"
+            vectors.write(os.path.join(self.directory, entry["vectors"]), count=len(documents))
+        return entry
+
+    def index_path(self, entry: Dict) -> str:
+        """Return the path of the FAISS index of a base snapshot."""
+        return os.path.join(self.directory, entry["index"])
+
+    def read_base(self, entry: Optional[Dict], use_mmap: bool = False,
+                  map_index: bool = True) -> Tuple[Optional[faiss.Index], DocumentStore, np.ndarray]:
+        """
+        Read a base snapshot.
+
+        With use_mmap the index is opened with faiss.IO_FLAG_MMAP and the
+        columnar metadata is mapped, so nothing is copied onto the heap and
+        processes opening the same snapshot share the page cache. A mapped
+        index is read-only.
+
+        Args:
+            entry: Base manifest entry, or None
+            use_mmap: Memory-map the snapshot instead of reading it
+            map_index: With use_mmap, also map the index (otherwise only the metadata)
+
+        Returns:
+            Tuple of (index, documents, deleted ids); (None, empty store, no ids) if there is no base
+        """
+        deleted = np.empty(0, dtype=np.int64)
+        if not entry:
+            return None, DocumentStore(), deleted
+        index = None
+        if use_mmap and map_index:
+            # IO_FLAG_MMAP alone: combined with IO_FLAG_MMAP_IFC or IO_FLAG_READ_ONLY,
+            # FAISS refuses to map IVF inverted lists
+            try:
+                index = faiss.read_index(self.index_path(entry), faiss.IO_FLAG_MMAP)
+            except RuntimeError as e:
+                logger.warning(f"Could not memory-map {self.index_path(entry)}, reading it instead: {str(e)}")
+        if index is None:
+            index = faiss.read_index(self.index_path(entry))
+        documents_path = os.path.join(self.directory, entry["documents"])
+        if os.path.isdir(documents_path):
+            documents = DocumentStore.open(documents_path, use_mmap=use_mmap)
+        else:
+            # Pickled list of dicts written by older versions
+            with open(documents_path, "rb") as f:
+                documents = DocumentStore(pickle.load(f))
+        if entry.get("deleted"):
+            deleted = np.load(os.path.join(self.directory, entry["deleted"]))
+        return index, documents, deleted
+
+    def read_lexical(self, entry: Optional[Dict], use_mmap: bool = False) -> Optional[BM25Index]:
+        """
+        Read the BM25 index of a base snapshot.
+
+        Args:
+            entry: Base manifest entry, or None
+            use_mmap: Memory-map the posting arrays
+
+        Returns:
+            The index, or None if the snapshot was written without one
+        """
+        if not entry or not entry.get("lexical"):
+            return None
+        return BM25Index.open(os.path.join(self.directory, entry["lexical"]), use_mmap=use_mmap)
+
+    def vectors_path(self, entry: Optional[Dict]) -> Optional[str]:
+        """Return the path of the full-precision vectors of a base snapshot, or None if it has none."""
+        if not entry or not entry.get("vectors"):
+            return None
+        return os.path.join(self.directory, entry["vectors"])
+
+    def remove_base(self, entry: Optional[Dict]) -> None:
+        """Delete the files of a base snapshot that is no longer referenced."""
+        if not entry:
+            return
+        self._remove(self.index_path(entry))
+        if entry.get("deleted"):
+            self._remove(os.path.join(self.directory, entry["deleted"]))
+        if entry.get("vectors"):
+            self._remove(os.path.join(self.directory, entry["vectors"]))
+        if entry.get("lexical"):
+            shutil.rmtree(os.path.join(self.directory, entry["lexical"]), ignore_errors=True)
+        documents_path = os.path.join(self.directory, entry["documents"])
+        if os.path.isdir(documents_path):
+            shutil.rmtree(documents_path, ignore_errors=True)
+        else:
+            self._remove(documents_path)
+
+    def remove_segments(self, entries: List[Dict]) -> None:
+        """Delete the files of segments that are no longer referenced."""
+        for entry in entries:
+            path = os.path.join(self.segments_dir, entry["name"])
+            shutil.rmtree(path, ignore_errors=True)
+            for ext in (".npy", ".pkl"):
+                self._remove(path + ext)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Could not remove {path}: {str(e)}")
@@ -0,0 +1,121 @@
+from typing import List, Dict, Tuple, Optional
+import numpy as np
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class VectorArchive:
+    """
+    Full-precision copies of the vectors of a quantized index.
+
+    Quantized indexes (scalar quantizer, PQ) rank candidates with lossy
+    codes; the archive keeps the original float32 vectors so the top
+    candidates can be re-scored exactly. Vectors are a sequence of pieces,
+    each covering consecutive document rows: pieces added since the last
+    save live in memory and are swapped for memory maps of the saved files,
+    so only the rows actually re-ranked are paged in.
+    """
+
+    def __init__(self, dimension: int):
+        """
+        Initialize an empty archive.
+
+        Args:
+            dimension: Dimension of the vectors
+        """
+        self.dimension = dimension
+        self._pieces: List[Tuple[int, np.ndarray]] = []  # (first row, vectors), in row order
+
+    def __len__(self) -> int:
+        pieces = self._pieces
+        return pieces[-1][0] + len(pieces[-1][1]) if pieces else 0
+
+    def append(self, vectors: np.ndarray, start: int) -> None:
+        """
+        Add vectors whose document rows start at the given position.
+
+        Args:
+            vectors: (n, dimension) float32 matrix
+            start: Row of the first vector; must equal the current length
+        """
+        if start != len(self):
+            raise ValueError(f"Archive has {len(self)} vectors, cannot append at row {start}")
+        self._pieces.append((start, np.asarray(vectors, dtype=np.float32)))
+
+    def map(self, path: str, start: int) -> None:
+        """
+        Replace the in-memory pieces covered by a saved vector file with a memory map of it.
+
+        Args:
+            path: .npy file holding the vectors of rows start onwards
+            start: Row of the first vector in the file
+        """
+        mapped = np.load(path, mmap_mode="r")
+        end = start + len(mapped)
+        pieces = []
+        for first, vectors in self._pieces:
+            if first >= start and first + len(vectors) <= end:
+                continue
+            pieces.append((first, vectors))
+        pieces.append((start, mapped))
+        pieces.sort(key=lambda piece: piece[0])
+        # Swap the list in one assignment so concurrent readers see either version
+        self._pieces = pieces
+
+    def get(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Gather the vectors of several rows.
+
+        Args:
+            ids: Row ids
+
+        Returns:
+            (len(ids), dimension) float32 matrix
+        """
+        pieces = self._pieces
+        ids = np.asarray(ids, dtype=np.int64)
+        starts = np.array([first for first, _ in pieces], dtype=np.int64)
+        owners = np.searchsorted(starts, ids, side="right") - 1
+        result = np.empty((len(ids), self.dimension), dtype=np.float32)
+        for owner in np.unique(owners).tolist():
+            first, vectors = pieces[owner]
+            rows = np.flatnonzero(owners == owner)
+            local = ids[rows] - first
+            # Read in row order, so a mapped file is paged in sequentially
+            order = np.argsort(local)
+            result[rows[order]] = vectors[local[order]]
+        return result
+
+    def write(self, path: str, count: Optional[int] = None) -> None:
+        """
+        Write the first count vectors to a .npy file, one piece at a time.
+
+        Args:
+            path: Destination file
+            count: Number of vectors to write (default: all)
+        """
+        count = len(self) if count is None else min(count, len(self))
+        out = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(count, self.dimension))
+        for first, vectors in list(self._pieces):
+            if first >= count:
+                break
+            stop = min(first + len(vectors), count)
+            out[first:stop] = vectors[:stop - first]
+        out.flush()
+        del out
+
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Report the size of the archive.
+
+        Returns:
+            Dictionary with the vector count and bytes held in memory and mapped
+        """
+        pieces = list(self._pieces)
+        mapped = sum(vectors.nbytes for _, vectors in pieces if isinstance(vectors, np.memmap))
+        return {
+            "vectors": pieces[-1][0] + len(pieces[-1][1]) if pieces else 0,
+            "memory_bytes": sum(vectors.nbytes for _, vectors in pieces) - mapped,
+            "mapped_bytes": mapped,
+        }
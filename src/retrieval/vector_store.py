@@ -1,128 +1,934 @@
-from typing import List, Dict, Union, Tuple
+from typing import List, Dict, Union, Tuple, Optional
+from collections import deque
 import faiss
 import numpy as np
 import logging
-import pickle
+import threading
 import os
+from .index_factory import (INDEX_TYPES, QUANTIZED_TYPES, build_index, training_size, index_kind,
+                            search_parameters, has_id_map, extract_vectors, iter_vectors, normalize_vectors,
+                            index_bytes)
+from .storage import SegmentStorage
+from .document_store import DocumentStore
+from .result_cache import LRUCache, ResultCache
+from .lexical_index import BM25Index, reciprocal_rank_fusion
+from .vector_archive import VectorArchive
+from .rwlock import ReadWriteLock
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Metadata fields accepted by search filters
+FILTER_FIELDS = ("source", "type", "page")
+# Largest deviation from unit norm accepted by check_vectors, for index types storing lossy codes
+NORM_TOLERANCE = {"sq8": 0.05, "ivf_pq": 0.25}
+
 class VectorStore:
-    """FAISS-based vector store for document retrieval."""
+    """
+    FAISS-based vector store for document retrieval.
+    
+    Safe to share between ingestion and query threads. Writers (add,
+    delete, save, load) are serialized by one lock, under which they do
+    their slow work: training, serializing, writing segments. The FAISS
+    index itself is guarded by a readers/writer lock that writers take
+    only for the mutation, so searches run concurrently with each other
+    and wait at most for one add_with_ids/remove_ids call. Metadata rows
+    and BM25 postings are published before their vectors enter the index,
+    and the deleted-id set is replaced rather than mutated, so a search
+    never sees an id whose metadata is missing.
+    """
     
-    def __init__(self, dimension: int = 1024):
+    def __init__(self, dimension: int = 1024, index_type: Optional[str] = None,
+                 nlist: Optional[int] = None, pq_m: Optional[int] = None, hnsw_m: Optional[int] = None,
+                 nprobe: Optional[int] = None, ef_search: Optional[int] = None, rerank: Optional[int] = None):
         """
         Initialize the vector store.
         
         Args:
             dimension: Dimension of the embedding vectors
+            index_type: One of "flat", "ivf_flat", "ivf_pq", "hnsw", "sq8" or "sq_fp16" (default: VECTOR_INDEX_TYPE or "flat")
+            nlist: Number of inverted lists for IVF indexes (default: VECTOR_NLIST or 1024)
+            pq_m: Number of PQ sub-quantizers for "ivf_pq" (default: VECTOR_PQ_M or 64)
+            hnsw_m: Graph degree for "hnsw" (default: VECTOR_HNSW_M or 32)
+            nprobe: Default inverted lists visited per query (default: VECTOR_NPROBE or 16)
+            ef_search: Default HNSW candidate list size per query (default: VECTOR_EF_SEARCH or 64)
+            rerank: For quantized index types, fetch rerank * k candidates and re-score them
+                with full-precision vectors kept beside the index (default: VECTOR_RERANK or 0, disabled)
         """
         self.dimension = dimension
-        self.index = faiss.IndexFlatIP(dimension)  # Inner product for cosine similarity
-        self.documents = []  # Store document metadata and text
-        logger.info(f"Initialized vector store with dimension {dimension}")
+        self.index_type = (index_type or os.getenv("VECTOR_INDEX_TYPE", "flat")).lower()
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{self.index_type}', expected one of {INDEX_TYPES}")
+        self.nlist = nlist or int(os.getenv("VECTOR_NLIST", 1024))
+        self.pq_m = pq_m or int(os.getenv("VECTOR_PQ_M", 64))
+        self.hnsw_m = hnsw_m or int(os.getenv("VECTOR_HNSW_M", 32))
+        self.nprobe = nprobe or int(os.getenv("VECTOR_NPROBE", 16))
+        self.ef_search = ef_search or int(os.getenv("VECTOR_EF_SEARCH", 64))
+        self.rerank = rerank if rerank is not None else int(os.getenv("VECTOR_RERANK", 0))
+        # vectors are buffered in a flat index until there are enough to train on
+        self.train_size = training_size(self.index_type, self.nlist)
+        self.index = self._empty_index()
+        self.documents = DocumentStore()  # Store document metadata and text
+        self.lexical_index = BM25Index()  # BM25 postings over the same rows, for hybrid search
+        # float32 copies of the vectors of a quantized index, for exact re-ranking
+        self._archive = self._new_archive()
+        # FAISS ids are document row numbers; deleted rows keep their metadata
+        self.deleted = set()
+        # Documents rejected because their embedding was zero or NaN (failed embedding calls)
+        self.quarantined: deque = deque(maxlen=1000)
+        self.source_hashes: Dict[str, str] = {}  # content hash of each ingested source
+        self._tombstones = set()  # deleted ids the index could not remove (HNSW)
+        self._tombstone_selector = None
+        # bumped whenever the indexed content changes; keys the result cache
+        self.version = 0
+        self.result_cache = ResultCache(max_size=int(os.getenv("RESULT_CACHE_SIZE", 256)))
+        # Filtered HNSW searches over at most this many documents are done exactly
+        self.filter_exact_limit = int(os.getenv("VECTOR_FILTER_EXACT_LIMIT", 4096))
+        self._filter_cache = LRUCache(max_size=64)  # (filter key, version) -> allowed ids
+        self._id_positions = None  # (index, ntotal, sorted ids, positions) of the id-mapped index
+        
+        # Segment persistence state, bound on the first save/load
+        self.compact_segments = int(os.getenv("VECTOR_COMPACT_SEGMENTS", 8))
+        self._storage: Optional[SegmentStorage] = None
+        self._manifest: Optional[Dict] = None
+        self._persisted = 0  # number of documents already on disk
+        self._pending_vectors: List[np.ndarray] = []  # vectors not yet written to a segment
+        self._pending_deletes: List[int] = []  # deletions not yet written to a segment
+        self._compacting = False
+        self._compaction_cancelled = False  # set by a snapshot that supersedes the running compaction
+        self._compaction: Optional[threading.Thread] = None  # background compaction, joined by close
+        self._index_mapped = False  # index is a read-only memory map of the base snapshot
+        self._lock = threading.RLock()  # serializes writers
+        self._index_lock = ReadWriteLock()  # shared by FAISS searches, exclusive for index mutations
+        logger.info(f"Initialized vector store with dimension {dimension} and index type {self.index_type}")
+    
+    def _empty_index(self) -> faiss.Index:
+        """Create the index a new store starts with."""
+        if self.train_size == 0:
+            return self._new_index()
+        # Inner product for cosine similarity
+        return build_index("flat", self.dimension)
+    
+    def _new_index(self) -> faiss.Index:
+        """Create an empty index of the configured type."""
+        return build_index(self.index_type, self.dimension, nlist=self.nlist,
+                           pq_m=self.pq_m, hnsw_m=self.hnsw_m)
+    
+    def _new_archive(self) -> Optional[VectorArchive]:
+        """Create the full-precision vector archive if re-ranking is enabled."""
+        if self.rerank > 0 and self.index_type in QUANTIZED_TYPES:
+            return VectorArchive(self.dimension)
+        return None
+    
+    def _ensure_writable(self) -> None:
+        """
+        Replace a memory-mapped index with a heap copy before it is modified.
+        Must be called with the lock held.
+        """
+        if not self._index_mapped:
+            return
+        # Searches still running on the mapped index finish on it
+        self.index = faiss.read_index(self._storage.index_path(self._manifest["base"]))
+        self._index_mapped = False
+        logger.info("Copied memory-mapped index into memory for writing")
+    
+    def _maybe_train(self) -> None:
+        """
+        Move the buffered flat index into the configured index type once
+        enough vectors are available to train it. Must be called with the
+        lock held; searches keep using the flat index until the swap.
+        """
+        if self.index_type == "flat" or index_kind(self.index) != "flat":
+            return
+        if self.index.ntotal == 0 or self.index.ntotal < self.train_size:
+            return
+        
+        with self._index_lock.read():
+            vectors, ids = extract_vectors(self.index)
+        index = self._new_index()
+        self._index_mapped = False
+        if not index.is_trained:
+            logger.info(f"Training {self.index_type} index on {len(vectors)} vectors")
+            index.train(vectors)
+        index.add_with_ids(vectors, ids)
+        self.index = index
+        logger.info(f"Migrated {len(vectors)} vectors from flat index to {self.index_type} index")
+    
+    def _ensure_id_map(self) -> None:
+        """
+        Wrap an index written by an older version, whose ids are implicit
+        positions, so that it stores explicit ids and supports deletion.
+        """
+        if has_id_map(self.index):
+            return
+        kind = index_kind(self.index)
+        vectors, ids = extract_vectors(self.index)
+        index = build_index(kind, self.dimension, hnsw_m=self.hnsw_m)
+        index.add_with_ids(vectors, ids)
+        self.index = index
+        self._index_mapped = False
+        logger.info(f"Migrated {len(ids)} vectors to an id-mapped {kind} index")
+    
+    def _add_vectors(self, vectors: np.ndarray, start: int) -> None:
+        """
+        Add vectors whose document rows start at the given position.
+        Must be called with the index lock held for writing.
+        """
+        self.index.add_with_ids(vectors, np.arange(start, start + len(vectors), dtype=np.int64))
+    
+    def _remove_from_index(self, ids: List[int]) -> None:
+        """
+        Remove ids from the index, or tombstone them if the index type does
+        not support removal. Must be called with the lock held and the index
+        lock held for writing.
+        """
+        try:
+            self.index.remove_ids(np.asarray(ids, dtype=np.int64))
+        except RuntimeError:
+            self._tombstones.update(ids)
+            self._rebuild_tombstone_selector()
+    
+    def _rebuild_tombstone_selector(self) -> None:
+        """Build the selector that excludes tombstoned ids from searches."""
+        if not self._tombstones:
+            self._tombstone_selector = None
+            return
+        batch = faiss.IDSelectorBatch(np.fromiter(self._tombstones, dtype=np.int64))
+        # keep the inner selector referenced alongside the one passed to FAISS
+        self._tombstone_selector = (faiss.IDSelectorNot(batch), batch)
+    
+    def delete_ids(self, ids: List[int]) -> int:
+        """
+        Delete documents by id without rebuilding the index.
+        
+        Args:
+            ids: Document ids (row numbers returned by source_ids)
+            
+        Returns:
+            Number of documents deleted
+        """
+        try:
+            with self._lock:
+                ids = [int(i) for i in ids if 0 <= int(i) < len(self.documents) and int(i) not in self.deleted]
+                if not ids:
+                    return 0
+                self._ensure_writable()
+                self.deleted = self.deleted | set(ids)
+                with self._index_lock.write():
+                    self._remove_from_index(ids)
+                if self._storage is not None:
+                    self._pending_deletes.extend(ids)
+                self.version += 1
+            logger.info(f"Deleted {len(ids)} documents from vector store")
+            return len(ids)
+        except Exception as e:
+            logger.error(f"Error deleting documents from vector store: {str(e)}")
+            return 0
+    
+    def source_ids(self, source: str) -> List[int]:
+        """
+        Get the ids of the live documents of a source.
+        
+        Args:
+            source: Source identifier (file path or URL)
+            
+        Returns:
+            List of document ids
+        """
+        with self._lock:
+            return [int(i) for i in self.documents.rows_with("source", source) if int(i) not in self.deleted]
+    
+    def delete_source(self, source: str) -> int:
+        """
+        Delete every document of a source and forget its content hash.
+        
+        Args:
+            source: Source identifier (file path or URL)
+            
+        Returns:
+            Number of documents deleted
+        """
+        with self._lock:
+            deleted = self.delete_ids(self.source_ids(source))
+            self.source_hashes.pop(source, None)
+        return deleted
     
-    def add_documents(self, documents: List[Dict[str, Union[str, int, np.ndarray]]]) -> None:
+    def add_documents(self, documents: List[Dict[str, Union[str, int, np.ndarray]]]) -> int:
         """
         Add documents to the vector store.
         
+        Embeddings are L2-normalized so that inner product search ranks by
+        cosine similarity. Documents whose embedding is all zeros or contains
+        NaN (the fallback of a failed embedding call) are not indexed; they
+        are logged and recorded in quarantined instead.
+        
         Args:
             documents: List of document dictionaries with embeddings
+            
+        Returns:
+            Number of documents added
         """
         try:
             if not documents:
                 logger.warning("No documents provided to add to vector store")
-                return
+                return 0
                 
             # Validate embeddings
             for doc in documents:
                 if "embedding" not in doc:
                     logger.error("Document missing embedding")
-                    return
+                    return 0
                 if not isinstance(doc["embedding"], np.ndarray):
                     logger.error("Document embedding is not a numpy array")
-                    return
+                    return 0
                 if doc["embedding"].shape[0] != self.dimension:
                     logger.error(f"Document embedding dimension {doc['embedding'].shape[0]} does not match vector store dimension {self.dimension}")
-                    return
+                    return 0
             
-            # Extract embeddings
-            embeddings = np.array([doc["embedding"] for doc in documents])
+            # Extract and normalize embeddings in one float32 matrix
+            embeddings, valid = normalize_vectors(np.array([doc["embedding"] for doc in documents], dtype=np.float32))
+            if not valid.all():
+                self._quarantine([doc for doc, ok in zip(documents, valid) if not ok])
+                documents = [doc for doc, ok in zip(documents, valid) if ok]
+                embeddings = embeddings[valid]
+                if not documents:
+                    return 0
             
-            # Add to FAISS index
-            self.index.add(embeddings)
-            
-            # Store documents
-            self.documents.extend(documents)
+            with self._lock:
+                self._ensure_writable()
+                start = len(self.documents)
+                
+                # Store metadata first, so every id a search returns has its row;
+                # embeddings are kept only until the next save
+                self.documents.extend(documents)
+                self.lexical_index.add(str(doc.get("text", "")) for doc in documents)
+                if self._archive is not None:
+                    # Archived before indexing, so every id a search returns can be re-ranked
+                    self._archive.append(embeddings, start)
+                
+                # Add to FAISS index, using the document rows as ids
+                with self._index_lock.write():
+                    self._add_vectors(embeddings, start)
+                if self._storage is not None:
+                    self._pending_vectors.append(embeddings)
+                self.version += 1
+                
+                # Train the approximate index once enough vectors are buffered
+                self._maybe_train()
             
             logger.info(f"Added {len(documents)} documents to vector store. Total documents: {len(self.documents)}")
+            return len(documents)
         except Exception as e:
             logger.error(f"Error adding documents to vector store: {str(e)}")
+            return 0
+    
+    def _quarantine(self, documents: List[Dict]) -> None:
+        """Record documents whose embedding cannot be indexed."""
+        for doc in documents:
+            embedding = np.asarray(doc["embedding"])
+            self.quarantined.append({
+                "source": doc.get("source"),
+                "page": doc.get("page"),
+                "chunk_id": doc.get("chunk_id"),
+                "reason": "nan" if not np.isfinite(embedding).all() else "zero",
+            })
+        logger.warning(f"Rejected {len(documents)} documents with zero or NaN embeddings "
+                       f"from {sorted({str(doc.get('source')) for doc in documents})}")
+    
+    def _prepare_queries(self, query_embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Copy and normalize query vectors, flagging those that cannot be normalized."""
+        queries, valid = normalize_vectors(np.array(query_embeddings, dtype=np.float32, ndmin=2))
+        if not valid.all():
+            logger.warning(f"Ignoring {int((~valid).sum())} zero or NaN query vectors")
+        return queries, valid
     
-    def search(self, query_embedding: np.ndarray, k: int = 5) -> List[Tuple[Dict, float]]:
+    def search(self, query_embedding: np.ndarray, k: int = 5, nprobe: Optional[int] = None,
+               ef_search: Optional[int] = None, filters: Optional[Dict] = None) -> List[Tuple[Dict, float]]:
         """
         Search for similar documents.
         
         Args:
             query_embedding: Query vector
             k: Number of results to return
+            nprobe: Inverted lists to visit for IVF indexes (overrides the store default)
+            ef_search: Candidate list size for HNSW indexes (overrides the store default)
+            filters: Metadata restrictions, see filter_ids
             
         Returns:
             List of (document, score) tuples
         """
+        results = self.search_batch(query_embedding.reshape(1, -1), k=k, nprobe=nprobe, ef_search=ef_search,
+                                    filters=filters)
+        return results[0] if results else []
+    
+    def search_batch(self, query_embeddings: np.ndarray, k: int = 5, nprobe: Optional[int] = None,
+                     ef_search: Optional[int] = None, filters: Optional[Dict] = None) -> List[List[Tuple[Dict, float]]]:
+        """
+        Search for similar documents for several queries with a single FAISS call.
+        
+        Args:
+            query_embeddings: Query vectors stacked into an (n, dimension) matrix
+            k: Number of results to return per query
+            nprobe: Inverted lists to visit for IVF indexes (overrides the store default)
+            ef_search: Candidate list size for HNSW indexes (overrides the store default)
+            filters: Metadata restrictions, see filter_ids
+            
+        Returns:
+            One list of (document, score) tuples per query
+        """
         try:
+            queries, valid = self._prepare_queries(query_embeddings)
+            
             # Check if index is empty
             if self.index.ntotal == 0:
                 logger.warning("Vector store index is empty. No documents have been added.")
-                return []
+                return [[] for _ in range(len(queries))]
             
-            # Search in FAISS
-            scores, indices = self.index.search(query_embedding.reshape(1, -1), k)
+            # Serve repeated queries from the result cache
+            nprobe, ef_search = nprobe or self.nprobe, ef_search or self.ef_search
+            version = self.version
+            filter_key = _filter_key(filters)
+            keys = [self.result_cache.key(query, version, k, nprobe, ef_search, filter_key) if ok else None
+                    for query, ok in zip(queries, valid)]
+            results = [self.result_cache.get_for_version(key, version) if ok else [] for key, ok in zip(keys, valid)]
+            missing = [i for i, cached in enumerate(results) if cached is None]
+            if not missing:
+                return results
             
             # Get documents and scores
-            results = []
-            for i, (score, idx) in enumerate(zip(scores[0], indices[0])):
-                if idx < len(self.documents):
-                    results.append((self.documents[idx], float(score)))
+            documents = self.documents
+            allowed = self.filter_ids(filters)
+            for i, hits in zip(missing, self._dense_search(queries[missing], k, nprobe, ef_search, allowed)):
+                results[i] = [(documents[idx], score) for idx, score in hits]
+                self.result_cache.put(keys[i], results[i])
             
             return results
         except Exception as e:
             logger.error(f"Error searching vector store: {str(e)}")
+            return [[] for _ in range(len(np.atleast_2d(query_embeddings)))]
+    
+    def filter_ids(self, filters: Optional[Dict]) -> Optional[np.ndarray]:
+        """
+        Resolve metadata filters to the ids of the live documents matching all of them.
+        
+        Id sets per source and type are kept up to date by DocumentStore, so
+        resolving a filter is a few set intersections; results are cached
+        until the store changes.
+        
+        Args:
+            filters: Dictionary with any of "source" (value or list of values),
+                "type" (value or list of values) and "page" (page number or
+                inclusive [min, max] range, either end may be None)
+            
+        Returns:
+            Sorted array of ids, or None when no filter applies
+        """
+        key = _filter_key(filters)
+        if key is None:
+            return None
+        version = self.version
+        allowed = self._filter_cache.get((key, version))
+        if allowed is not None:
+            return allowed
+        
+        documents = self.documents
+        for field, value in key:
+            if field == "page":
+                rows = documents.rows_in_range("page", *value)
+            else:
+                rows = np.unique(np.concatenate([documents.rows_with(field, v) for v in value]
+                                                + [np.empty(0, dtype=np.int64)]))
+            allowed = rows if allowed is None else np.intersect1d(allowed, rows, assume_unique=True)
+        deleted = self.deleted
+        if deleted:
+            allowed = np.setdiff1d(allowed, np.fromiter(deleted, dtype=np.int64), assume_unique=True)
+        self._filter_cache.put((key, version), allowed)
+        return allowed
+    
+    def _dense_search(self, queries: np.ndarray, k: int, nprobe: int, ef_search: int,
+                      allowed: Optional[np.ndarray] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Search FAISS and return (id, score) pairs of live documents per query.
+        
+        With allowed ids the restriction is applied inside the index by an
+        IDSelector. Approximate indexes then find fewer matches per list or
+        graph hop, so IVF visits proportionally more lists and HNSW widens
+        its candidate list; small HNSW subsets are scored exactly instead,
+        since graph traversal loses recall when most nodes are filtered out.
+        """
+        if allowed is not None and not len(allowed):
+            return [[] for _ in queries]
+        with self._index_lock.read():
+            index, deleted, tombstones = self.index, self.deleted, self._tombstone_selector
+            kind = index_kind(index)
+            selector = None
+            if allowed is not None:
+                selectivity = len(allowed) / max(index.ntotal, 1)
+                if kind == "hnsw" and len(allowed) <= self.filter_exact_limit:
+                    return self._exact_search(index, queries, k, allowed)
+                if kind == "hnsw":
+                    ef_search = min(int(ef_search / selectivity), max(ef_search, self.filter_exact_limit))
+                elif kind in ("ivf_flat", "ivf_pq"):
+                    # A loaded index keeps the nlist it was trained with
+                    nprobe = min(int(np.ceil(nprobe / selectivity)), faiss.extract_index_ivf(index).nlist)
+                # The selector supersedes the tombstones: deleted ids are not in allowed
+                selector = faiss.IDSelectorBatch(allowed)
+            elif tombstones is not None:
+                # Skip documents the index could not remove
+                selector = tombstones[0]
+            params = search_parameters(index, nprobe, ef_search, selector)
+            archive = self._archive if kind in QUANTIZED_TYPES else None
+            fetch = k * self.rerank if archive is not None else k
+            scores, indices = index.search(queries, fetch, params=params)
+        # Metadata rows are published before their vectors, so every returned id has one
+        hits = [[(idx, score) for score, idx in zip(row_scores, row_indices)
+                 if idx >= 0 and idx not in deleted]
+                for row_scores, row_indices in zip(scores.tolist(), indices.tolist())]
+        if archive is not None:
+            hits = self._rerank(archive, queries, hits, k)
+        return hits
+    
+    @staticmethod
+    def _rerank(archive: VectorArchive, queries: np.ndarray, hits: List[List[Tuple[int, float]]],
+                k: int) -> List[List[Tuple[int, float]]]:
+        """Re-score the candidates of a quantized search with full-precision vectors and keep the best k."""
+        ids = np.unique(np.fromiter((idx for row in hits for idx, _ in row), dtype=np.int64))
+        if not len(ids):
+            return hits
+        # One gather and one matrix product for the whole batch
+        scores = queries @ archive.get(ids).T
+        reranked = []
+        for query_scores, row in zip(scores, hits):
+            row_ids = np.fromiter((idx for idx, _ in row), dtype=np.int64, count=len(row))
+            exact = query_scores[np.searchsorted(ids, row_ids)]
+            best = np.argsort(-exact, kind="stable")[:k]
+            reranked.append([(int(row_ids[i]), float(exact[i])) for i in best.tolist()])
+        return reranked
+    
+    def _exact_search(self, index: faiss.Index, queries: np.ndarray, k: int,
+                      allowed: np.ndarray) -> List[List[Tuple[int, float]]]:
+        """
+        Score the allowed vectors of an id-mapped HNSW index exhaustively.
+        Must be called with the index lock held for reading.
+        """
+        ntotal = index.ntotal
+        cached = self._id_positions
+        if cached is None or cached[0] is not index or cached[1] != ntotal:
+            ids = faiss.vector_to_array(faiss.downcast_index(index).id_map).astype(np.int64)
+            order = np.argsort(ids, kind="stable")
+            cached = self._id_positions = (index, ntotal, ids[order], order)
+        _, _, sorted_ids, order = cached
+        found = np.searchsorted(sorted_ids, allowed)
+        found = found[found < len(sorted_ids)]
+        found = found[np.isin(sorted_ids[found], allowed, assume_unique=True)]
+        if not len(found):
+            return [[] for _ in queries]
+        storage = faiss.downcast_index(faiss.downcast_index(faiss.downcast_index(index).index).storage)
+        vectors = storage.reconstruct_batch(order[found].astype(np.int64))
+        scores = queries @ vectors.T
+        top = min(k, len(found))
+        results = []
+        for row in scores:
+            best = np.argpartition(-row, top - 1)[:top] if top < len(row) else np.arange(len(row))
+            best = best[np.argsort(-row[best], kind="stable")]
+            results.append([(int(sorted_ids[found[i]]), float(row[i])) for i in best.tolist()])
+        return results
+    
+    def lexical_search(self, query: str, k: int = 5, filters: Optional[Dict] = None) -> List[Tuple[Dict, float]]:
+        """
+        Search documents by keyword with BM25.
+        
+        Args:
+            query: Query text
+            k: Number of results to return
+            filters: Metadata restrictions, see filter_ids
+            
+        Returns:
+            List of (document, BM25 score) tuples
+        """
+        try:
+            hits = self.lexical_index.search(query, k, exclude=self.deleted, allowed=self.filter_ids(filters))
+            return [(self.documents[idx], score) for idx, score in hits]
+        except Exception as e:
+            logger.error(f"Error searching lexical index: {str(e)}")
             return []
     
+    def hybrid_search_batch(self, query_embeddings: np.ndarray, queries: List[str], k: int = 5,
+                            candidates: Optional[int] = None, nprobe: Optional[int] = None,
+                            ef_search: Optional[int] = None, filters: Optional[Dict] = None) -> List[List[Tuple[Dict, float]]]:
+        """
+        Search with dense vectors and BM25 and fuse the rankings.
+        
+        Each retriever contributes its top candidates, which are merged with
+        reciprocal rank fusion, so exact terms such as identifiers and error
+        codes are found even when their embeddings are not close.
+        
+        Args:
+            query_embeddings: Query vectors stacked into an (n, dimension) matrix
+            queries: Query texts, one per vector
+            k: Number of results to return per query
+            candidates: Results taken from each retriever (default: max(4 * k, 20))
+            nprobe: Inverted lists to visit for IVF indexes (overrides the store default)
+            ef_search: Candidate list size for HNSW indexes (overrides the store default)
+            filters: Metadata restrictions applied to both retrievers, see filter_ids
+            
+        Returns:
+            One list of (document, fused score) tuples per query
+        """
+        try:
+            vectors, valid = self._prepare_queries(query_embeddings)
+            # A query without a usable vector is answered by BM25 alone
+            vectors[~valid] = 0
+            if self.index.ntotal == 0:
+                logger.warning("Vector store index is empty. No documents have been added.")
+                return [[] for _ in queries]
+            
+            candidates = candidates or max(4 * k, 20)
+            nprobe, ef_search = nprobe or self.nprobe, ef_search or self.ef_search
+            version = self.version
+            filter_key = _filter_key(filters)
+            keys = [self.result_cache.key(vector, version, "hybrid", query, k, candidates, nprobe, ef_search, filter_key)
+                    for vector, query in zip(vectors, queries)]
+            results = [self.result_cache.get_for_version(key, version) for key in keys]
+            missing = [i for i, cached in enumerate(results) if cached is None]
+            if not missing:
+                return results
+            
+            documents = self.documents
+            allowed = self.filter_ids(filters)
+            searchable = [i for i in missing if valid[i]]
+            dense = dict(zip(searchable, self._dense_search(vectors[searchable], candidates, nprobe, ef_search,
+                                                            allowed))) if searchable else {}
+            for i in missing:
+                dense_hits = dense.get(i, [])
+                lexical_hits = self.lexical_index.search(queries[i], candidates, exclude=self.deleted, allowed=allowed)
+                fused = reciprocal_rank_fusion([[idx for idx, _ in dense_hits], [idx for idx, _ in lexical_hits]])
+                results[i] = [(documents[idx], score) for idx, score in fused[:k]]
+                self.result_cache.put(keys[i], results[i])
+            return results
+        except Exception as e:
+            logger.error(f"Error searching vector store: {str(e)}")
+            return [[] for _ in queries]
+    
+    def memory_usage(self) -> Dict[str, Union[int, str]]:
+        """
+        Report the memory footprint of the store, in bytes.
+        
+        Returns:
+            Dictionary with the index size, pending vectors and the
+            per-component metadata sizes from DocumentStore.memory_usage
+        """
+        with self._lock, self._index_lock.read():
+            report = {
+                "index_type": index_kind(self.index),
+                "vectors": int(self.index.ntotal),
+                "index_bytes": index_bytes(self.index),
+                "deleted": len(self.deleted),
+                "index_mapped": self._index_mapped,
+                "pending_vector_bytes": sum(v.nbytes for v in self._pending_vectors),
+            }
+            report.update({f"metadata_{key}": value for key, value in self.documents.memory_usage().items()})
+            report.update({f"lexical_{key}": value for key, value in self.lexical_index.memory_usage().items()})
+            if self._archive is not None:
+                report.update({f"rerank_{key}": value for key, value in self._archive.memory_usage().items()})
+        return report
+    
+    def check_vectors(self, repair: bool = False) -> Dict:
+        """
+        Scan the index for vectors that break cosine similarity search.
+        
+        Finds zero and NaN vectors (failed embeddings indexed by older
+        versions) and vectors that are not unit length. Quantized indexes
+        are checked on their decoded vectors, with a looser tolerance.
+        
+        Args:
+            repair: Delete zero/NaN vectors and rebuild the index from
+                normalized vectors if any are not unit length
+            
+        Returns:
+            Dictionary with the number of vectors checked, the ids of zero
+            and NaN vectors, the count of non-normalized vectors, the norm
+            range and what was repaired
+        
+        Raises:
+            Exception: If the index cannot be scanned or repaired
+        """
+        try:
+            with self._lock:
+                kind = index_kind(self.index)
+                tolerance = NORM_TOLERANCE.get(kind, 1e-3)
+                checked, unnormalized = 0, 0
+                zero, nan = [], []
+                low, high = np.inf, 0.0
+                # Exclusive: scanning an IVF index builds a direct map on it
+                with self._index_lock.write():
+                    for ids, vectors in iter_vectors(self.index):
+                        live = ~np.isin(ids, np.fromiter(self.deleted, dtype=np.int64)) if self.deleted else slice(None)
+                        ids, vectors = ids[live], vectors[live]
+                        norms = np.linalg.norm(vectors, axis=1)
+                        finite = np.isfinite(norms)
+                        nan.extend(ids[~finite].tolist())
+                        zero.extend(ids[finite & (norms <= 1e-6)].tolist())
+                        usable = finite & (norms > 1e-6)
+                        unnormalized += int((np.abs(norms[usable] - 1.0) > tolerance).sum())
+                        if usable.any():
+                            low, high = min(low, float(norms[usable].min())), max(high, float(norms[usable].max()))
+                        checked += len(ids)
+                report = {
+                    "index_type": kind,
+                    "checked": checked,
+                    "zero": zero,
+                    "nan": nan,
+                    "not_normalized": unnormalized,
+                    "norm_min": low if checked else None,
+                    "norm_max": high if checked else None,
+                    "deleted": 0,
+                    "renormalized": 0,
+                }
+                if not repair:
+                    return report
+                
+                if zero or nan:
+                    report["deleted"] = self.delete_ids(zero + nan)
+                if unnormalized:
+                    report["renormalized"] = self._renormalize()
+                if (report["deleted"] or report["renormalized"]) and self._storage is not None:
+                    self._write_snapshot(self._storage, self._manifest)
+        except Exception as e:
+            logger.error(f"Error checking vectors: {str(e)}")
+            raise
+        logger.info(f"Checked {checked} vectors: {len(zero)} zero, {len(nan)} NaN, {unnormalized} not normalized")
+        return report
+    
+    def _renormalize(self) -> int:
+        """
+        Rebuild the index from normalized copies of its vectors. Must be
+        called with the lock held.
+        
+        Returns:
+            Number of vectors re-added
+        """
+        parts, id_parts = [], []
+        with self._index_lock.write():
+            for ids, vectors in iter_vectors(self.index):
+                if self._archive is not None:
+                    # Prefer the exact vectors over decoded codes
+                    vectors = self._archive.get(ids)
+                parts.append(vectors)
+                id_parts.append(ids)
+        vectors, valid = normalize_vectors(np.vstack(parts))
+        ids = np.concatenate(id_parts)
+        # Tombstoned and invalid vectors are dropped rather than re-added
+        keep = valid & ~np.isin(ids, np.fromiter(self.deleted, dtype=np.int64))
+        vectors, ids = vectors[keep], ids[keep]
+        # Keep the layout of the current index, which may differ from the configured one
+        current = faiss.downcast_index(self.index)
+        kind = index_kind(current)
+        index = build_index(kind, current.d, nlist=getattr(current, "nlist", self.nlist),
+                            pq_m=current.pq.M if kind == "ivf_pq" else self.pq_m, hnsw_m=self.hnsw_m)
+        if not index.is_trained:
+            index.train(vectors)
+        index.add_with_ids(vectors, ids)
+        with self._index_lock.write():
+            self.index = index
+            self._index_mapped = False
+            self._tombstones = set()
+            self._rebuild_tombstone_selector()
+        self.version += 1
+        logger.info(f"Rebuilt {index_kind(index)} index from {len(ids)} normalized vectors")
+        return len(ids)
+    
     def save(self, directory: str) -> None:
         """
         Save the vector store to disk.
         
+        Documents added since the last save are appended as a new segment;
+        the first save to a directory writes a full base snapshot. Once
+        enough segments accumulate they are merged by a background compaction.
+        A directory holding a store that was not loaded into this one is
+        never overwritten, so a failed load cannot lose the saved data.
+        
         Args:
             directory: Directory to save the files
         """
         try:
             # Convert to absolute path
             directory = os.path.abspath(directory)
-            os.makedirs(directory, exist_ok=True)
-            
-            # Save FAISS index
-            index_path = os.path.join(directory, "index.faiss")
-            faiss.write_index(self.index, index_path)
             
-            # Save documents
-            documents_path = os.path.join(directory, "documents.pkl")
-            with open(documents_path, "wb") as f:
-                pickle.dump(self.documents, f)
+            with self._lock:
+                if self._storage is None or self._storage.directory != directory:
+                    storage = SegmentStorage(directory)
+                    if storage.has_manifest() or storage.has_legacy():
+                        raise ValueError(f"{directory} holds a vector store that was not loaded; not overwriting it")
+                    self._write_snapshot(storage, SegmentStorage.empty_manifest())
+                    logger.info(f"Saved vector store to {directory}")
+                    return
+                
+                written = self._flush_segment()
+                should_compact = len(self._manifest["segments"]) >= self.compact_segments
             
-            logger.info(f"Saved vector store to {directory}")
+            if written:
+                logger.info(f"Appended {written} changes to vector store in {directory}")
+            if should_compact:
+                self.compact(background=True)
         except Exception as e:
             logger.error(f"Error saving vector store: {str(e)}")
     
-    def load(self, directory: str) -> None:
+    def _flush_segment(self) -> int:
+        """
+        Append documents added and deleted since the last save as new segments.
+        Must be called with the lock held.
+        
+        Returns:
+            Number of documents added plus deleted
+        """
+        if not self._pending_vectors and not self._pending_deletes and \
+                self._manifest.get("sources") == self.source_hashes:
+            return 0
+        
+        written = 0
+        if self._pending_vectors:
+            vectors = np.vstack(self._pending_vectors)
+            entry = self._storage.write_segment(self._manifest, vectors, self.documents, self._persisted)
+            self._manifest["segments"].append(entry)
+            if self._archive is not None:
+                # Serve re-ranking from the saved file rather than the heap
+                self._archive.map(self._storage.segment_vectors_path(entry), entry["start"])
+            self._persisted += len(vectors)
+            self._pending_vectors = []
+            written += len(vectors)
+        if self._pending_deletes:
+            # Written after the additions, which they may refer to
+            entry = self._storage.write_deletes(self._manifest, self._pending_deletes)
+            self._manifest["segments"].append(entry)
+            written += len(self._pending_deletes)
+            self._pending_deletes = []
+        self._manifest["sources"] = dict(self.source_hashes)
+        self._storage.write_manifest(self._manifest)
+        return written
+    
+    def _write_snapshot(self, storage: SegmentStorage, manifest: Dict) -> None:
+        """
+        Write the full in-memory state as a new base snapshot and bind the
+        store to that directory. Must be called with the lock held.
+        
+        A running compaction is cancelled: its snapshot would be older than
+        this one, and it needs the lock held here to finish.
+        """
+        if self._compacting:
+            self._compaction_cancelled = True
+        with self._index_lock.read():
+            index_data = faiss.serialize_index(self.index)
+        entry = storage.write_base(manifest, index_data, self.documents,
+                                   np.fromiter(self.deleted, dtype=np.int64), self.lexical_index, self._archive)
+        old_base, old_segments = manifest["base"], manifest["segments"]
+        manifest["base"], manifest["segments"] = entry, []
+        manifest["sources"] = dict(self.source_hashes)
+        storage.write_manifest(manifest)
+        storage.remove_base(old_base)
+        storage.remove_segments(old_segments)
+        if self._archive is not None:
+            self._archive.map(storage.vectors_path(entry), 0)
+        self._storage, self._manifest, self._persisted = storage, manifest, len(self.documents)
+        self._pending_vectors, self._pending_deletes = [], []
+    
+    def compact(self, background: bool = False) -> None:
+        """
+        Merge the base snapshot and all segments into a new base snapshot.
+        
+        Saves that happen while the snapshot is written go into new segments
+        and are kept.
+        
+        Args:
+            background: Run the compaction in a daemon thread
+        """
+        if background:
+            with self._lock:
+                # At most one runs, so close() only has to join the latest
+                if self._compaction is None or not self._compaction.is_alive():
+                    self._compaction = threading.Thread(target=self.compact, name="vector-store-compaction", daemon=True)
+                    self._compaction.start()
+            return
+        
+        with self._lock:
+            if self._storage is None or self._compacting:
+                return
+            self._compacting = True
+            self._compaction_cancelled = False
+            try:
+                # Persist pending documents first so the snapshot matches the log
+                self._flush_segment()
+                storage = self._storage
+                with self._index_lock.read():
+                    index_data = faiss.serialize_index(self.index)
+                # The lexical index and archive are only appended to, so writing
+                # their first len(documents) rows later gives the same snapshot
+                documents = self.documents.snapshot()
+                lexical_index, archive = self.lexical_index, self._archive
+                deleted = np.fromiter(self.deleted, dtype=np.int64)
+                merged = list(self._manifest["segments"])
+                old_base = self._manifest["base"]
+                # Reserve the generation, and so the file names, of the new base
+                reserved = {"generation": self._manifest["generation"]}
+                self._manifest["generation"] += 1
+            except Exception:
+                self._compacting = False
+                raise
+        
+        try:
+            # Write outside the lock so saves and searches are not blocked
+            entry = storage.write_base(reserved, index_data, documents, deleted, lexical_index, archive)
+            with self._lock:
+                if self._storage is not storage or self._compaction_cancelled:
+                    # A newer snapshot was written meanwhile; discard this one
+                    storage.remove_base(entry)
+                    return
+                self._manifest["base"] = entry
+                self._manifest["segments"] = self._manifest["segments"][len(merged):]
+                storage.write_manifest(self._manifest)
+                if self._archive is not None and entry.get("vectors"):
+                    self._archive.map(storage.vectors_path(entry), 0)
+            storage.remove_base(old_base)
+            storage.remove_segments(merged)
+            logger.info(f"Compacted {len(merged)} segments into base snapshot of {len(documents)} documents")
+        except Exception as e:
+            logger.error(f"Error compacting vector store: {str(e)}")
+        finally:
+            self._compacting = False
+    
+    def close(self, directory: Optional[str] = None) -> None:
+        """
+        Save pending changes and wait for a background compaction to finish,
+        after which another store may open the directory.
+        
+        Args:
+            directory: Directory to save to (default: the directory the store
+                was last saved to or loaded from; an unsaved store is not written)
+        """
+        if directory is None and self._storage is not None:
+            directory = self._storage.directory
+        if directory is not None:
+            self.save(directory)
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+    
+    def load(self, directory: str, mmap: Optional[bool] = None) -> None:
         """
         Load the vector store from disk.
         
         Args:
             directory: Directory containing the saved files
+            mmap: Memory-map the base snapshot instead of reading it onto the heap
+                (default: VECTOR_STORE_MMAP). The index is copied into memory on
+                the first write, or at load time if there are segments to replay.
+        
+        Raises:
+            Exception: If the saved files cannot be read. The store is then not
+                bound to the directory, so save() will not overwrite it.
         """
+        if mmap is None:
+            mmap = os.getenv("VECTOR_STORE_MMAP", "0").lower() in ("1", "true", "yes")
         try:
             # Convert to absolute path
             directory = os.path.abspath(directory)
@@ -131,26 +937,100 @@ class VectorStore:
             if not os.path.exists(directory):
                 logger.error(f"Vector store directory does not exist: {directory}")
                 return
-                
-            # Check if files exist
-            index_path = os.path.join(directory, "index.faiss")
-            documents_path = os.path.join(directory, "documents.pkl")
             
-            if not os.path.exists(index_path):
-                logger.error(f"FAISS index file does not exist: {index_path}")
-                return
-                
-            if not os.path.exists(documents_path):
-                logger.error(f"Documents file does not exist: {documents_path}")
+            storage = SegmentStorage(directory)
+            if not storage.has_manifest() and not storage.has_legacy():
+                logger.error(f"No saved vector store found in {directory}")
                 return
             
-            # Load FAISS index
-            self.index = faiss.read_index(index_path)
-            
-            # Load documents
-            with open(documents_path, "rb") as f:
-                self.documents = pickle.load(f)
+            with self._lock:
+                # Searches wait until the whole store is replaced
+                with self._index_lock.write():
+                    manifest = storage.read_manifest()
+                    
+                    # Load the base snapshot; a mapped index cannot take the segment vectors
+                    map_index = mmap and not manifest["segments"]
+                    index, documents, deleted = storage.read_base(manifest["base"], use_mmap=mmap, map_index=map_index)
+                    self.index = index if index is not None else self._empty_index()
+                    self._index_mapped = index is not None and map_index
+                    self.documents = documents
+                    self.lexical_index = storage.read_lexical(manifest["base"], use_mmap=mmap)
+                    if self.lexical_index is None:
+                        # Snapshots written before hybrid search: index the stored text once
+                        self.lexical_index = BM25Index()
+                        self.lexical_index.add(doc["text"] for doc in documents)
+                        logger.info(f"Built lexical index over {len(documents)} documents")
+                    self.deleted = set(deleted.tolist())
+                    self._archive = self._new_archive()
+                    if self._archive is not None and storage.vectors_path(manifest["base"]):
+                        self._archive.map(storage.vectors_path(manifest["base"]), 0)
+                    elif self._archive is not None and len(documents):
+                        logger.warning("Vector store was saved without full-precision vectors; re-ranking is disabled")
+                        self._archive = None
+                    # The base index already excludes deleted ids, unless it cannot remove them
+                    self._tombstones = set(self.deleted) if index_kind(self.index) == "hnsw" else set()
+                    
+                    # Indexes written before deletion support have implicit ids
+                    self._ensure_id_map()
+                    
+                    # Replay segments appended since the snapshot
+                    for entry in manifest["segments"]:
+                        if entry.get("kind") == "delete":
+                            ids = [i for i in storage.read_deletes(entry).tolist() if i not in self.deleted]
+                            if ids:
+                                self.deleted = self.deleted | set(ids)
+                                self._remove_from_index(ids)
+                            continue
+                        if entry["start"] + entry["count"] <= len(self.documents):
+                            continue
+                        vectors, segment_documents = storage.read_segment(entry, use_mmap=self._archive is not None)
+                        skip = len(self.documents) - entry["start"]
+                        if self._archive is not None:
+                            self._archive.map(storage.segment_vectors_path(entry), entry["start"])
+                        start = len(self.documents)
+                        self.documents.extend(segment_documents[skip:])
+                        self.lexical_index.add(doc["text"] for doc in segment_documents[skip:])
+                        self._add_vectors(np.ascontiguousarray(vectors[skip:]), start)
+                    self._rebuild_tombstone_selector()
+                    
+                    self._storage, self._manifest, self._persisted = storage, manifest, len(self.documents)
+                    self.source_hashes = dict(manifest.get("sources", {}))
+                    self._pending_vectors, self._pending_deletes = [], []
+                    self.version += 1
+                    
+                # Migrate a flat index written by an older configuration
+                self._maybe_train()
             
-            logger.info(f"Loaded vector store from {directory}")
+            logger.info(f"Loaded {index_kind(self.index)} vector store with {len(self.documents)} documents "
+                        f"and {len(manifest['segments'])} segments from {directory}")
         except Exception as e:
-            logger.error(f"Error loading vector store: {str(e)}") 
\ No newline at end of file
+            logger.error(f"Error loading vector store: {str(e)}")
+            raise
+
+def _filter_key(filters: Optional[Dict]) -> Optional[Tuple]:
+    """
+    Normalize search filters into a hashable key.
+    
+    Args:
+        filters: Filter dictionary, see VectorStore.filter_ids
+        
+    Returns:
+        Tuple of (field, values) pairs in FILTER_FIELDS order, or None if empty
+    """
+    if not filters:
+        return None
+    unknown = set(filters) - set(FILTER_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown filter fields {sorted(unknown)}, expected some of {FILTER_FIELDS}")
+    key = []
+    for field in FILTER_FIELDS:
+        value = filters.get(field)
+        if value is None:
+            continue
+        if field == "page":
+            low, high = (value, value) if isinstance(value, int) else tuple(value)
+            key.append((field, (None if low is None else int(low), None if high is None else int(high))))
+        else:
+            values = [value] if isinstance(value, str) else list(value)
+            key.append((field, tuple(sorted(str(v) for v in values))))
+    return tuple(key) or None
@@ -2,11 +2,60 @@ import streamlit as st
 import requests
 import json
 import os
-from typing import List, Dict, Union
+import time
+from typing import List, Dict, Iterator, Tuple, Union
 
 # API endpoint
 API_URL = "http://localhost:8000"
 
+def wait_for_job(job_id: str) -> Dict:
+    """Poll an ingestion job until it finishes, showing its progress."""
+    status = st.sidebar.empty()
+    while True:
+        job = requests.get(f"{API_URL}/jobs/{job_id}").json()
+        status.info(f"{job['status'].capitalize()}: {job['pages_parsed']} pages parsed, "
+                    f"{job['chunks_embedded']} chunks embedded, {job['vectors_indexed']} vectors indexed")
+        if job["status"] in ("succeeded", "failed"):
+            status.empty()
+            return job
+        time.sleep(1)
+
+def stream_events(path: str, **kwargs) -> Iterator[Tuple[str, Dict]]:
+    """Yield (event, data) pairs from a server-sent events endpoint."""
+    with requests.post(f"{API_URL}{path}", stream=True, **kwargs) as response:
+        response.raise_for_status()
+        event = "message"
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                yield event, json.loads(line[len("data: "):])
+
+def show_question(i: int, qa: Dict[str, str]) -> None:
+    """Render a quiz question with an answer box and a check button."""
+    st.subheader(f"Question {i}")
+    st.write(qa["question"])
+    
+    # Answer input
+    user_answer = st.text_input(f"Your answer for Question {i}", key=f"answer_{i}")
+    
+    if user_answer:
+        if st.button(f"Check Answer {i}", key=f"check_{i}"):
+            feedback = requests.post(
+                f"{API_URL}/quiz/check",
+                params={
+                    "question": qa["question"],
+                    "user_answer": user_answer,
+                    "correct_answer": qa["answer"]
+                }
+            ).json()
+            
+            if feedback["is_correct"]:
+                st.success("Correct!")
+            else:
+                st.error("Incorrect")
+            st.write(feedback["feedback"])
+
 def main():
     st.title("RAG Pipeline - Q&A, Summarization & Quizzes")
     
@@ -19,7 +68,7 @@ def main():
         if st.sidebar.button("Process PDF"):
             files = {"file": (pdf_file.name, pdf_file.getvalue())}
             response = requests.post(f"{API_URL}/upload/pdf", files=files)
-            if response.status_code == 200:
+            if response.ok and wait_for_job(response.json()["job_id"])["status"] == "succeeded":
                 st.sidebar.success("PDF processed successfully!")
             else:
                 st.sidebar.error("Error processing PDF")
@@ -27,8 +76,8 @@ def main():
     # URL input
     url = st.sidebar.text_input("Enter webpage URL")
     if url and st.sidebar.button("Process URL"):
-        response = requests.post(f"{API_URL}/process/url", json={"url": url})
-        if response.status_code == 200:
+        response = requests.post(f"{API_URL}/process/url", params={"url": url})
+        if response.ok and wait_for_job(response.json()["job_id"])["status"] == "succeeded":
             st.sidebar.success("URL processed successfully!")
         else:
             st.sidebar.error("Error processing URL")
@@ -41,48 +90,43 @@ def main():
     
     if query:
         if st.button("Submit"):
-            # Process query
-            response = requests.post(f"{API_URL}/query", json={"query": query})
+            # Stream the agent's steps and answer as they are produced
+            steps = st.expander("Agent steps")
+            header = st.empty()
+            answer = st.empty()
+            text = ""
+            questions = 0
+            result = None
+            try:
+                for event, data in stream_events("/query/stream", params={"query": query}):
+                    if event == "step":
+                        steps.markdown(f"**{data['tool']}**: {data['input']}")
+                    elif event == "observation":
+                        steps.caption(data["output"])
+                    elif event == "token":
+                        if not text:
+                            header.header("Answer")
+                        text += data["text"]
+                        answer.markdown(text)
+                    elif event == "question":
+                        if not questions:
+                            header.header("Quiz Questions")
+                            answer.empty()
+                        questions += 1
+                        show_question(questions, data)
+                    elif event in ("done", "error"):
+                        result = data
+            except requests.RequestException:
+                result = None
             
-            if response.status_code == 200:
-                result = response.json()
-                
-                if result["type"] == "quiz":
-                    st.header("Quiz Questions")
-                    for i, qa in enumerate(result["questions"], 1):
-                        st.subheader(f"Question {i}")
-                        st.write(qa["question"])
-                        
-                        # Answer input
-                        user_answer = st.text_input(f"Your answer for Question {i}", key=f"answer_{i}")
-                        
-                        if user_answer:
-                            if st.button(f"Check Answer {i}", key=f"check_{i}"):
-                                feedback = requests.post(
-                                    f"{API_URL}/quiz/check",
-                                    json={
-                                        "question": qa["question"],
-                                        "user_answer": user_answer,
-                                        "correct_answer": qa["answer"]
-                                    }
-                                ).json()
-                                
-                                if feedback["is_correct"]:
-                                    st.success("Correct!")
-                                else:
-                                    st.error("Incorrect")
-                                st.write(feedback["feedback"])
-                
-                elif result["type"] == "summary":
-                    st.header("Summary")
-                    st.write(result["content"])
-                
-                else:  # answer
-                    st.header("Answer")
-                    st.write(result["content"])
-            
-            else:
+            if result is None or result["type"] == "error":
                 st.error("Error processing query")
+            elif result["type"] == "summary":
+                header.header("Summary")
+                answer.write(result["content"])
+            elif result["type"] == "answer":
+                header.header("Answer")
+                answer.write(result["content"])
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,55 @@
+import os
+import sys
+import zlib
+import numpy as np
+import pytest
+
+# Tests import the code as the `src` package, like the API and the benchmarks
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep test runs off the on-disk caches; the LLM client only checks that a key is set
+os.environ.setdefault("MISTRAL_API_KEY", "test")
+os.environ["EMBED_CACHE_PATH"] = ""
+os.environ["WEB_CACHE_PATH"] = ""
+
+DIMENSION = 32
+
+def random_vectors(count: int, dimension: int = DIMENSION, seed: int = 0) -> np.ndarray:
+    """Random float32 vectors, reproducible from the seed."""
+    return np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+
+@pytest.fixture
+def make_documents():
+    """Factory of documents with random embeddings, ten chunks per source."""
+    def make(count: int, start: int = 0, dimension: int = DIMENSION, seed: int = 0):
+        vectors = random_vectors(count, dimension, seed)
+        return [{
+            "text": f"chunk {start + i}",
+            "source": f"doc-{(start + i) // 10}.pdf",
+            "type": "pdf",
+            "page": (start + i) % 10 + 1,
+            "chunk_id": start + i,
+            "embedding": vector,
+        } for i, vector in enumerate(vectors)]
+    return make
+
+def text_vector(text: str, dimension: int = DIMENSION) -> np.ndarray:
+    """Deterministic stand-in embedding of a text."""
+    return random_vectors(1, dimension, seed=zlib.crc32(text.encode("utf-8")))[0]
+
+@pytest.fixture
+def fake_embeddings(monkeypatch):
+    """Replace the LiteLLM embedding calls with text_vector; returns the list of embedded batches."""
+    from src.ingestion import embedding_generator
+    calls = []
+
+    def response(input):
+        calls.append(list(input))
+        return {"data": [{"embedding": text_vector(text).tolist()} for text in input]}
+
+    async def aembedding(model, input, **kwargs):
+        return response(input)
+
+    monkeypatch.setattr(embedding_generator, "embedding", lambda model, input, **kwargs: response(input))
+    monkeypatch.setattr(embedding_generator, "aembedding", aembedding)
+    return calls
@@ -0,0 +1,182 @@
+import asyncio
+import time
+import pytest
+from langchain_core.language_models.fake import FakeListLLM
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from src.agent.react_agent import ReActAgent, _StreamingHandler
+from src.agent.router import QueryRouter
+from src.generation.llm import LLMGenerator, parse_quiz
+from src.retrieval.collection_manager import CollectionManager
+from src.ingestion.embedding_generator import EmbeddingGenerator
+from src.retrieval.vector_store import VectorStore
+from conftest import DIMENSION, text_vector
+
+TEXTS = ["Photosynthesis turns light into chemical energy.", "Mitochondria produce ATP for the cell."]
+
+# An agent run that searches once and then answers
+AGENT_STEPS = [
+    "I should search the documents.\nAction: search_documents\nAction Input: photosynthesis",
+    "I know the answer.\nFinal Answer: Light becomes chemical energy.",
+]
+
+@pytest.fixture
+def make_agent(fake_embeddings, monkeypatch):
+    """Factory of agents over a two-document store, whose LangChain agent replays the given LLM responses."""
+    def make(responses=AGENT_STEPS, mode=None, texts=TEXTS):
+        store = VectorStore(dimension=DIMENSION)
+        store.add_documents([{"text": text, "source": "biology.pdf", "type": "pdf", "page": i + 1,
+                              "chunk_id": i, "embedding": text_vector(text)} for i, text in enumerate(texts)])
+        generator = LLMGenerator()
+        generator.llm = FakeListLLM(responses=list(responses))
+        generator.streaming_llm = FakeListLLM(responses=list(responses))
+        monkeypatch.setattr(generator, "answer_question", lambda context, question: f"answer from {context[:3]}")
+        monkeypatch.setattr(generator, "stream_answer", lambda context, question: iter(["Light ", "becomes ", "energy."]))
+        monkeypatch.setattr(generator, "generate_quiz", lambda text: [{"question": text, "answer": "yes"}])
+        monkeypatch.setattr(generator, "stream_quiz", lambda text: iter([{"question": text, "answer": "yes"}]))
+        return ReActAgent(store, EmbeddingGenerator(), generator, QueryRouter(mode))
+    return make
+
+# Streaming responses
+
+def test_parse_quiz_pairs_questions_with_their_answers():
+    lines = ["Q1: What is ATP?", "", "A: An energy carrier.", "Question 2: Where is it made?",
+             "Answer: In mitochondria.", "Q3: Left unanswered?"]
+    assert list(parse_quiz(lines)) == [
+        {"question": "What is ATP?", "answer": "An energy carrier."},
+        {"question": "Where is it made?", "answer": "In mitochondria."},
+    ]
+
+def test_stream_quiz_yields_questions_from_split_tokens(monkeypatch):
+    generator = LLMGenerator()
+    tokens = ["Q1: What is", " ATP?\nA: An en", "ergy carrier.\nQ2", ": Where?\nA: Mitochondria."]
+    monkeypatch.setattr(generator, "_stream_completion", lambda prompt: iter(tokens))
+    assert list(generator.stream_quiz("text")) == [
+        {"question": "What is ATP?", "answer": "An energy carrier."},
+        {"question": "Where?", "answer": "Mitochondria."},
+    ]
+
+def test_streaming_handler_only_forwards_the_final_answer():
+    events = []
+    handler = _StreamingHandler(type("Events", (), {"put": staticmethod(events.append)}))
+    handler.on_llm_start({}, [])
+    for token in ["I should search.", "\nAction: search_documents"]:
+        handler.on_llm_new_token(token)
+    handler.on_llm_start({}, [])
+    for token in ["Thought: done\nFinal", " Answer:", " Light", " becomes energy."]:
+        handler.on_llm_new_token(token)
+    texts = [event["data"]["text"] for event in events]
+    assert texts == ["Light", " becomes energy."]
+
+def test_direct_answers_stream_a_step_and_tokens(make_agent):
+    agent = make_agent()
+    events = list(agent.stream_query("What does photosynthesis do?"))
+    assert [event["event"] for event in events] == ["step", "observation", "token", "token", "token", "done"]
+    assert events[0]["data"]["tool"] == "search_documents"
+    assert events[-1]["data"] == {"type": "answer", "content": "Light becomes energy.", "route": "direct"}
+
+def test_agent_runs_stream_tool_calls_and_the_response(make_agent):
+    agent = make_agent(mode="agent")
+    events = list(agent.stream_query("Summarize photosynthesis"))
+    assert [event["event"] for event in events] == ["step", "observation", "done"]
+    assert events[0]["data"]["input"] == "photosynthesis"
+    assert "Photosynthesis" in events[1]["data"]["output"]
+    assert events[-1]["data"] == {"type": "summary", "content": "Light becomes chemical energy.", "route": "agent"}
+
+def test_agent_quizzes_stream_each_question(make_agent):
+    events = list(make_agent(mode="agent").stream_query("Quiz me on photosynthesis"))
+    assert [event["event"] for event in events] == ["step", "observation", "question", "done"]
+    assert events[-1]["data"]["questions"] == [events[2]["data"]]
+
+def test_failed_agent_runs_stream_an_error(make_agent):
+    agent = make_agent(responses=["no action here"], mode="agent")
+    events = list(agent.stream_query("Summarize photosynthesis"))
+    assert events[-1]["event"] == "error"
+    assert agent.router.stats()["agent"]["errors"] == 1
+
+# Async request path
+
+def test_async_queries_answer_concurrently(make_agent, monkeypatch):
+    agent = make_agent()
+
+    async def aanswer_question(context, question):
+        await asyncio.sleep(0.2)
+        return f"{question} -> {context.splitlines()[1]}"
+
+    async def run():
+        return await asyncio.gather(*(agent.aprocess_query(text) for text in TEXTS * 3))
+
+    monkeypatch.setattr(agent.llm_generator, "aanswer_question", aanswer_question)
+    started = time.perf_counter()
+    responses = asyncio.run(run())
+    # Six queries waiting on the LLM at once take about as long as one
+    assert time.perf_counter() - started < 0.6
+    assert [response["content"] for response in responses] == [f"{text} -> {text}" for text in TEXTS * 3]
+    assert {response["route"] for response in responses} == {"direct"}
+
+def test_async_agent_runs_match_the_blocking_ones(make_agent):
+    query = "Summarize photosynthesis"
+    expected = make_agent(mode="agent").process_query(query)
+    assert asyncio.run(make_agent(mode="agent").aprocess_query(query)) == expected
+    assert expected == {"type": "summary", "content": "Light becomes chemical energy.", "route": "agent"}
+
+def test_async_answer_checks_use_the_chat_model(make_agent):
+    agent = make_agent()
+    agent.llm_generator.llm = FakeListChatModel(responses=[" Correct, well done. "])
+    feedback = asyncio.run(agent.acheck_answer("What is ATP?", " An energy carrier", "an energy carrier"))
+    assert feedback == {"feedback": "Correct, well done.", "is_correct": True}
+
+# Direct answers without the agent
+
+@pytest.mark.parametrize("query, route", [
+    ("What does photosynthesis do?", "direct"),
+    ("Where is ATP made", "direct"),
+    ("Summarize the chapter on cells", "agent"),
+    ("Compare mitochondria and chloroplasts", "agent"),
+    ("Quiz me on photosynthesis", "agent"),
+    ("What is ATP? Where is it made?", "agent"),
+    ("Find the pros and cons of each method", "agent"),
+    (" ".join(["word"] * 41), "agent"),
+])
+def test_router_sends_multi_step_queries_to_the_agent(query, route):
+    assert QueryRouter("rules", max_words=40).route(query) == route
+
+def test_router_modes():
+    assert QueryRouter("agent").route("What is ATP?") == "agent"
+    with pytest.raises(ValueError):
+        QueryRouter("llm")
+
+def test_router_reports_latency_per_route():
+    router = QueryRouter("rules")
+    for milliseconds in range(1, 101):
+        router.record("direct", milliseconds / 1000)
+    router.record("agent", 2.0, error=True, fallback=True)
+    stats = router.stats()
+    assert stats["direct"]["requests"] == 100 and stats["direct"]["p50_ms"] == pytest.approx(50.5)
+    assert stats["direct"]["p95_ms"] == pytest.approx(95.05)
+    assert stats["agent"] == {"requests": 1, "errors": 1, "fallbacks": 1, "seconds": 2.0,
+                              "mean_ms": 2000.0, "p50_ms": 2000.0, "p95_ms": 2000.0}
+
+def test_simple_questions_skip_the_agent(make_agent):
+    agent = make_agent()
+    response = agent.process_query("What does photosynthesis do?")
+    assert response == {"type": "answer", "content": "answer from [1]", "route": "direct"}
+    # The agent's scripted LLM responses were not consumed
+    assert agent.llm_generator.llm.i == 0
+
+def test_questions_without_search_results_fall_back_to_the_agent(make_agent):
+    agent = make_agent(texts=[])
+    response = agent.process_query("What does photosynthesis do?")
+    assert response["route"] == "agent"
+    assert agent.router.stats()["agent"]["fallbacks"] == 1
+
+# Collections
+
+def test_agents_for_a_collection_are_built_once_while_it_is_loaded(make_agent, tmp_path):
+    agent = make_agent()
+    agent.collections = CollectionManager(root=str(tmp_path / "collections"), default_store=agent.vector_store,
+                                          default_directory=str(tmp_path / "default"))
+    agent.collections.create("notes")
+    with agent.collections.use("notes") as store:
+        assert agent._agent_for(store) is agent._agent_for(store) is not agent.agent
+        assert agent._search_tool_for(store).vector_store is store
+    agent.collections.close()
@@ -0,0 +1,57 @@
+import importlib
+import json
+import os
+import pytest
+from fastapi.testclient import TestClient
+from src.ingestion.jobs import IngestionJob
+
+@pytest.fixture(scope="module")
+def api(tmp_path_factory):
+    """The API module, started in an empty working directory so no data is loaded or written in the tree."""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("api"))
+    try:
+        main = importlib.import_module("src.api.main")
+        with TestClient(main.app) as client:
+            yield main, client
+    finally:
+        os.chdir(cwd)
+
+# Background ingestion jobs
+
+def test_uploads_are_written_to_unique_paths(api, monkeypatch):
+    main, client = api
+    submitted = []
+    monkeypatch.setattr(main.job_manager, "submit_upload",
+                        lambda path, source, collection: submitted.append((path, source)) or IngestionJob("pdf", source))
+    for content in (b"first", b"second"):
+        response = client.post("/upload/pdf", files={"file": ("../notes.pdf", content, "application/pdf")})
+        assert response.status_code == 202
+    (first, source), (second, second_source) = submitted
+    assert first != second and source == second_source == "notes.pdf"
+    assert [open(path, "rb").read() for path in (first, second)] == [b"first", b"second"]
+
+def test_uploads_need_a_file_name(api):
+    _, client = api
+    response = client.post("/upload/pdf", files={"file": ("..", b"content", "application/pdf")})
+    assert response.status_code == 400
+
+# Hybrid search
+
+def test_batch_search_rejects_unknown_modes(api):
+    _, client = api
+    response = client.post("/search/batch", json={"queries": ["anything"], "mode": "semantic"})
+    assert response.status_code == 400
+    assert "semantic" in response.json()["detail"]
+
+# Streaming responses
+
+def test_quiz_stream_sends_server_sent_events(api, monkeypatch):
+    main, client = api
+    questions = [{"question": "What is ATP?", "answer": "An energy carrier."}, {"question": "Where?", "answer": "Cells."}]
+    monkeypatch.setattr(main.llm_generator, "stream_quiz", lambda text: iter(questions))
+    response = client.post("/quiz/stream", json={"text": "ATP"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+    assert [event[0] for event in events] == ["event: question", "event: question", "event: done"]
+    assert json.loads(events[-1][1][len("data: "):]) == {"type": "quiz", "questions": questions}
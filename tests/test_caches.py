@@ -0,0 +1,109 @@
+import itertools
+import numpy as np
+import pytest
+from src.ingestion import embedding_cache
+from src.ingestion.embedding_cache import EmbeddingCache
+from src.ingestion.embedding_generator import EmbeddingGenerator
+from src.retrieval.result_cache import LRUCache
+from src.retrieval.vector_store import VectorStore
+from conftest import DIMENSION, text_vector
+
+MODEL = "mistral/mistral-embed"
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Strictly increasing cache timestamps, so recency never ties."""
+    ticks = itertools.count(1)
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: float(next(ticks)))
+
+# Embedding cache
+
+def test_cached_vectors_are_found_by_normalized_text(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"))
+    cache.put_many(MODEL, ["a  page\nof text"], [text_vector("a")])
+    found = cache.get_many(MODEL, ["a page of text", "another page", " a page of  text "])
+    assert sorted(found) == [0, 2]
+    np.testing.assert_array_equal(found[0], text_vector("a"))
+    assert cache.get_many("other-model", ["a page of text"]) == {}
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 2
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_entries=2, touch_interval=0)
+    cache.put_many(MODEL, ["first", "second"], [text_vector("first"), text_vector("second")])
+    cache.get_many(MODEL, ["first"])
+    cache.put_many(MODEL, ["third"], [text_vector("third")])
+    assert sorted(cache.get_many(MODEL, ["first", "second", "third"])) == [0, 2]
+
+def test_hits_only_record_recency_once_per_touch_interval(tmp_path, clock):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), touch_interval=10)
+    cache.put_many(MODEL, ["first"], [text_vector("first")])
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+    for _ in range(5):
+        assert sorted(cache.get_many(MODEL, ["first"])) == [0]
+    assert not any(statement.startswith("UPDATE") for statement in statements)
+    for _ in range(10):
+        cache.get_many(MODEL, ["first"])
+    assert sum(statement.startswith("UPDATE") for statement in statements) == 1
+
+def test_puts_below_max_entries_do_not_count_the_cache(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_entries=100)
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+    for i in range(10):
+        cache.put_many(MODEL, [f"text {i}"], [text_vector(f"text {i}")])
+    assert not any("COUNT" in statement for statement in statements)
+    cache.put_many(MODEL, [f"more {i}" for i in range(95)], [text_vector(f"more {i}") for i in range(95)])
+    # Over the limit: 5 excess entries and 1% of max_entries are evicted
+    assert cache.stats()["entries"] == 99
+
+def test_generator_only_embeds_texts_missing_from_the_cache(tmp_path, monkeypatch, fake_embeddings):
+    monkeypatch.setenv("EMBED_CACHE_PATH", str(tmp_path / "cache.sqlite"))
+    EmbeddingGenerator().generate_embeddings_batch(["one", "two"])
+    # A new process sharing the cache file
+    embeddings = EmbeddingGenerator().generate_embeddings_batch(["two", "three", "one", "three"])
+    assert fake_embeddings == [["one", "two"], ["three"]]
+    for text, vector in zip(["two", "three", "one", "three"], embeddings):
+        np.testing.assert_allclose(vector, text_vector(text), rtol=1e-6)
+
+# Query embedding and search result caches
+
+def test_lru_cache_evicts_the_least_recently_used_entry():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["hits"] == 3 and cache.stats()["misses"] == 1
+    disabled = LRUCache(max_size=0)
+    disabled.put("a", 1)
+    assert disabled.get("a") is None
+
+def test_repeated_queries_are_embedded_once(fake_embeddings):
+    embedder = EmbeddingGenerator()
+    first = embedder.generate_embedding("what is  FAISS?")
+    second = embedder.generate_embedding(" what is FAISS? ")
+    np.testing.assert_array_equal(first, second)
+    assert fake_embeddings == [["what is  FAISS?"]]
+
+def test_result_cache_serves_repeated_searches_until_the_index_changes(make_documents):
+    store = VectorStore(dimension=DIMENSION)
+    documents = make_documents(20)
+    store.add_documents(documents)
+    query = documents[5]["embedding"]
+    assert store.search(query, k=1)[0][0]["text"] == "chunk 5"
+    # A nearly identical query falls in the same bucket
+    assert store.search(query * 2 + 1e-4, k=1)[0][0]["text"] == "chunk 5"
+    assert store.result_cache.stats()["hits"] == 1
+
+    store.add_documents([{**documents[5], "text": "chunk 5 again", "chunk_id": 99}])
+    assert {doc["text"] for doc, _ in store.search(query, k=2)} == {"chunk 5", "chunk 5 again"}
+    assert store.result_cache.stats()["hits"] == 1
+
+# Zero and NaN embeddings
+
+def test_failed_embeddings_are_not_cached(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"))
+    cache.put_many(MODEL, ["zero", "nan"], [np.zeros(4, dtype=np.float32), np.full(4, np.nan, dtype=np.float32)])
+    assert cache.stats()["entries"] == 0
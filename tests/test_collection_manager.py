@@ -0,0 +1,83 @@
+import pytest
+from src.retrieval.collection_manager import CollectionManager, DEFAULT_COLLECTION
+from src.retrieval.vector_store import VectorStore
+
+# Collections load stores of the default dimension
+DIMENSION = 1024
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = CollectionManager(root=str(tmp_path / "collections"), default_store=VectorStore(dimension=DIMENSION),
+                                default_directory=str(tmp_path / "default"), max_loaded=2)
+    for name in ("a", "b", "c"):
+        manager.create(name)
+    yield manager
+    manager.close()
+
+def fill(manager, name, make_documents, count=5):
+    with manager.use(name) as store:
+        store.add_documents(make_documents(count, dimension=DIMENSION))
+
+# Collections with LRU eviction
+
+def test_least_recently_used_collections_are_saved_and_evicted(manager, make_documents):
+    fill(manager, "a", make_documents, 3)
+    fill(manager, "b", make_documents)
+    fill(manager, "c", make_documents)
+    assert manager.stats()["loaded"] == [DEFAULT_COLLECTION, "b", "c"]
+    assert manager.evictions == 1
+
+    with manager.use("a") as store:
+        assert len(store.documents) == 3
+    assert manager.stats()["loaded"] == [DEFAULT_COLLECTION, "c", "a"]
+    assert manager.loads == 4
+    assert [(c["name"], c["loaded"], c["documents"]) for c in manager.list()] == [
+        (DEFAULT_COLLECTION, True, 0), ("a", True, 3), ("b", False, None), ("c", True, 5)]
+
+def test_pinned_collections_are_not_evicted(manager, make_documents):
+    with manager.use("a") as pinned:
+        fill(manager, "b", make_documents)
+        fill(manager, "c", make_documents)
+        # a is the least recently used but pinned, so b goes instead
+        assert manager.stats()["loaded"] == [DEFAULT_COLLECTION, "a", "c"]
+        pinned.add_documents(make_documents(2, dimension=DIMENSION))
+    fill(manager, "b", make_documents)
+    assert manager.stats()["loaded"] == [DEFAULT_COLLECTION, "c", "b"]
+    with manager.use("a") as store:
+        assert len(store.documents) == 2
+
+def test_collections_over_the_memory_budget_are_evicted_once_released(tmp_path, make_documents):
+    manager = CollectionManager(root=str(tmp_path), max_loaded=8, memory_budget_mb=0.01)
+    manager.create("big")
+    fill(manager, "big", make_documents, 20)
+    assert manager.stats()["loaded"] == [] and manager.evictions == 1
+    with manager.use("big") as store:
+        assert len(store.documents) == 20
+
+def test_objects_cached_with_a_store_are_dropped_when_it_is_evicted(manager, make_documents):
+    built = []
+
+    def build():
+        built.append(object())
+        return built[-1]
+
+    with manager.use("a") as store:
+        first = manager.cached(store, "agent", build)
+        assert manager.cached(store, "agent", build) is first
+    fill(manager, "b", make_documents)
+    fill(manager, "c", make_documents)
+    assert "a" not in manager.stats()["loaded"]
+    with manager.use("a") as store:
+        assert manager.cached(store, "agent", build) is not first
+    # Stores that are not loaded collections get a new object every time
+    unmanaged = VectorStore(dimension=DIMENSION)
+    assert manager.cached(unmanaged, "agent", build) is not manager.cached(unmanaged, "agent", build)
+    assert len(built) == 4
+
+def test_collection_names_are_validated(manager):
+    with pytest.raises(ValueError):
+        manager.create("../escape")
+    with pytest.raises(KeyError):
+        with manager.use("missing"):
+            pass
+    assert not manager.create("a") and manager.exists(DEFAULT_COLLECTION)
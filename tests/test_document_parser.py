@@ -0,0 +1,96 @@
+import fitz
+import pytest
+from src.ingestion.document_parser import DocumentParser
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / "report.pdf"
+    with fitz.open() as doc:
+        for page in range(7):
+            doc.new_page().insert_text((72, 72), f"Page {page + 1} discusses topic {page}.")
+        doc.new_page()  # blank pages are skipped
+        doc.save(str(path))
+    return str(path)
+
+# Parallel PDF parsing
+
+def test_parallel_parsing_matches_serial_parsing(pdf_path):
+    parser = DocumentParser(workers=2)
+    try:
+        pages = list(parser.parse_pdf_parallel(pdf_path, pages_per_task=2))
+    finally:
+        parser.close()
+    assert pages == DocumentParser.parse_pdf(pdf_path)
+    assert [page["page"] for page in pages] == list(range(1, 8))
+
+def test_pool_does_not_fork_and_restarts_after_close(pdf_path):
+    parser = DocumentParser(workers=2)
+    try:
+        list(parser.parse_pdfs_parallel([pdf_path, pdf_path], pages_per_task=4))
+        assert parser._pool._mp_context.get_start_method() in ("forkserver", "spawn")
+        parser.close()
+        assert parser._pool is None
+        assert len(list(parser.parse_pdfs_parallel([pdf_path, pdf_path], pages_per_task=4))) == 14
+    finally:
+        parser.close()
+
+def test_single_worker_parses_in_process(pdf_path):
+    parser = DocumentParser(workers=1)
+    assert len(list(parser.parse_pdf_parallel(pdf_path, pages_per_task=2))) == 7
+    assert parser._pool is None
+
+def test_unreadable_pdf_is_skipped(tmp_path, pdf_path):
+    missing = str(tmp_path / "missing.pdf")
+    parser = DocumentParser(workers=1)
+    assert len(list(parser.parse_pdfs_parallel([missing, pdf_path]))) == 7
+
+# HTML extraction
+
+PAGE = """<html><head><title>Guide</title><script>track()</script></head><body>
+<nav><a href="/">Home</a> <a href="/docs">Docs</a></nav>
+<div class="cookie-banner">We use cookies. <button>Accept</button></div>
+<main>
+  <h1>Installation</h1>
+  <p>Install the package with pip.</p>
+  <p>Then set the API key in the environment.</p>
+  <h2>Indexing</h2>
+  <p>Upload a PDF to build the index.</p>
+  <div class="share-buttons">Share on social media</div>
+  <p>Search it with a question.</p>
+</main>
+<footer>Copyright 2024</footer>
+</body></html>"""
+
+@pytest.fixture(params=["lxml", "html.parser"])
+def html_backend(request, monkeypatch):
+    from src.ingestion import document_parser
+    if request.param == "lxml" and not document_parser.HAS_LXML:
+        pytest.skip("lxml is not installed")
+    monkeypatch.setattr(document_parser, "HAS_LXML", request.param == "lxml")
+
+def test_html_sections_drop_boilerplate_and_break_at_headings(html_backend):
+    sections = DocumentParser.parse_html(PAGE, "https://example.com/guide", max_chars=500)
+    assert [section["text"] for section in sections] == [
+        "Installation\n\nInstall the package with pip.\n\nThen set the API key in the environment.",
+        "Indexing\n\nUpload a PDF to build the index.\n\nSearch it with a question.",
+    ]
+    assert [(section["source"], section["section"], section["type"]) for section in sections] == [
+        ("https://example.com/guide", 1, "web"), ("https://example.com/guide", 2, "web")]
+
+def test_html_headers_are_kept_only_inside_the_content(html_backend):
+    article = """<html><body><header><a href="/">Example Docs</a> Sign in</header>
+<article><header><h1>Release notes</h1><p>Version 2.0 adds hybrid search.</p></header>
+<p>Upgrade with pip.</p></article></body></html>"""
+    sections = DocumentParser.parse_html(article, "https://example.com/notes", max_chars=500)
+    assert [section["text"] for section in sections] == [
+        "Release notes\n\nVersion 2.0 adds hybrid search.\n\nUpgrade with pip."]
+    page = "<html><body><header>Example Docs Sign in</header><p>Plain page text.</p></body></html>"
+    sections = DocumentParser.parse_html(page, "https://example.com/plain", max_chars=500)
+    assert [section["text"] for section in sections] == ["Plain page text."]
+
+def test_html_sections_stay_within_max_chars(html_backend):
+    html = "<html><body>" + "".join(f"<p>Paragraph {i} of a long article.</p>" for i in range(40)) + "</body></html>"
+    sections = DocumentParser.parse_html(html, "https://example.com/long", max_chars=120)
+    assert len(sections) > 1
+    assert all(len(section["text"]) <= 120 for section in sections)
+    assert sum(section["text"].count("Paragraph") for section in sections) == 40
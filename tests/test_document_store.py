@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from src.retrieval.document_store import DocumentStore
+
+DOCUMENTS = [
+    {"text": "première page", "source": "a.pdf", "type": "pdf", "page": 1, "chunk_id": 1, "embedding": np.ones(4)},
+    {"text": "second page", "source": "a.pdf", "type": "pdf", "page": 2, "chunk_id": 1},
+    {"text": "a webpage", "source": "https://example.com", "type": "webpage", "title": "Example"},
+    {"text": "", "source": "b.pdf", "page": 0},
+]
+
+def without_embedding(document):
+    return {key: value for key, value in document.items() if key != "embedding"}
+
+def reopened_with_append(directory, use_mmap):
+    DocumentStore(DOCUMENTS).write(directory)
+    store = DocumentStore.open(directory, use_mmap=use_mmap)
+    store.extend([{"text": "third page", "source": "a.pdf", "page": 3}])
+    return store
+
+# Columnar metadata
+
+def test_rows_come_back_with_the_keys_they_were_added_with():
+    store = DocumentStore(DOCUMENTS)
+    assert len(store) == 4
+    assert list(store) == [without_embedding(doc) for doc in DOCUMENTS]
+    assert store[-1] == DOCUMENTS[-1] and store[1:3] == DOCUMENTS[1:3]
+    with pytest.raises(IndexError):
+        store[4]
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_written_columns_reopen_and_take_appends(tmp_path, use_mmap):
+    DocumentStore(DOCUMENTS).write(str(tmp_path))
+    store = DocumentStore.open(str(tmp_path), use_mmap=use_mmap)
+    assert store.base_size == 4 and list(store) == [without_embedding(doc) for doc in DOCUMENTS]
+
+    store.extend([{"text": "third page", "source": "a.pdf", "page": 3}])
+    assert store[4] == {"text": "third page", "source": "a.pdf", "page": 3}
+
+def test_writes_a_range_of_rows(tmp_path):
+    base = tmp_path / "base"
+    DocumentStore(DOCUMENTS[:2]).write(str(base))
+    store = DocumentStore.open(str(base))
+    store.extend(DOCUMENTS[2:])
+    store.write(str(tmp_path / "range"), start=1, stop=3)
+    assert list(DocumentStore.open(str(tmp_path / "range"))) == DOCUMENTS[1:3]
+
+def test_snapshots_ignore_later_appends():
+    store = DocumentStore(DOCUMENTS[:2])
+    view = store.snapshot()
+    store.extend(DOCUMENTS[2:])
+    assert len(view) == 2 and len(store) == 4
+    assert list(view) == [without_embedding(doc) for doc in DOCUMENTS[:2]]
+
+# Rows by source
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_rows_with_a_value_cover_the_base_and_appends(tmp_path, use_mmap):
+    store = reopened_with_append(str(tmp_path), use_mmap)
+    assert store.rows_with("source", "a.pdf").tolist() == [0, 1, 4]
+    assert store.rows_with("source", "missing.pdf").tolist() == []
+    assert store.snapshot().rows_with("source", "a.pdf").tolist() == [0, 1, 4]
+
+# Metadata filters
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_rows_in_a_range_cover_the_base_and_appends(tmp_path, use_mmap):
+    store = reopened_with_append(str(tmp_path), use_mmap)
+    assert store.rows_in_range("page", 1, 2).tolist() == [0, 1]
+    assert store.rows_in_range("page", low=2).tolist() == [1, 4]
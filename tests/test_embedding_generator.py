@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import time
+import litellm
+import numpy as np
+import pytest
+from src.ingestion import embedding_generator
+from src.ingestion.embedding_generator import EmbeddingGenerator
+from src.ingestion.rate_limiter import AsyncRateLimiter
+from conftest import text_vector
+
+TEXTS = [f"sentence number {i} " * (i % 5 + 1) for i in range(23)]
+
+@pytest.fixture
+def embedder(monkeypatch):
+    monkeypatch.setenv("EMBED_BATCH_SIZE", "5")
+    monkeypatch.setenv("EMBED_CONCURRENCY", "3")
+    return EmbeddingGenerator()
+
+def assert_embeddings_of(texts, embeddings):
+    assert len(embeddings) == len(texts)
+    for text, vector in zip(texts, embeddings):
+        np.testing.assert_allclose(vector, text_vector(text), rtol=1e-6)
+
+# Async embedding
+
+def test_async_batches_keep_input_order(embedder, fake_embeddings):
+    embeddings = asyncio.run(embedder.agenerate_embeddings_batch(TEXTS))
+    assert_embeddings_of(TEXTS, embeddings)
+    assert len(fake_embeddings) == 5 and max(len(batch) for batch in fake_embeddings) == 5
+
+def test_batches_are_bounded_by_estimated_tokens(embedder, fake_embeddings):
+    embedder.max_batch_tokens = 30
+    embedder.generate_embeddings_batch(TEXTS)
+    for batch in fake_embeddings:
+        assert len(batch) == 1 or sum(embedding_generator.estimate_tokens(text) for text in batch) <= 30
+
+def test_throttled_requests_are_retried(embedder, fake_embeddings, monkeypatch):
+    failures = [litellm.RateLimitError("slow down", llm_provider="mistral", model="mistral-embed")] * 2
+    aembedding = embedding_generator.aembedding
+
+    async def flaky(model, input, **kwargs):
+        if failures:
+            raise failures.pop()
+        return await aembedding(model, input)
+
+    async def no_backoff(delay):
+        delays.append(delay)
+
+    delays = []
+    monkeypatch.setattr(embedding_generator, "aembedding", flaky)
+    monkeypatch.setattr(embedding_generator.asyncio, "sleep", no_backoff)
+    assert_embeddings_of(TEXTS[:3], asyncio.run(embedder.agenerate_embeddings_batch(TEXTS[:3])))
+    assert not failures and len(delays) == 2 and delays[0] < delays[1]
+
+def test_batches_rejected_as_too_large_are_split(embedder, fake_embeddings, monkeypatch):
+    aembedding = embedding_generator.aembedding
+
+    async def limited(model, input, **kwargs):
+        if len(input) > 2:
+            raise litellm.BadRequestError("too many tokens", model="mistral-embed", llm_provider="mistral")
+        return await aembedding(model, input)
+
+    monkeypatch.setattr(embedding_generator, "aembedding", limited)
+    assert_embeddings_of(TEXTS[:5], asyncio.run(embedder.agenerate_embeddings_batch(TEXTS[:5])))
+    assert all(len(batch) <= 2 for batch in fake_embeddings)
+
+def test_rate_limiter_waits_for_the_window():
+    limiter = AsyncRateLimiter(requests_per_minute=2, window=0.2)
+
+    async def run():
+        start = time.monotonic()
+        for _ in range(3):
+            await limiter.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) >= 0.2
+
+def test_rate_limiter_budget_is_shared_by_event_loops_in_threads():
+    limiter = AsyncRateLimiter(requests_per_minute=2, window=0.2)
+
+    async def run():
+        for _ in range(2):
+            await limiter.acquire()
+
+    threads = [threading.Thread(target=asyncio.run, args=(run(),)) for _ in range(2)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Four requests against a budget of two per window
+    assert time.monotonic() - start >= 0.2
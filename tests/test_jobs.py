@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+from src.ingestion.jobs import JobManager
+
+class FakePipeline:
+    """Records the PDFs it is asked to process, holding each run until released."""
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+
+    def process_pdf(self, file_path, progress=None, source=None):
+        with open(file_path) as f:
+            self.calls.append((source, f.read()))
+        self.release.wait(5)
+        return True
+
+    def process_webpages(self, urls, progress=None):
+        return {url: True for url in urls}
+
+def write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+    return str(path)
+
+# Job manager
+
+def test_jobs_report_status_and_counters():
+    pipeline = FakePipeline()
+    pipeline.release.set()
+    manager = JobManager(pipeline)
+    job = manager.submit_urls(["https://example.com/a", "https://example.com/b"])
+    manager.shutdown(wait=True)
+    assert manager.get(job.id) is job
+    report = job.to_dict()
+    assert report["status"] == "succeeded" and report["kind"] == "url"
+    assert report["sources"] == ["https://example.com/a", "https://example.com/b"]
+
+def test_uploads_of_the_same_name_keep_their_own_files(tmp_path):
+    pipeline = FakePipeline()
+    manager = JobManager(pipeline, workers=1)
+    first = write(tmp_path / "upload-1.pdf", "first")
+    second = write(tmp_path / "upload-2.pdf", "second")
+    jobs = [manager.submit_upload(first, "notes.pdf"),
+            manager.submit_upload(second, "notes.pdf")]
+    pipeline.release.set()
+    manager.shutdown(wait=True)
+
+    assert [job.status for job in jobs] == ["succeeded", "succeeded"]
+    assert pipeline.calls == [("notes.pdf", "first"), ("notes.pdf", "second")]
+    assert not os.path.exists(first) and not os.path.exists(second)
+
+def test_submitted_pdf_files_are_kept(tmp_path):
+    pipeline = FakePipeline()
+    pipeline.release.set()
+    manager = JobManager(pipeline)
+    path = write(tmp_path / "report.pdf", "report")
+    job = manager.submit_pdf(path)
+    manager.shutdown(wait=True)
+    assert job.status == "succeeded"
+    assert pipeline.calls == [(path, "report")] and os.path.exists(path)
+
+def test_failed_jobs_report_their_error_and_old_jobs_are_evicted():
+    class FailingPipeline(FakePipeline):
+        def process_webpages(self, urls, progress=None):
+            raise RuntimeError("no network")
+
+    manager = JobManager(FailingPipeline(), max_history=2)
+    jobs = []
+    for i in range(3):
+        jobs.append(manager.submit_urls(f"https://example.com/{i}"))
+        while not jobs[-1].done:
+            time.sleep(0.01)
+    manager.shutdown(wait=True)
+    assert [job.status for job in jobs] == ["failed"] * 3
+    assert jobs[2].to_dict()["error"] == "no network"
+    assert manager.get(jobs[0].id) is None and manager.list() == jobs[1:]
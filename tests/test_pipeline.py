@@ -0,0 +1,152 @@
+import os
+import time
+import pytest
+from src.ingestion.pipeline import IngestionPipeline, IngestionProgress, PAGES_PER_CHUNK_BATCH
+from src.ingestion.web_fetcher import FetchResult
+from src.retrieval.vector_store import VectorStore
+from conftest import DIMENSION, text_vector
+
+@pytest.fixture
+def pipeline(tmp_path, fake_embeddings, monkeypatch):
+    monkeypatch.setenv("PDF_PARSE_WORKERS", "1")
+    # PDFs are read from the working directory
+    monkeypatch.chdir(tmp_path)
+    pipeline = IngestionPipeline(str(tmp_path / "store"), vector_store=VectorStore(dimension=DIMENSION))
+    yield pipeline
+    pipeline.close()
+
+def write_pdf(source, texts):
+    with open(source, "w") as f:
+        f.write("\n".join(texts))
+
+def ingest(pipeline, monkeypatch, source, texts):
+    """Run a PDF through the pipeline with the parser returning one page per text."""
+    write_pdf(source, texts)
+    pages = [{"text": text, "source": source, "type": "pdf", "page": i + 1} for i, text in enumerate(texts)]
+    monkeypatch.setattr(pipeline.parser, "parse_pdf_parallel", lambda path: iter(pages))
+    progress = IngestionProgress()
+    assert pipeline.process_pdf(source, progress=progress)
+    return progress.counters
+
+def live_texts(store, source):
+    return sorted(store.documents[i]["text"] for i in store.source_ids(source))
+
+# Deduplication and deletion by source
+
+def test_reingesting_an_unchanged_source_embeds_nothing(pipeline, monkeypatch, fake_embeddings):
+    texts = ["The first page.", "The second page."]
+    assert ingest(pipeline, monkeypatch, "a.pdf", texts)["vectors_indexed"] == 2
+    batches = len(fake_embeddings)
+    counters = ingest(pipeline, monkeypatch, "a.pdf", texts)
+    assert counters["vectors_indexed"] == 0 and counters["vectors_deleted"] == 0
+    assert len(fake_embeddings) == batches
+    assert len(pipeline.vector_store.documents) == 2
+
+def test_unchanged_files_are_not_parsed_again(pipeline, monkeypatch):
+    ingest(pipeline, monkeypatch, "a.pdf", ["The first page."])
+    monkeypatch.setattr(pipeline.parser, "parse_pdf_parallel", None)
+    progress = IngestionProgress()
+    assert pipeline.process_pdf("a.pdf", progress=progress)
+    assert progress.counters["sources_unchanged"] == 1 and progress.counters["pages_parsed"] == 0
+
+def test_rewritten_files_with_the_same_text_embed_nothing(pipeline, monkeypatch, fake_embeddings):
+    ingest(pipeline, monkeypatch, "a.pdf", ["The first page."])
+    batches = len(fake_embeddings)
+    with open("a.pdf", "a") as f:
+        f.write("\n% new metadata")
+    progress = IngestionProgress()
+    assert pipeline.process_pdf("a.pdf", progress=progress)
+    assert progress.counters["pages_parsed"] == 1 and len(fake_embeddings) == batches
+    assert pipeline.process_pdf("a.pdf", progress=progress)
+    assert progress.counters["sources_unchanged"] == 1
+
+def test_changed_sources_only_embed_new_chunks_and_drop_stale_ones(pipeline, monkeypatch, fake_embeddings):
+    ingest(pipeline, monkeypatch, "a.pdf", ["Kept page.", "Removed page."])
+    fake_embeddings.clear()
+    counters = ingest(pipeline, monkeypatch, "a.pdf", ["Kept page.", "New page.", "New page."])
+    assert counters["vectors_indexed"] == 1 and counters["vectors_deleted"] == 1
+    assert fake_embeddings == [["New page."]]
+    assert live_texts(pipeline.vector_store, "a.pdf") == ["Kept page.", "New page."]
+    hits = pipeline.vector_store.search(text_vector("Removed page."), k=3)
+    assert "Removed page." not in [doc["text"] for doc, _ in hits]
+
+def test_deleted_sources_stay_deleted_after_a_reload(pipeline, monkeypatch):
+    ingest(pipeline, monkeypatch, "a.pdf", ["Page of a."])
+    ingest(pipeline, monkeypatch, "b.pdf", ["Page of b."])
+    assert pipeline.delete_source("a.pdf") == 1
+    assert "a.pdf" not in pipeline.vector_store.source_hashes
+
+    loaded = VectorStore(dimension=DIMENSION)
+    loaded.load(pipeline.vector_store_dir)
+    assert live_texts(loaded, "a.pdf") == [] and live_texts(loaded, "b.pdf") == ["Page of b."]
+    assert [doc["text"] for doc, _ in loaded.search(text_vector("Page of a."), k=5)] == ["Page of b."]
+
+# Streaming ingestion
+
+def test_ingestion_streams_bounded_micro_batches(pipeline, monkeypatch):
+    write_pdf("big.pdf", [])
+    pipeline.batch_size = 4
+    pipeline.max_buffer_bytes = 1
+    produced = []
+
+    def pages():
+        for i in range(200):
+            produced.append(i)
+            yield {"text": f"Page number {i}.", "source": "big.pdf", "type": "pdf", "page": i + 1}
+
+    embed_documents = pipeline.embedder.embed_documents
+    lead = []
+
+    def slow_embed(batch):
+        # Pages read ahead of the chunks embedded so far
+        lead.append(len(produced) - 4 * len(lead))
+        time.sleep(0.005)
+        return embed_documents(batch)
+
+    monkeypatch.setattr(pipeline.parser, "parse_pdf_parallel", lambda path: pages())
+    monkeypatch.setattr(pipeline.embedder, "embed_documents", slow_embed)
+    progress = IngestionProgress()
+    assert pipeline.process_pdf("big.pdf", progress=progress)
+    assert len(lead) == 50 and max(lead) <= PAGES_PER_CHUNK_BATCH + 2 * 4
+    report = progress.to_dict()
+    assert report["pages_parsed"] == report["chunks_embedded"] == report["vectors_indexed"] == 200
+    assert report["error"] is None and report["stage_seconds"]["embed"] > 0
+
+def test_parser_failures_stop_the_run_without_saving(pipeline, monkeypatch):
+    def pages():
+        yield {"text": "A readable page.", "source": "broken.pdf", "page": 1}
+        raise RuntimeError("damaged page tree")
+
+    write_pdf("broken.pdf", [])
+
+    monkeypatch.setattr(pipeline.parser, "parse_pdf_parallel", lambda path: pages())
+    progress = IngestionProgress()
+    assert not pipeline.process_pdf("broken.pdf", progress=progress)
+    assert progress.error == "damaged page tree"
+    assert not os.listdir(pipeline.vector_store_dir)
+
+# Conditional web fetching
+
+def test_pages_reported_unchanged_are_not_parsed_again(pipeline, monkeypatch, fake_embeddings):
+    url = "https://example.com/guide"
+    html = "<html><body><main><h1>Guide</h1><p>Install the package, then build an index.</p></main></body></html>"
+    responses = [FetchResult(url, html, 200), FetchResult(url, html, 304, not_modified=True)]
+    monkeypatch.setattr(pipeline.fetcher, "fetch_iter", lambda urls: iter([responses.pop(0)]))
+
+    assert pipeline.process_webpages([url]) == {url: True}
+    assert live_texts(pipeline.vector_store, url) and url in pipeline.vector_store.source_hashes
+    batches = len(fake_embeddings)
+    monkeypatch.setattr(pipeline.parser, "parse_html", None)
+    progress = IngestionProgress()
+    assert pipeline.process_webpages([url], progress=progress) == {url: True}
+    assert progress.counters["sources_unchanged"] == 1 and len(fake_embeddings) == batches
+
+def test_pages_served_again_unchanged_are_not_parsed_again(pipeline, monkeypatch):
+    url = "https://example.com/guide"
+    html = "<html><body><main><p>Install the package, then build an index.</p></main></body></html>"
+    monkeypatch.setattr(pipeline.fetcher, "fetch_iter", lambda urls: iter([FetchResult(url, html, 200)]))
+    assert pipeline.process_webpages([url]) == {url: True}
+    monkeypatch.setattr(pipeline.parser, "parse_html", None)
+    progress = IngestionProgress()
+    assert pipeline.process_webpages([url], progress=progress) == {url: True}
+    assert progress.counters["sources_unchanged"] == 1
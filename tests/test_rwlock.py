@@ -0,0 +1,81 @@
+import threading
+import time
+from src.retrieval.rwlock import ReadWriteLock
+from src.retrieval.vector_store import VectorStore
+from conftest import DIMENSION
+
+def run_thread(target):
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
+
+# Concurrent readers and a single writer
+
+def test_readers_share_the_lock():
+    lock = ReadWriteLock()
+    both_inside = threading.Barrier(2, timeout=2)
+
+    def read():
+        with lock.read():
+            both_inside.wait()
+
+    threads = [run_thread(read) for _ in range(2)]
+    for thread in threads:
+        thread.join(3)
+    assert not both_inside.broken
+
+def test_waiting_writers_block_new_readers():
+    lock = ReadWriteLock()
+    events = []
+    reading = threading.Event()
+    release = threading.Event()
+
+    def first_reader():
+        with lock.read():
+            reading.set()
+            release.wait(2)
+        events.append("first reader done")
+
+    def writer():
+        with lock.write():
+            events.append("writer")
+
+    def late_reader():
+        with lock.read():
+            events.append("late reader")
+
+    threads = [run_thread(first_reader)]
+    reading.wait(2)
+    threads.append(run_thread(writer))
+    time.sleep(0.05)
+    threads.append(run_thread(late_reader))
+    time.sleep(0.05)
+    assert events == []
+    release.set()
+    for thread in threads:
+        thread.join(2)
+    assert events == ["first reader done", "writer", "late reader"]
+
+def test_searches_run_while_documents_are_added(make_documents):
+    store = VectorStore(dimension=DIMENSION, index_type="ivf_flat", nlist=4)
+    documents = make_documents(store.train_size + 200)
+    store.add_documents(documents[:50])
+    errors = []
+    done = threading.Event()
+
+    def search():
+        while not done.is_set():
+            try:
+                hits = store.search(documents[10]["embedding"], k=3, nprobe=4)
+                assert hits[0][0]["text"] == "chunk 10"
+            except Exception as e:
+                errors.append(e)
+                return
+
+    searchers = [run_thread(search) for _ in range(3)]
+    for first in range(50, len(documents), 50):
+        store.add_documents(documents[first:first + 50])
+    done.set()
+    for thread in searchers:
+        thread.join(5)
+    assert errors == [] and store.index.ntotal == len(documents)
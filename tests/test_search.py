@@ -0,0 +1,148 @@
+import asyncio
+import numpy as np
+import pytest
+from src.agent.tools import DocumentSearchTool
+from src.ingestion.embedding_generator import EmbeddingGenerator
+from src.retrieval.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+from src.retrieval import vector_store
+from src.retrieval.vector_store import VectorStore
+from conftest import DIMENSION, text_vector
+
+TEXTS = [
+    "FAISS builds inverted file indexes over vector embeddings",
+    "BM25 ranks documents by term frequency and inverse document frequency",
+    "Reciprocal rank fusion merges several rankings into one",
+    "Error code E1234 means the index is not trained",
+    "Memory mapping shares index pages between processes",
+    "Quizzes check what a reader remembers from a document",
+]
+
+@pytest.fixture
+def store():
+    store = VectorStore(dimension=DIMENSION)
+    store.add_documents([{"text": text, "source": f"doc-{i % 2}.pdf", "type": "pdf", "page": i + 1,
+                          "embedding": text_vector(text)} for i, text in enumerate(TEXTS)])
+    return store
+
+@pytest.fixture
+def tool(store, fake_embeddings):
+    return DocumentSearchTool(store, EmbeddingGenerator(), mode="dense")
+
+def texts(results):
+    return [doc["text"] for doc, _ in results]
+
+# Batched search
+
+def test_batch_search_matches_single_searches(store):
+    queries = np.stack([text_vector(text) for text in TEXTS])
+    batch = store.search_batch(queries, k=3)
+    assert [texts(results)[0] for results in batch] == TEXTS
+    assert batch == [store.search(query, k=3) for query in queries]
+
+def test_tool_embeds_a_batch_of_queries_in_one_request(tool, fake_embeddings):
+    results = tool.search_batch(TEXTS[:3], k=1)
+    assert [texts(hits) for hits in results] == [[text] for text in TEXTS[:3]]
+    assert fake_embeddings == [TEXTS[:3]]
+    assert tool.search_batch([]) == []
+
+# Hybrid BM25 and dense retrieval
+
+def test_tokenize_keeps_identifiers_whole_and_split():
+    assert tokenize("The error E12-34 in src/index.py") == ["error", "e12-34", "e12", "34", "src/index.py",
+                                                           "src", "index", "py"]
+
+def test_reciprocal_rank_fusion_favours_ids_ranked_by_both():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]], k=60)
+    assert [doc_id for doc_id, _ in fused] == [1, 3, 2, 4]
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_bm25_ranks_rare_terms_and_survives_a_reload(tmp_path, use_mmap):
+    index = BM25Index()
+    index.add(TEXTS[:3])
+    index.write(str(tmp_path))
+    index = BM25Index.open(str(tmp_path), use_mmap=use_mmap)
+    index.add(TEXTS[3:])
+    assert [doc_id for doc_id, _ in index.search("error code E1234")] == [3]
+    assert [doc_id for doc_id, _ in index.search("index")][:2] == [3, 4]
+    assert 3 not in [doc_id for doc_id, _ in index.search("index", exclude={3})]
+    assert [doc_id for doc_id, _ in index.search("index", allowed=np.array([0, 4]))] == [4]
+    assert index.search("the of and") == []
+
+def test_hybrid_search_finds_exact_terms_the_embeddings_miss(store):
+    unrelated = text_vector("something else entirely")
+    hits = store.hybrid_search_batch(unrelated.reshape(1, -1), ["E1234"], k=2)[0]
+    assert texts(hits)[0] == TEXTS[3]
+    # A zero vector leaves the query to BM25 alone
+    hits = store.hybrid_search_batch(np.zeros((1, DIMENSION), dtype=np.float32), ["reciprocal fusion"], k=1)[0]
+    assert texts(hits) == [TEXTS[2]]
+
+def test_tool_modes(tool):
+    assert texts(tool.search("E1234", k=1, mode="lexical")) == [TEXTS[3]]
+    assert texts(tool.search(TEXTS[1], k=1, mode="dense")) == [TEXTS[1]]
+    assert texts(tool.search(TEXTS[4], k=1, mode="hybrid")) == [TEXTS[4]]
+    with pytest.raises(ValueError):
+        DocumentSearchTool(tool.vector_store, tool.embedder, mode="semantic")
+
+def test_hybrid_search_is_opt_in(store, fake_embeddings, monkeypatch):
+    monkeypatch.delenv("SEARCH_MODE", raising=False)
+    assert DocumentSearchTool(store, EmbeddingGenerator()).mode == "dense"
+    monkeypatch.setenv("SEARCH_MODE", "hybrid")
+    assert DocumentSearchTool(store, EmbeddingGenerator()).mode == "hybrid"
+
+# Metadata filters
+
+@pytest.mark.parametrize("index_type,exact_limit", [("flat", 4096), ("ivf_flat", 4096), ("hnsw", 4096), ("hnsw", 0)])
+def test_filtered_searches_return_k_matching_documents(make_documents, index_type, exact_limit):
+    store = VectorStore(dimension=DIMENSION, index_type=index_type, nlist=4)
+    # HNSW scores small filtered subsets exactly; a zero limit forces the graph search
+    store.filter_exact_limit = exact_limit
+    documents = make_documents(max(400, store.train_size))
+    store.add_documents(documents)
+    query = documents[0]["embedding"]
+    filters = {"source": ["doc-7.pdf", "doc-30.pdf"], "page": (3, 6)}
+    hits = store.search(query, k=5, filters=filters)
+    assert len(hits) == 5
+    assert all(doc["source"] in filters["source"] and 3 <= doc["page"] <= 6 for doc, _ in hits)
+    # The best match overall is found when it passes the filter
+    assert store.search(query, k=1, filters={"source": "doc-0.pdf"})[0][0]["text"] == "chunk 0"
+
+def test_widened_nprobe_is_capped_by_the_loaded_index(tmp_path, make_documents, monkeypatch):
+    store = VectorStore(dimension=DIMENSION, index_type="ivf_flat", nlist=4)
+    store.add_documents(make_documents(max(400, store.train_size)))
+    store.save(str(tmp_path))
+    store.close()
+    # Configured for more lists than the saved index was trained with
+    loaded = VectorStore(dimension=DIMENSION, index_type="ivf_flat", nlist=64)
+    loaded.load(str(tmp_path))
+    probes = []
+    search_parameters = vector_store.search_parameters
+    monkeypatch.setattr(vector_store, "search_parameters",
+                        lambda index, nprobe, *args: probes.append(nprobe) or search_parameters(index, nprobe, *args))
+    hits = loaded.search(make_documents(1)[0]["embedding"], k=1, filters={"source": "doc-0.pdf"})
+    assert hits[0][0]["text"] == "chunk 0" and probes == [4]
+
+def test_filters_exclude_deleted_documents_and_apply_to_bm25(make_documents):
+    store = VectorStore(dimension=DIMENSION)
+    store.add_documents(make_documents(30))
+    store.delete_ids(store.source_ids("doc-1.pdf")[:5])
+    assert len(store.filter_ids({"source": "doc-1.pdf"})) == 5
+    assert store.filter_ids({"type": "web"}).tolist() == []
+    assert store.filter_ids(None) is None
+    hits = store.lexical_search("chunk", k=30, filters={"source": "doc-2.pdf", "page": (None, 4)})
+    assert sorted(doc["chunk_id"] for doc, _ in hits) == [20, 21, 22, 23]
+
+# Zero and NaN queries
+
+def test_batch_search_ignores_unusable_query_vectors(store):
+    queries = np.stack([text_vector(TEXTS[0]), np.zeros(DIMENSION, dtype=np.float32)])
+    batch = store.search_batch(queries, k=2)
+    assert texts(batch[0])[0] == TEXTS[0] and batch[1] == []
+
+# Async search
+
+@pytest.mark.parametrize("mode", ["dense", "lexical", "hybrid"])
+def test_async_search_matches_the_blocking_one(tool, mode):
+    for text in TEXTS[:3]:
+        assert asyncio.run(tool.asearch(text, k=3, mode=mode)) == tool.search(text, k=3, mode=mode)
+    assert asyncio.run(tool.asearch_batch(TEXTS, k=2, mode=mode)) == tool.search_batch(TEXTS, k=2, mode=mode)
@@ -0,0 +1,79 @@
+import socket
+import threading
+import time
+import numpy as np
+import pytest
+import uvicorn
+from fastapi.testclient import TestClient
+from src.retrieval.shard_coordinator import ShardCoordinator
+from src.retrieval.shard_server import create_app, encode_vectors
+from src.retrieval.vector_store import VectorStore
+from conftest import DIMENSION
+
+@pytest.fixture
+def shard_urls(tmp_path):
+    """Two shard servers on local ports."""
+    servers, urls = [], []
+    for i in range(2):
+        app = create_app(VectorStore(dimension=DIMENSION), str(tmp_path / f"shard-{i}"))
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+        threading.Thread(target=server.run, daemon=True).start()
+        while not server.started:
+            time.sleep(0.01)
+        servers.append(server)
+        urls.append(f"http://127.0.0.1:{server.servers[0].sockets[0].getsockname()[1]}")
+    yield urls
+    for server in servers:
+        server.should_exit = True
+
+@pytest.fixture
+def silent_url():
+    """A port that accepts connections but never answers."""
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(16)
+    yield f"http://127.0.0.1:{listener.getsockname()[1]}"
+    listener.close()
+
+# Scatter-gather search over shards
+
+def test_merged_shard_results_match_a_single_store(shard_urls, make_documents):
+    coordinator = ShardCoordinator(shard_urls, deadline=5)
+    single = VectorStore(dimension=DIMENSION)
+    documents = make_documents(100)
+    try:
+        assert coordinator.add_documents(documents) == 100
+        single.add_documents(make_documents(100))
+        assert all(shard["documents"] > 0 for shard in coordinator.health())
+        queries = np.stack([documents[i]["embedding"] for i in (3, 42, 77)])
+        for merged, expected in zip(coordinator.search_batch(queries, k=5), single.search_batch(queries, k=5)):
+            assert [doc["text"] for doc, _ in merged] == [doc["text"] for doc, _ in expected]
+            np.testing.assert_allclose([score for _, score in merged], [score for _, score in expected], rtol=1e-5)
+        hits = coordinator.lexical_search("chunk 42", k=100, filters={"source": "doc-4.pdf"})
+        assert {doc["source"] for doc, _ in hits} == {"doc-4.pdf"}
+    finally:
+        coordinator.close()
+
+def test_searches_return_at_the_deadline_without_late_shards(shard_urls, silent_url, make_documents):
+    writer = ShardCoordinator(shard_urls)
+    documents = make_documents(30)
+    writer.add_documents(documents)
+    writer.close()
+    coordinator = ShardCoordinator(shard_urls + [silent_url], deadline=0.3)
+    try:
+        started = time.perf_counter()
+        results, missing = coordinator.scatter({"vectors": encode_vectors(documents[5]["embedding"][None]),
+                                                "k": 1, "mode": "dense"}, 1, 1)
+        assert time.perf_counter() - started < 1.0
+        assert missing == [2] and results[0][0][0]["text"] == "chunk 5"
+        assert coordinator.stats()[2]["timeouts"] == 1
+    finally:
+        coordinator.close()
+
+def test_shards_reject_malformed_requests():
+    client = TestClient(create_app(VectorStore(dimension=DIMENSION), "unused"))
+    assert client.post("/search", json={"mode": "semantic"}).status_code == 400
+    assert client.post("/search", json={"vectors": encode_vectors(np.ones(5)), "mode": "dense"}).status_code == 400
+    response = client.post("/documents", json={"documents": [{"text": "a"}, {"text": "b"}],
+                                               "embeddings": encode_vectors(np.ones((1, DIMENSION)))})
+    assert response.status_code == 400
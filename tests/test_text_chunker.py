@@ -0,0 +1,48 @@
+import random
+import string
+import pytest
+from src.ingestion.text_chunker import TextChunker
+
+def pages(count: int, seed: int = 0):
+    """Prose, accented and random printable text, the mixes that tokenize unevenly at chunk edges."""
+    rng = random.Random(seed)
+    words = "retrieval index vector embedding query document page chunk token model answer".split()
+    texts = []
+    for i in range(count):
+        prose = " ".join(rng.choice(words) for _ in range(600))
+        if i % 3 == 1:
+            prose = prose.replace("e", "é").replace("a", "あ")
+        elif i % 3 == 2:
+            prose = "".join(rng.choice(string.printable) for _ in range(3000))
+        texts.append({"text": prose, "source": f"doc-{i}.pdf", "page": 1, "type": "pdf"})
+    return texts
+
+# Token-aware chunking
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(128, 16), (64, 0)])
+def test_no_chunk_exceeds_chunk_size_tokens(chunk_size, chunk_overlap):
+    chunker = TextChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap, unit="tokens")
+    chunks = chunker.chunk_documents(pages(30))
+    counts = chunker.count_tokens([chunk["text"] for chunk in chunks])
+    assert len(chunks) > 30 and max(counts) <= chunk_size
+    assert all(chunk["text"] for chunk in chunks)
+
+def test_short_documents_pass_through_unchanged():
+    chunker = TextChunker(chunk_size=128, chunk_overlap=16, unit="tokens")
+    document = {"text": "A short page.", "source": "a.pdf", "page": 3}
+    chunks = chunker.chunk_documents([document, {"text": "  ", "source": "b.pdf"}])
+    assert chunks == [document] and chunks[0] is document and document["chunk_id"] == 1
+
+def test_chunks_keep_metadata_and_overlap():
+    chunker = TextChunker(chunk_size=32, chunk_overlap=8, unit="tokens")
+    text = " ".join(f"word{i}" for i in range(200))
+    chunks = chunker.chunk_document({"text": text, "source": "a.pdf", "page": 2})
+    assert [chunk["chunk_id"] for chunk in chunks] == list(range(1, len(chunks) + 1))
+    assert all(chunk["source"] == "a.pdf" and chunk["page"] == 2 for chunk in chunks)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk["text"].split()[0] in previous["text"].split()
+
+def test_character_chunks_stay_within_chunk_size():
+    chunker = TextChunker(chunk_size=500, chunk_overlap=50, unit="chars")
+    chunks = chunker.chunk_documents(pages(6))
+    assert max(len(chunk["text"]) for chunk in chunks) <= 500
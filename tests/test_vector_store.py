@@ -0,0 +1,267 @@
+import threading
+import numpy as np
+import pytest
+from src.retrieval.vector_store import VectorStore
+from src.retrieval.index_factory import build_index, index_kind, normalize_vectors
+from src.retrieval.storage import SegmentStorage
+from conftest import DIMENSION
+
+def new_store(index_type: str = "flat", **kwargs) -> VectorStore:
+    return VectorStore(dimension=DIMENSION, index_type=index_type, nlist=4, pq_m=4, **kwargs)
+
+def top_text(store: VectorStore, vector: np.ndarray, **kwargs) -> str:
+    return store.search(vector, k=1, **kwargs)[0][0]["text"]
+
+# Index types
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw", "sq_fp16"])
+def test_untrained_index_types_find_stored_vectors(make_documents, index_type):
+    store = new_store(index_type)
+    documents = make_documents(50)
+    assert store.add_documents(documents) == 50
+    assert index_kind(store.index) == index_type
+    assert top_text(store, documents[7]["embedding"]) == "chunk 7"
+
+def test_ivf_index_is_trained_once_enough_vectors_are_buffered(make_documents):
+    store = new_store("ivf_flat")
+    documents = make_documents(store.train_size + 40)
+    store.add_documents(documents[:100])
+    assert index_kind(store.index) == "flat"
+    store.add_documents(documents[100:])
+    assert index_kind(store.index) == "ivf_flat"
+    assert store.index.ntotal == len(documents)
+    assert top_text(store, documents[150]["embedding"], nprobe=4) == "chunk 150"
+
+def test_build_index_rejects_bad_configuration():
+    with pytest.raises(ValueError):
+        build_index("annoy", DIMENSION)
+    with pytest.raises(ValueError):
+        build_index("ivf_pq", DIMENSION, pq_m=5)
+    with pytest.raises(ValueError):
+        VectorStore(dimension=DIMENSION, index_type="annoy")
+
+# Segment persistence
+
+def test_saves_after_the_first_append_segments(tmp_path, make_documents):
+    store = new_store()
+    store.add_documents(make_documents(20))
+    store.save(str(tmp_path))
+    manifest = SegmentStorage(str(tmp_path)).read_manifest()
+    assert manifest["base"]["count"] == 20 and manifest["segments"] == []
+
+    store.add_documents(make_documents(5, start=20, seed=1))
+    store.save(str(tmp_path))
+    manifest = SegmentStorage(str(tmp_path)).read_manifest()
+    assert [(entry["start"], entry["count"]) for entry in manifest["segments"]] == [(20, 5)]
+    store.close()
+
+def test_reload_replays_segments(tmp_path, make_documents):
+    store = new_store()
+    documents = make_documents(30)
+    for first in range(0, 30, 10):
+        store.add_documents(documents[first:first + 10])
+        store.save(str(tmp_path))
+    store.close()
+
+    loaded = new_store()
+    loaded.load(str(tmp_path))
+    assert len(loaded.documents) == 30 and loaded.index.ntotal == 30
+    assert top_text(loaded, documents[25]["embedding"]) == "chunk 25"
+
+def test_compaction_merges_segments_into_the_base(tmp_path, make_documents):
+    store = new_store()
+    documents = make_documents(40)
+    for first in range(0, 40, 10):
+        store.add_documents(documents[first:first + 10])
+        store.save(str(tmp_path))
+    store.compact()
+    manifest = SegmentStorage(str(tmp_path)).read_manifest()
+    assert manifest["segments"] == [] and manifest["base"]["count"] == 40
+    assert not any((tmp_path / "segments").iterdir())
+    store.close()
+
+    loaded = new_store()
+    loaded.load(str(tmp_path))
+    assert len(loaded.documents) == 40
+    assert top_text(loaded, documents[33]["embedding"]) == "chunk 33"
+
+def test_background_compaction_starts_after_enough_segments(tmp_path, make_documents, monkeypatch):
+    monkeypatch.setenv("VECTOR_COMPACT_SEGMENTS", "2")
+    store = new_store()
+    for first in range(0, 30, 10):
+        store.add_documents(make_documents(10, start=first, seed=first))
+        store.save(str(tmp_path))
+    store.close()
+    manifest = SegmentStorage(str(tmp_path)).read_manifest()
+    assert manifest["segments"] == [] and manifest["base"]["count"] == 30
+
+def test_snapshots_written_during_a_compaction_supersede_it(tmp_path, make_documents, monkeypatch):
+    store = new_store()
+    documents = make_documents(30)
+    for first in range(0, 30, 10):
+        store.add_documents(documents[first:first + 10])
+        store.save(str(tmp_path))
+    storage = store._storage
+    write_base = storage.write_base
+    written = []
+
+    def write_base_racing_a_snapshot(manifest, *args):
+        entry = write_base(manifest, *args)
+        written.append(entry["index"])
+        if len(written) == 1:
+            # Another writer deletes a document and snapshots the store
+            def snapshot():
+                with store._lock:
+                    store.delete_ids([3])
+                    store._write_snapshot(store._storage, store._manifest)
+            thread = threading.Thread(target=snapshot)
+            thread.start()
+            thread.join()
+        return entry
+
+    monkeypatch.setattr(storage, "write_base", write_base_racing_a_snapshot)
+    store.compact()
+    store.close()
+    compacted, snapshot = written
+    assert compacted != snapshot
+    assert SegmentStorage(str(tmp_path)).read_manifest()["base"]["index"] == snapshot
+    assert not (tmp_path / compacted).exists()
+
+    loaded = new_store()
+    loaded.load(str(tmp_path))
+    assert loaded.deleted == {3} and len(loaded.documents) == 30
+
+# Memory-mapped loading
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "sq_fp16"])
+@pytest.mark.parametrize("mmap", [False, True])
+def test_save_load_add_round_trip(tmp_path, make_documents, index_type, mmap):
+    store = new_store(index_type)
+    count = max(300, store.train_size)
+    documents = make_documents(count)
+    store.add_documents(documents)
+    assert index_kind(store.index) == index_type
+    store.save(str(tmp_path))
+    store.close()
+
+    loaded = new_store(index_type)
+    loaded.load(str(tmp_path), mmap=mmap)
+    assert len(loaded.documents) == count
+    assert top_text(loaded, documents[42]["embedding"], nprobe=4) == "chunk 42"
+    loaded.add_documents(make_documents(2, start=count, seed=1))
+    loaded.save(str(tmp_path))
+    loaded.close()
+
+    reloaded = new_store(index_type)
+    reloaded.load(str(tmp_path), mmap=mmap)
+    assert len(reloaded.documents) == count + 2 and reloaded.index.ntotal == count + 2
+    assert top_text(reloaded, documents[42]["embedding"], nprobe=4) == "chunk 42"
+
+def test_memory_mapped_load_maps_the_index(tmp_path, make_documents):
+    store = new_store("ivf_flat")
+    store.add_documents(make_documents(300))
+    store.save(str(tmp_path))
+    store.close()
+
+    loaded = new_store("ivf_flat")
+    loaded.load(str(tmp_path), mmap=True)
+    assert loaded.memory_usage()["index_mapped"]
+
+def test_failed_load_raises_and_does_not_overwrite_the_saved_store(tmp_path, make_documents):
+    store = new_store()
+    store.add_documents(make_documents(20))
+    store.save(str(tmp_path))
+    store.close()
+    storage = SegmentStorage(str(tmp_path))
+    base = storage.read_manifest()["base"]
+    with open(storage.index_path(base), "wb") as f:
+        f.write(b"not an index")
+
+    loaded = new_store()
+    with pytest.raises(Exception):
+        loaded.load(str(tmp_path))
+    loaded.add_documents(make_documents(2, start=20, seed=1))
+    loaded.save(str(tmp_path))
+    assert storage.read_manifest()["base"] == base
+
+# Scalar quantization and re-ranking
+
+def test_quantized_indexes_are_smaller_than_flat(make_documents):
+    sizes = {}
+    for index_type in ("flat", "sq_fp16", "sq8"):
+        store = new_store(index_type)
+        store.add_documents(make_documents(store.train_size or 4096))
+        assert index_kind(store.index) == index_type
+        sizes[index_type] = store.memory_usage()["index_bytes"]
+    assert sizes["sq8"] < sizes["sq_fp16"] < sizes["flat"]
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_rerank_scores_are_exact_and_survive_a_reload(tmp_path, make_documents, mmap):
+    store = new_store("sq8", rerank=4)
+    documents = make_documents(store.train_size)
+    store.add_documents(documents)
+    vectors = np.stack([doc["embedding"] for doc in documents])
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    query = vectors[11] + 0.1 * vectors[12]
+    query /= np.linalg.norm(query)
+    hits = store.search(query, k=5)
+    assert hits[0][0]["text"] == "chunk 11"
+    for doc, score in hits:
+        assert score == pytest.approx(float(vectors[doc["chunk_id"]] @ query), abs=1e-5)
+    store.save(str(tmp_path))
+    store.close()
+
+    loaded = new_store("sq8", rerank=4)
+    loaded.load(str(tmp_path), mmap=mmap)
+    assert loaded.search(query, k=5) == hits
+    assert loaded.memory_usage()["rerank_vectors"] == store.train_size
+
+# Vector normalization checks
+
+def test_check_vectors_scans_ivf_indexes_with_gaps_in_their_ids(make_documents):
+    store = new_store("ivf_flat")
+    documents = make_documents(300)
+    store.add_documents(documents)
+    assert index_kind(store.index) == "ivf_flat"
+    store.delete_source("doc-3.pdf")
+    store.delete_source("doc-7.pdf")
+    report = store.check_vectors()
+    assert report["checked"] == 280 and report["zero"] == [] and report["nan"] == []
+    assert report["not_normalized"] == 0
+    # The scan leaves no direct map behind, so the index still takes new ids
+    store.add_documents(make_documents(5, start=300, seed=1))
+    assert top_text(store, documents[150]["embedding"], nprobe=4) == "chunk 150"
+
+def test_check_vectors_repairs_unnormalized_vectors(tmp_path, make_documents):
+    store = new_store()
+    documents = make_documents(50)
+    store.add_documents(documents)
+    store.save(str(tmp_path))
+    vectors = np.stack([doc["embedding"] for doc in documents]) * 3
+    store.index.remove_ids(np.arange(50, dtype=np.int64))
+    store.index.add_with_ids(vectors, np.arange(50, dtype=np.int64))
+    assert store.check_vectors()["not_normalized"] == 50
+
+    report = store.check_vectors(repair=True)
+    assert report["renormalized"] == 50
+    assert store.check_vectors()["not_normalized"] == 0
+    store.close()
+    loaded = new_store()
+    loaded.load(str(tmp_path))
+    assert loaded.check_vectors()["not_normalized"] == 0
+
+def test_normalize_vectors_flags_rows_it_cannot_normalize():
+    vectors = np.array([[3, 4], [0, 0], [np.nan, 1], [1e-3, 0]], dtype=np.float32)
+    normalized, valid = normalize_vectors(vectors)
+    assert valid.tolist() == [True, False, False, True]
+    np.testing.assert_allclose(normalized[[0, 3]], [[0.6, 0.8], [1, 0]], rtol=1e-6)
+
+def test_zero_and_nan_embeddings_are_quarantined(make_documents):
+    store = new_store()
+    documents = make_documents(10)
+    documents[3]["embedding"] = np.zeros(DIMENSION, dtype=np.float32)
+    documents[6]["embedding"] = np.full(DIMENSION, np.nan, dtype=np.float32)
+    assert store.add_documents(documents) == 8
+    assert [(doc["chunk_id"], doc["reason"]) for doc in store.quarantined] == [(3, "zero"), (6, "nan")]
+    # Scores of a normalized store are cosine similarities
+    assert store.search(documents[5]["embedding"] * 7, k=1)[0][1] == pytest.approx(1.0, abs=1e-5)
@@ -0,0 +1,54 @@
+import asyncio
+from types import SimpleNamespace
+import httpx
+import pytest
+from src.ingestion import web_fetcher
+from src.ingestion.web_fetcher import HTTPCache, WebFetcher
+
+PAGE = "<html><body><p>Hello</p></body></html>"
+
+@pytest.fixture
+def server(monkeypatch):
+    """Route the fetcher's client to an in-process handler recording requests and concurrency."""
+    server = SimpleNamespace(requests=[], in_flight=0, max_in_flight=0)
+
+    async def handle(request):
+        server.requests.append(request)
+        server.in_flight += 1
+        server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        await asyncio.sleep(0.01)
+        server.in_flight -= 1
+        if request.url.path == "/missing":
+            return httpx.Response(404)
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, text=PAGE, headers={"ETag": '"v1"'})
+
+    client = httpx.AsyncClient
+    monkeypatch.setattr(web_fetcher.httpx, "AsyncClient",
+                        lambda **kwargs: client(transport=httpx.MockTransport(handle), **kwargs))
+    return server
+
+# Conditional, concurrent web fetching
+
+def test_unchanged_pages_are_served_from_the_cache(tmp_path, server):
+    fetcher = WebFetcher(HTTPCache(str(tmp_path / "http.sqlite")))
+    first, = asyncio.run(fetcher.afetch_many(["https://example.com/a"]))
+    assert first.status == 200 and first.text == PAGE and not first.not_modified
+
+    second, = list(fetcher.fetch_iter(["https://example.com/a"]))
+    assert second.status == 304 and second.not_modified and second.text == PAGE
+    assert server.requests[1].headers["If-None-Match"] == '"v1"'
+
+def test_failed_fetches_are_reported_per_url(server):
+    urls = ["https://example.com/a", "https://example.com/missing", "https://example.org/b"]
+    results = asyncio.run(WebFetcher().afetch_many(urls))
+    assert [result.url for result in results] == urls
+    assert [result.error is None for result in results] == [True, False, True]
+    assert "404" in results[1].error
+
+def test_requests_per_host_are_limited(server):
+    urls = [f"https://example.com/{i}" for i in range(12)]
+    results = list(WebFetcher(per_host=3).fetch_iter(urls))
+    assert sorted(result.url for result in results) == sorted(urls)
+    assert server.max_in_flight == 3